@@ -24,4 +24,5 @@ except ImportError:
     print('Warning: Missing dependencies for S11fit! Fitting routines not imported.')
 
 from .devices.autodetect_instrument import autodetect_instrument as adi #Callable as stlab.devices.adi(...)
+from .devices.autodetect_instrument import scan_instruments #Callable as stlab.scan_instruments(...)
 from stlabutils.autoplotter import autoplot #Call as stlab.autoplot(...)
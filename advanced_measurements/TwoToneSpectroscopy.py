@@ -13,19 +13,6 @@ import pandas as pd
 from collections import OrderedDict
 import time
 
-from contextlib import contextmanager
-import sys, os
-
-@contextmanager
-def suppress_stdout():
-    with open(os.devnull, "w") as devnull:
-        old_stdout = sys.stdout
-        sys.stdout = devnull
-        try:
-            yield
-        finally:
-            sys.stdout = old_stdout
-
 class PNA_rfsource():
     """class that allows one to use the third port of the
     PNA as a RF source"""
@@ -96,81 +83,83 @@ def TwoToneSetup(pna,
     pna.write('SYST:FPR')  #do reset with all windows and traces deleted
 
 
-    #setup two displays
-    pna.write("DISP:WIND1:STATE ON")
-    pna.write("DISP:WIND2:STATE ON")
-
-    ###setup probe scan (magnitude)
-    pna.write("CALC1:PAR:DEF:EXT 'CH1_S21_S1', 'B,1'")
-    pna.write("DISP:WIND1:TRACE1:FEED 'CH1_S21_S1'")
-    pna.write("CALC1:PAR:SEL 'CH1_S21_S1'")
-    pna.write("CALC1:FORM MLOG")
-
-    #setup triggering per channel
-    pna.write("INIT:CONT OFF")
-    pna.write("SENS1:SWE:MODE HOLD")
-    pna.write("TRIG:SCOP CURR")
-
-
-    ###setup probe scan more
-    pna.write("SENS:FREQ:START %s" % (f_probe_start))
-    pna.write("SENS:FREQ:STOP %s" % (f_probe_stop))
-    pna.write("SENS:SWE:POIN %s" % (f_probe_points))
-    pna.write("SENS:BWID %s" % (probe_ifbw))
-    pna.write("SOUR:POW1 %s" %(probe_power))
-
-    #do settings for Marker for the probe
-    pna.write("CALC1:MARK:REF ON")
-    pna.write("CALC1:MARK:REF:X " + str(f_probe_start))
-    pna.write("CALC1:MARK1 ON")
-    pna.write("CALC1:MARK1:FUNC {}".format(searchtype))
-    pna.write("CALC1:MARK1:FUNC:TRAC ON")
-    pna.write("CALC1:MARK1:DELT ON")
-    pna.write("CALC1:MARK2 ON")
-    pna.write("CALC1:MARK2:FUNC {}".format(searchtype))
-    pna.write("CALC1:MARK2:FUNC:TRAC ON")
-
-
-
-    ###setup two tone scan
-    pna.write("CALC2:PAR:DEF:EXT 'CH2_S21_S1', 'B,1'")
-    pna.write("DISP:WIND2:TRACE1:FEED 'CH2_S21_S1'")
-    pna.write("CALC2:PAR:SEL 'CH2_S21_S1'")
-    pna.write("CALC2:FORM MLOG")
-    ##
-    pna.write("SENS2:FREQ:START %s" % (f_pump_start))
-    pna.write("SENS2:FREQ:STOP %s" % (f_pump_stop))
-    pna.write("SENS2:SWE:POIN %s" % (f_pump_points))
-    pna.write("SENS2:BWID %s" % (pump_ifbw))
-
-    ##
-    ##
-    pna.write("SENS2:FOM:STATE 1")      #switch on Frequency Offset Module
-    pna.write("SENS2:FOM:RANG3:COUP 0")     #decouple Receivers
-    pna.write("SENS2:FOM:RANG2:COUP 0")     #decouple Source
-    ##
+    #send the configuration as a few compound commands
+    with pna.batch():
+        #setup two displays
+        pna.write("DISP:WIND1:STATE ON")
+        pna.write("DISP:WIND2:STATE ON")
+
+        ###setup probe scan (magnitude)
+        pna.write("CALC1:PAR:DEF:EXT 'CH1_S21_S1', 'B,1'")
+        pna.write("DISP:WIND1:TRACE1:FEED 'CH1_S21_S1'")
+        pna.write("CALC1:PAR:SEL 'CH1_S21_S1'")
+        pna.write("CALC1:FORM MLOG")
+
+        #setup triggering per channel
+        pna.write("INIT:CONT OFF")
+        pna.write("SENS1:SWE:MODE HOLD")
+        pna.write("TRIG:SCOP CURR")
+
+
+        ###setup probe scan more
+        pna.write("SENS:FREQ:START %s" % (f_probe_start))
+        pna.write("SENS:FREQ:STOP %s" % (f_probe_stop))
+        pna.write("SENS:SWE:POIN %s" % (f_probe_points))
+        pna.write("SENS:BWID %s" % (probe_ifbw))
+        pna.write("SOUR:POW1 %s" %(probe_power))
+
+        #do settings for Marker for the probe
+        pna.write("CALC1:MARK:REF ON")
+        pna.write("CALC1:MARK:REF:X " + str(f_probe_start))
+        pna.write("CALC1:MARK1 ON")
+        pna.write("CALC1:MARK1:FUNC {}".format(searchtype))
+        pna.write("CALC1:MARK1:FUNC:TRAC ON")
+        pna.write("CALC1:MARK1:DELT ON")
+        pna.write("CALC1:MARK2 ON")
+        pna.write("CALC1:MARK2:FUNC {}".format(searchtype))
+        pna.write("CALC1:MARK2:FUNC:TRAC ON")
+
+
+
+        ###setup two tone scan
+        pna.write("CALC2:PAR:DEF:EXT 'CH2_S21_S1', 'B,1'")
+        pna.write("DISP:WIND2:TRACE1:FEED 'CH2_S21_S1'")
+        pna.write("CALC2:PAR:SEL 'CH2_S21_S1'")
+        pna.write("CALC2:FORM MLOG")
+        ##
+        pna.write("SENS2:FREQ:START %s" % (f_pump_start))
+        pna.write("SENS2:FREQ:STOP %s" % (f_pump_stop))
+        pna.write("SENS2:SWE:POIN %s" % (f_pump_points))
+        pna.write("SENS2:BWID %s" % (pump_ifbw))
+
+        ##
+        ##
+        pna.write("SENS2:FOM:STATE 1")      #switch on Frequency Offset Module
+        pna.write("SENS2:FOM:RANG3:COUP 0")     #decouple Receivers
+        pna.write("SENS2:FOM:RANG2:COUP 0")     #decouple Source
+        ##
     
-    pna.write("SENS2:FOM:RANG3:SWE:TYPE CW")    #set Receivers in CW mode
-    pna.write("SENS2:FOM:RANG2:SWE:TYPE CW")    #set Source in CW mode
-    ##
-    pna.write("SENS2:FOM:RANG3:FREQ:CW %s" %(f_probe_start)) #set cw freq to receivers
-    pna.write("SENS2:FOM:RANG2:FREQ:CW %s" %(f_probe_start)) #set cw freq to source1
-    ##
-    pna.write("SENS2:FOM:DISP:SEL 'Primary'")       #set x-axis to primary
-    ##
-    pna.write("SOUR2:POW:COUP 0")                   #decouple powers
-    pna.write("SOUR2:POW1 %s" %(probe_power))
-    pna.write("SOUR2:POW3 %s" %(pump_power))
-    pna.write("SOUR2:POW3:MODE ON")                 #switch on port3
-
-    pna.write("CALC2:MARK1 ON")
-    if searchtype == 'MAX':
-        pna.write("CALC2:MARK1:FUNC MIN")
-    elif searchtype == 'MIN':
-        pna.write("CALC2:MARK1:FUNC MAX")
-    else:
-        raise ValueError('Bad search type')
-    pna.write("CALC2:MARK1:FUNC:TRAC ON")
+        pna.write("SENS2:FOM:RANG3:SWE:TYPE CW")    #set Receivers in CW mode
+        pna.write("SENS2:FOM:RANG2:SWE:TYPE CW")    #set Source in CW mode
+        ##
+        pna.write("SENS2:FOM:RANG3:FREQ:CW %s" %(f_probe_start)) #set cw freq to receivers
+        pna.write("SENS2:FOM:RANG2:FREQ:CW %s" %(f_probe_start)) #set cw freq to source1
+        ##
+        pna.write("SENS2:FOM:DISP:SEL 'Primary'")       #set x-axis to primary
+        ##
+        pna.write("SOUR2:POW:COUP 0")                   #decouple powers
+        pna.write("SOUR2:POW1 %s" %(probe_power))
+        pna.write("SOUR2:POW3 %s" %(pump_power))
+        pna.write("SOUR2:POW3:MODE ON")                 #switch on port3
+
+        pna.write("CALC2:MARK1 ON")
+        if searchtype == 'MAX':
+            pna.write("CALC2:MARK1:FUNC MIN")
+        elif searchtype == 'MIN':
+            pna.write("CALC2:MARK1:FUNC MAX")
+        else:
+            raise ValueError('Bad search type')
+        pna.write("CALC2:MARK1:FUNC:TRAC ON")
 
 def TwoToneProbeSet(pna,searchtype='MAX'):
 
@@ -179,14 +168,7 @@ def TwoToneProbeSet(pna,searchtype='MAX'):
     pna.write("INIT:CONT OFF")
 
     # Trigger top screen measurement
-    pna.write("INIT1:IMM" )
-    pna.write('*OPC')
-
-    done = 0
-    while done != 1:
-        with suppress_stdout():
-            done = int(pna.query('*ESR?')[1])
-        time.sleep(0.01)
+    pna.write_and_wait("INIT1:IMM")
 
     # Autoscale and copy scale to lower screen
     pna.write('DISP:WIND1:Y:AUTO')
@@ -209,14 +191,7 @@ def TwoToneSetProbeFrequency(pna,frequency):
 
 def TwoToneMeasure(pna):
     # Trigger
-    pna.write("INIT2:IMM")
-    pna.write('*OPC')
-
-    done = 0
-    while done != 1:
-        with suppress_stdout():
-            done = int(pna.query('*ESR?')[1])
-        time.sleep(0.01)
+    pna.write_and_wait("INIT2:IMM")
 
     pna.write('DISP:WIND2:Y:AUTO')
 
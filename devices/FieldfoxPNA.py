@@ -26,9 +26,7 @@ class FieldfoxPNA(basepna):
 ##### ABSTRACT METHODS TO BE IMPLEMENTED ON A PER PNA BASIS #####################
 
     def GetFrequency(self):
-        frec = self.query('FREQ:DATA?')
-        #Convert to numpy arrays
-        frec = np.array(list(map(float, frec.split(','))))
+        frec = self.query_array('FREQ:DATA?')
         return frec
 
     def GetTraceNames(self):
@@ -50,10 +48,9 @@ class FieldfoxPNA(basepna):
         self.write('CALC:PAR' + str(i + 1) + ':SEL')
 
     def GetTraceData(self):
-        yy = self.query('CALC:DATA:SDATA?')
-        yy = np.asarray([float(xx) for xx in yy.split(',')])
-        yyre = yy[::2]
-        yyim = yy[1::2]
+        yy = self.query_complex('CALC:DATA:SDATA?')
+        yyre = yy.real
+        yyim = yy.imag
         return yyre, yyim
 
     def CalOn(self):
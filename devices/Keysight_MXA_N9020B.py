@@ -76,19 +76,10 @@ class Keysight_MXA_N9020B(instrument):
         # Now we manually check for completion using *ESR? like we did when we fixed IO erros on the VNA
 
         # Trigger
-        self.dev.write("*CLS")
-        self.dev.write("*ESE 1")
         self.dev.write("INIT:CONT OFF")
-        self.dev.write("INIT:IMM")
-        self.dev.write("*OPC")
-
-        # Poll until OPC bit (bit 0) is set
-        while True:
-            esr = int(self.dev.query("*ESR?"))
-            if esr & 1:          # Bit 0 = OPC done
-                print("Sweep complete!")
-                break
-            time.sleep(0.05)     # 50ms poll interval, adjust to your sweep time
+        # Poll until OPC bit (bit 0) is set. Polling interval backs off from 1 ms to 100 ms
+        self.wait_poll("INIT:IMM")
+        print("Sweep complete!")
 
         # Now safe to fetch
         data_string = self.dev.query("FETCH:SANalyzer?")
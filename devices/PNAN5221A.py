@@ -5,6 +5,7 @@ a Keysight N5221A PNA. It inherits from basepna class.
 
 """
 import numpy as np
+import pyvisa as visa
 from .basepna import basepna
 
 
@@ -20,6 +21,8 @@ class PNAN5221A(basepna):
                  addr='TCPIP::192.168.1.216::INSTR',
                  reset=True,
                  verb=True):
+        self.bulk_transfer = None  #Support for CALC:DATA:MSD? is checked on first use
+        self.mnums = {}  #Measurement numbers of the last read traces
         super().__init__(addr, reset, verb)
 
 # OBLIGATORY METHODS TO BE IMPLEMENTED FROM ABCLASS
@@ -35,8 +38,7 @@ class PNAN5221A(basepna):
         return mode
 
     def GetFrequency(self, ch=1):
-        freq = self.query('CALC{}:X?'.format(ch))
-        freq = np.asarray([float(xx) for xx in freq.split(',')])
+        freq = self.query_array('CALC{}:X?'.format(ch))
         return freq
 
     def GetTraceNames(self):
@@ -50,10 +52,9 @@ class PNAN5221A(basepna):
         self.write('CALC{}:PAR:SEL "{}"'.format(ch, mystr))
 
     def GetTraceData(self, ch=1):
-        yy = self.query("CALC{}:DATA? SDATA".format(ch))
-        yy = np.asarray([float(xx) for xx in yy.split(',')])
-        yyre = yy[::2]
-        yyim = yy[1::2]
+        yy = self.query_complex("CALC{}:DATA? SDATA".format(ch))
+        yyre = yy.real
+        yyim = yy.imag
         return yyre, yyim
 
     # probably need checking?
@@ -70,6 +71,46 @@ class PNAN5221A(basepna):
     def GetCal(self):
         return bool(int(self.query('SENS:CORR?')))
 
+    def GetAllTraceData(self, pars, uncal=False, ch=1):
+        """Get the complex data of several traces in a single transfer
+
+        Uses ``CALC:DATA:MSD?`` to read the SDATA of all requested measurements at once.
+        The measurement numbers of the traces are looked up once and cached for the
+        following sweeps.  If the instrument does not support the bulk query, the
+        generic trace by trace readout is used for the rest of the session.
+
+        """
+        if self.bulk_transfer is False:
+            return super().GetAllTraceData(pars, uncal)
+        key = tuple(pars)
+        if key not in self.mnums:
+            mnums = []
+            for par in pars:
+                self.SetActiveTrace(par, ch)
+                mnums.append(self.query('CALC{}:PAR:MNUM?'.format(ch)).strip())
+            self.mnums = {key: ','.join(mnums)}
+        if uncal:
+            self.CalOff()
+        timeout = self.dev.timeout
+        try:
+            if self.bulk_transfer is None:
+                self.dev.timeout = 10000  #Do not hang forever if the query is not supported
+            yy = self.query_complex('CALC{}:DATA:MSD? "{}"'.format(
+                ch, self.mnums[key]))
+            yy = yy.reshape(len(pars), -1)
+            self.bulk_transfer = True
+        except (ValueError, visa.VisaIOError):
+            print('CALC:DATA:MSD? not supported.  Reading traces one by one')
+            self.bulk_transfer = False
+            self.dev.clear()
+            self.write('*CLS')
+            yy = super().GetAllTraceData(pars)
+        finally:
+            self.dev.timeout = timeout
+        if uncal:
+            self.CalOn()
+        return yy
+
 # OPTIONAL METHODS
 
     def SetElectricalDelay(self, t):
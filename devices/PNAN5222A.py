@@ -111,75 +111,77 @@ class PNAN5222A(PNAN5221A):
         self.write('SYST:FPR')  #do reset with all windows and traces deleted
 
 
-        #setup two displays
-        self.write("DISP:WIND1:STATE ON")
-        self.write("DISP:WIND2:STATE ON")
-
-        ###setup probe scan (magnitude)
-        self.write("CALC1:PAR:DEF:EXT 'CH1_S21_S1', 'B,1'")
-        self.write("DISP:WIND1:TRACE1:FEED 'CH1_S21_S1'")
-        self.write("CALC1:PAR:SEL 'CH1_S21_S1'")
-        self.write("CALC1:FORM MLOG")
-
-        #setup triggering per channel
-        self.write("INIT:CONT OFF")
-        self.write("SENS1:SWE:MODE HOLD")
-        self.write("TRIG:SCOP CURR")
-
-
-        ###setup probe scan more
-        self.write("SENS:FREQ:START %s" % (f_probe_start))
-        self.write("SENS:FREQ:STOP %s" % (f_probe_stop))
-        self.write("SENS:SWE:POIN %s" % (f_probe_points))
-        self.write("SENS:BWID %s" % (probe_ifbw))
-        self.write("SOUR:POW1 %s" %(probe_power))
-
-        #do settings for Marker for the probe
-        self.write("CALC1:MARK:REF ON")
-        self.write("CALC1:MARK:REF:X " + str(f_probe_start))
-        self.write("CALC1:MARK1 ON")
-        self.write("CALC1:MARK1:FUNC MIN")
-        self.write("CALC1:MARK1:FUNC:TRAC ON")
-        self.write("CALC1:MARK1:DELT ON")
-        self.write("CALC1:MARK2 ON")
-        self.write("CALC1:MARK2:FUNC MIN")
-        self.write("CALC1:MARK2:FUNC:TRAC ON")
-
-
-
-        ###setup two tone scan
-        self.write("CALC2:PAR:DEF:EXT 'CH2_S21_S1', 'B,1'")
-        self.write("DISP:WIND2:TRACE1:FEED 'CH2_S21_S1'")
-        self.write("CALC2:PAR:SEL 'CH2_S21_S1'")
-        self.write("CALC2:FORM MLOG")
-        ##
-        self.write("SENS2:FREQ:START %s" % (f_pump_start))
-        self.write("SENS2:FREQ:STOP %s" % (f_pump_stop))
-        self.write("SENS2:SWE:POIN %s" % (f_pump_points))
-        self.write("SENS2:BWID %s" % (pump_ifbw))
-
-        ##
-        ##
-        self.write("SENS2:FOM:STATE 1")      #switch on Frequency Offset Module
-        self.write("SENS2:FOM:RANG3:COUP 0")     #decouple Receivers
-        self.write("SENS2:FOM:RANG2:COUP 0")     #decouple Source
-        ##
-        self.write("SENS2:FOM:RANG3:SWE:TYPE CW")    #set Receivers in CW mode
-        self.write("SENS2:FOM:RANG2:SWE:TYPE CW")    #set Source in CW mode
-        ##
-        self.write("SENS2:FOM:RANG3:FREQ:CW %s" %(f_probe_start)) #set cw freq to receivers
-        self.write("SENS2:FOM:RANG2:FREQ:CW %s" %(f_probe_start)) #set cw freq to source1
-        ##
-        self.write("SENS2:FOM:DISP:SEL 'Primary'")       #set x-axis to primary
-        ##
-        self.write("SOUR2:POW:COUP 0")                   #decouple powers
-        self.write("SOUR2:POW1 %s" %(probe_power))
-        self.write("SOUR2:POW3 %s" %(pump_power))
-        self.write("SOUR2:POW3:MODE ON")                 #switch on port3
-
-        self.write("CALC2:MARK1 ON")
-        self.write("CALC2:MARK1:FUNC MAX")
-        self.write("CALC2:MARK1:FUNC:TRAC ON")
+        #send the configuration as a few compound commands
+        with self.batch():
+            #setup two displays
+            self.write("DISP:WIND1:STATE ON")
+            self.write("DISP:WIND2:STATE ON")
+
+            ###setup probe scan (magnitude)
+            self.write("CALC1:PAR:DEF:EXT 'CH1_S21_S1', 'B,1'")
+            self.write("DISP:WIND1:TRACE1:FEED 'CH1_S21_S1'")
+            self.write("CALC1:PAR:SEL 'CH1_S21_S1'")
+            self.write("CALC1:FORM MLOG")
+
+            #setup triggering per channel
+            self.write("INIT:CONT OFF")
+            self.write("SENS1:SWE:MODE HOLD")
+            self.write("TRIG:SCOP CURR")
+
+
+            ###setup probe scan more
+            self.write("SENS:FREQ:START %s" % (f_probe_start))
+            self.write("SENS:FREQ:STOP %s" % (f_probe_stop))
+            self.write("SENS:SWE:POIN %s" % (f_probe_points))
+            self.write("SENS:BWID %s" % (probe_ifbw))
+            self.write("SOUR:POW1 %s" %(probe_power))
+
+            #do settings for Marker for the probe
+            self.write("CALC1:MARK:REF ON")
+            self.write("CALC1:MARK:REF:X " + str(f_probe_start))
+            self.write("CALC1:MARK1 ON")
+            self.write("CALC1:MARK1:FUNC MIN")
+            self.write("CALC1:MARK1:FUNC:TRAC ON")
+            self.write("CALC1:MARK1:DELT ON")
+            self.write("CALC1:MARK2 ON")
+            self.write("CALC1:MARK2:FUNC MIN")
+            self.write("CALC1:MARK2:FUNC:TRAC ON")
+
+
+
+            ###setup two tone scan
+            self.write("CALC2:PAR:DEF:EXT 'CH2_S21_S1', 'B,1'")
+            self.write("DISP:WIND2:TRACE1:FEED 'CH2_S21_S1'")
+            self.write("CALC2:PAR:SEL 'CH2_S21_S1'")
+            self.write("CALC2:FORM MLOG")
+            ##
+            self.write("SENS2:FREQ:START %s" % (f_pump_start))
+            self.write("SENS2:FREQ:STOP %s" % (f_pump_stop))
+            self.write("SENS2:SWE:POIN %s" % (f_pump_points))
+            self.write("SENS2:BWID %s" % (pump_ifbw))
+
+            ##
+            ##
+            self.write("SENS2:FOM:STATE 1")      #switch on Frequency Offset Module
+            self.write("SENS2:FOM:RANG3:COUP 0")     #decouple Receivers
+            self.write("SENS2:FOM:RANG2:COUP 0")     #decouple Source
+            ##
+            self.write("SENS2:FOM:RANG3:SWE:TYPE CW")    #set Receivers in CW mode
+            self.write("SENS2:FOM:RANG2:SWE:TYPE CW")    #set Source in CW mode
+            ##
+            self.write("SENS2:FOM:RANG3:FREQ:CW %s" %(f_probe_start)) #set cw freq to receivers
+            self.write("SENS2:FOM:RANG2:FREQ:CW %s" %(f_probe_start)) #set cw freq to source1
+            ##
+            self.write("SENS2:FOM:DISP:SEL 'Primary'")       #set x-axis to primary
+            ##
+            self.write("SOUR2:POW:COUP 0")                   #decouple powers
+            self.write("SOUR2:POW1 %s" %(probe_power))
+            self.write("SOUR2:POW3 %s" %(pump_power))
+            self.write("SOUR2:POW3:MODE ON")                 #switch on port3
+
+            self.write("CALC2:MARK1 ON")
+            self.write("CALC2:MARK1:FUNC MAX")
+            self.write("CALC2:MARK1:FUNC:TRAC ON")
 
     def TwoToneProbeForMin(self):
 
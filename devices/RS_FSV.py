@@ -132,13 +132,10 @@ class RS_FSV(basesa):
         yunit = self.GetUnit()
         if measmode == 'SAN':
             self.SetContinuous(False)
-            self.write('INIT')
-            # sleep for averaging time, otherwise timeout
             navg = self.GetAverages()
             tt = self.GetSweepTime()
-            sleeptime = navg * tt
-            print('Measurement in progress. Waiting for {}s'.format(sleeptime))
-            time.sleep(sleeptime)
+            # wait for the sweeps to complete, allowing twice the expected time
+            self.write_and_wait('INIT', timeout=2 * navg * tt + 10)
             xvals = self.query('TRAC:DATA:X? TRACE{}'.format(ch))
             yvals = self.query('TRAC? TRACE{}'.format(ch))
             xvals = np.array([float(x) for x in xvals.split(',')])
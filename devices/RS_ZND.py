@@ -33,14 +33,13 @@ class RS_ZND(basepna):
 
         mystr = numtostr(x)
         mystr = 'BAND '+mystr
-        self.write(mystr)
+        self.write_cached(mystr, 'SENS:BWID?', x)
 
 
 ## OBLIGATORY ABSTRACT METHODS TO BE IMPLEMENTED
 
     def GetFrequency(self):
-        freq = self.query('CALC:DATA:STIM?')
-        freq = np.asarray([float(xx) for xx in freq.split(',')])
+        freq = self.query_array('CALC:DATA:STIM?')
         return freq
 
     def GetTraceNames(self):
@@ -52,10 +51,9 @@ class RS_ZND(basepna):
     def SetActiveTrace(self,mystr):
         self.write('CALC:PAR:SEL "%s"' % mystr)
     def GetTraceData(self):
-        yy = self.query("CALC:DATA? SDATA")
-        yy = np.asarray([float(xx) for xx in yy.split(',')])
-        yyre = yy[::2]
-        yyim = yy[1::2]
+        yy = self.query_complex("CALC:DATA? SDATA")
+        yyre = yy.real
+        yyim = yy.imag
         return yyre,yyim
 
     def CalOn (self):
@@ -67,6 +65,14 @@ class RS_ZND(basepna):
     def GetCal(self):
         return bool(int(self.query('CORR?')))
 
+    def GetAllTraceData(self, pars, uncal=False):
+        #Traces are read by name so no selection is needed and all of them are read with a
+        #single compound query (in ASCII mode).  Uncorrected data (NCD) can be read directly
+        #without switching the calibration off and on again
+        fmt = 'NCD' if uncal else 'SDAT'
+        return self.query_complex_multi(
+            ["CALC:DATA:TRAC? '%s', %s" % (par, fmt) for par in pars])
+
 
 ## Optional methods
 
@@ -33,14 +33,14 @@ class RS_ZVB_pna(basepna):
     def SetIFBW(self, x):
         mystr = numtostr(x)
         mystr = 'BAND ' + mystr
-        self.write(mystr)
+        self.write_cached(mystr, 'SENS:BWID?', x)
 
-    def GetAllData(self):
-        data = super(RS_ZVB_pna, self).GetAllData()
+    def GetAllData(self, keep_uncal=True):
+        data = super(RS_ZVB_pna, self).GetAllData(keep_uncal)
         #Check if a time sweep.  If so, replace column title "Frequency" with "Time"
         if 'XTIM' in self.query('FUNC?'):
             datasub = stlabdict([('Time (s)', v) if k == 'Frequency (Hz)' else
-                                 (k, v) for k, v in d.items()])
+                                 (k, v) for k, v in data.items()])
             return datasub
         else:
             return data
@@ -48,8 +48,7 @@ class RS_ZVB_pna(basepna):
 ##### ABSTRACT METHODS TO BE IMPLEMENTED ON A PER PNA BASIS #####################
 
     def GetFrequency(self):
-        freq = self.query('CALC:DATA:STIM?')
-        freq = np.asarray([float(xx) for xx in freq.split(',')])
+        freq = self.query_array('CALC:DATA:STIM?')
         return freq
 
     def GetTraceNames(self):
@@ -63,10 +62,9 @@ class RS_ZVB_pna(basepna):
         self.write('CALC:PAR:SEL "%s"' % mystr)
 
     def GetTraceData(self):
-        yy = self.query("CALC:DATA? SDATA")
-        yy = np.asarray([float(xx) for xx in yy.split(',')])
-        yyre = yy[::2]
-        yyim = yy[1::2]
+        yy = self.query_complex("CALC:DATA? SDATA")
+        yyre = yy.real
+        yyim = yy.imag
         return yyre, yyim
 
     def CalOn(self):
@@ -171,12 +171,8 @@ class Rigol_DS1054(instrument):
         yori = float(self.query('WAV:YOR?'))
         yref = float(self.query('WAV:YREF?'))
 
-        self.write(':WAV:DATA?')  # dat = unused variable
-        output = self.dev.read_raw()
-        npoints = int(output[2:11].decode('ascii'))
-        print(npoints)
-        output = [(x - yori - yref) * yinc for x in output[11:]]
-        output = np.array(output[:npoints])
+        output = self.query_binary_block(':WAV:DATA?', 'u1')
+        output = (output - yori - yref) * yinc
         xs = np.linspace(0, tscale * 12, len(output))
         return xs, output
 
@@ -235,12 +231,9 @@ class Rigol_DS1054(instrument):
                 self.write('WAV:STOP {}'.format(nsamp))
             else:
                 self.write('WAV:STOP {}'.format((i + 1) * nmax))
-            self.write('WAV:DATA?')
-            output = self.dev.read_raw()
-            npoints = int(output[2:11].decode('ascii'))
-            print(i, npoints)
-            output = [(x - yori - yref) * yinc for x in output[11:]]
-            output = output[:npoints]
+            output = self.query_binary_block('WAV:DATA?', 'u1')
+            print(i, len(output))
+            output = (output - yori - yref) * yinc
             data.append(output)
-        data = np.asarray(data).flatten()
+        data = np.concatenate(data)
         return data
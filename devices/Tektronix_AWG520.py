@@ -19,7 +19,7 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
-from instrument import instrument
+from .instrument import instrument
 import types
 import time
 from datetime import datetime
@@ -27,6 +27,7 @@ import logging
 import numpy as np
 import struct
 import os
+import errno
 
 
 class Tektronix_AWG520(instrument):
@@ -45,29 +46,33 @@ class Tektronix_AWG520(instrument):
     '''
 
     def __init__(self,
-                 name,
                  addr,
                  reset=False,
+                 verb=False,
+                 name='AWG',
                  numpoints=1000,
                  awg_file_dir="D:\\AWG_sequences\\",
                  **kw):
         '''
         Initializes the AWG520.
         Input:
-            name (string)    : name of the instrument
-            address (string) : GPIB address
+            addr (string)    : GPIB address (or an open resource, as given by autodetect)
             reset (bool)     : resets to default values, default=false
+            verb (bool)      : print the strings sent to the instrument
+            name (string)    : name of the instrument
             numpoints (int)  : sets the number of datapoints
         Output:
             None
         '''
         logging.debug(__name__ + ' : Initializing instrument')
+        kw.setdefault('read_termination', '\n')
         super(Tektronix_AWG520, self).__init__(addr=addr,
                                                reset=False,
-                                               verb=False,
-                                               read_termination='\n')
+                                               verb=verb,
+                                               **kw)
 
-        self._address = addr
+        self._name = name
+        self._address = self.dev.resource_name
 
         self._values = {}
         self._values['files'] = {}
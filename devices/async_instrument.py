@@ -0,0 +1,179 @@
+"""Asyncio front-end for blocking instrument drivers
+
+All drivers in this package are blocking: a call to :code:`query` or :code:`GetAllData`
+returns only when the instrument has answered.  A measurement that reads several
+instruments one after the other therefore adds up all the waiting times.
+:any:`AsyncInstrument` wraps an already instantiated driver (any :any:`instrument`, or a
+socket based wrapper like :any:`BFWrapper` or :any:`TritonWrapper`) and exposes its methods
+as coroutines.  The blocking calls are run in a thread dedicated to the instrument, so
+several instruments can be read in parallel using :code:`asyncio.gather`::
+
+    import asyncio
+    from stlab.devices.async_instrument import AsyncInstrument
+
+    async def acquire(vna, dmm, fridge):
+        return await asyncio.gather(
+            vna.GetAllData(), dmm.query('READ?'), fridge.GetTemperature(6))
+
+    avna = AsyncInstrument(pna)
+    admm = AsyncInstrument(keithley)
+    afridge = AsyncInstrument(bfwrapper)
+    data, volt, temp = asyncio.run(acquire(avna, admm, afridge))
+
+Calls on the same resource are never executed concurrently, even if the resource is
+wrapped by more than one :any:`AsyncInstrument` or used from several threads
+through the adapters.  The lock is per resource (VISA resource name or server address
+and port), so two driver objects pointing to the same device also share it.
+
+"""
+
+import asyncio
+import contextlib
+import functools
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncInstrument():
+    """Asynchronous adapter for a blocking instrument driver
+
+    Any method of the wrapped driver can be called through the adapter and returns an
+    awaitable (e.g. :code:`await ainst.GetPower()`).  :any:`write`, :any:`query` and
+    :any:`query_binary_block` are provided explicitly, as well as :any:`batch` (an
+    asynchronous context manager).  Attributes that are not callable and the methods in
+    :code:`passthrough` that do not talk to the instrument are returned as is.
+
+    Parameters
+    ----------
+    inst : instrument or base_instrument
+        Driver object to wrap.  Should already have been instantiated (and reset if needed)
+
+    Attributes
+    ----------
+    inst : instrument or base_instrument
+        The wrapped driver.  Can still be used directly for blocking calls
+    executor : concurrent.futures.ThreadPoolExecutor
+        Single thread executor where all calls for this instrument are run
+    lock : threading.Lock
+        Lock shared by all adapters of the same resource
+
+    """
+    locks = {}  #Static dictionary of per resource locks shared by all adapters
+    locks_lock = threading.Lock()
+    #Driver methods that do no I/O and are returned unwrapped
+    passthrough = {'setcache', 'clearcache', 'setverbose', 'MetaGetters'}
+
+    def __init__(self, inst):
+        self.inst = inst
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        key = self.resource_key(inst)
+        with AsyncInstrument.locks_lock:
+            if key not in AsyncInstrument.locks:
+                AsyncInstrument.locks[key] = threading.Lock()
+            self.lock = AsyncInstrument.locks[key]
+
+    @staticmethod
+    def resource_key(inst):
+        """Identifier of the resource used by a driver
+
+        Parameters
+        ----------
+        inst : instrument or base_instrument
+            Driver object
+
+        Returns
+        -------
+        str or tuple
+            VISA resource name for visa instruments, (address, port) for socket wrappers
+            or the object id if neither is available
+
+        """
+        try:
+            return inst.dev.resource_name
+        except AttributeError:
+            pass
+        if hasattr(inst, 'addr') and hasattr(inst, 'port'):
+            return (inst.addr, inst.port)
+        return id(inst)
+
+    def _locked(self, func, args, kwargs):
+        with self.lock:
+            return func(*args, **kwargs)
+
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking function in the instrument executor while holding the resource lock
+
+        Parameters
+        ----------
+        func : callable
+            Function to run.  Usually a bound method of the wrapped driver
+        *args, **kwargs
+            Arguments passed to func
+
+        Returns
+        -------
+        The return value of func
+
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._locked, func,
+                                          args, kwargs)
+
+    async def write(self, mystr):
+        """Asynchronous version of the driver write method
+
+        """
+        return await self.run(self.inst.write, mystr)
+
+    async def query(self, mystr):
+        """Asynchronous version of the driver query method
+
+        """
+        return await self.run(self.inst.query, mystr)
+
+    async def query_binary_block(self, mystr, dtype='f8', endianness='>'):
+        """Asynchronous version of :any:`instrument.query_binary_block`
+
+        """
+        return await self.run(self.inst.query_binary_block, mystr, dtype,
+                              endianness)
+
+    @contextlib.asynccontextmanager
+    async def batch(self, maxlen=None):
+        """Asynchronous version of :any:`instrument.batch`
+
+        Use with :code:`async with`.  The writes awaited inside the block are collected and
+        sent when the block ends, in the instrument thread while holding the resource lock::
+
+            async with apna.batch():
+                await apna.SetPoints(51)
+                await apna.SetIFBW(100.)
+
+        """
+        manager = self.inst.batch(maxlen)
+        await self.run(manager.__enter__)
+        try:
+            yield self
+        except BaseException:
+            if not await self.run(manager.__exit__, *sys.exc_info()):
+                raise
+        else:
+            await self.run(manager.__exit__, None, None, None)
+
+    def __getattr__(self, name):
+        attr = getattr(self.inst, name)
+        if not callable(attr) or name in self.passthrough or name.startswith('_'):
+            return attr
+
+        @functools.wraps(attr)
+        async def wrapper(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        return wrapper
+
+    def close(self):
+        """Shut down the executor thread.  The wrapped driver is not closed
+
+        """
+        self.executor.shutdown(wait=True)
@@ -2,9 +2,13 @@
 
 """
 
-from .instrument import instrument
-from pydoc import locate
+from .instrument import instrument, makeRM
+import importlib
+import json
 import os.path
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 
 class DeviceNotFound(Exception):
@@ -27,6 +31,9 @@ def get_instr_definitions():
 
 devdict = get_instr_definitions()
 
+#Default location of the scan cache.  Maps address to id string and driver
+cachefile = os.path.join(os.path.expanduser('~'), '.stlab_instruments.json')
+
 
 class test_instrument(
         instrument
@@ -35,6 +42,87 @@ class test_instrument(
         return self.id()
 
 
+def find_driver(idstr):
+    """Find the driver name for an id string
+
+    The comma separated fields of the id string are looked up in :code:`devdict` (loaded
+    from :code:`dev_ids.txt`).  Usually the model is the second field.
+
+    Parameters
+    ----------
+    idstr : str
+        Reply to ``*IDN?``
+
+    Returns
+    -------
+    str
+        Driver name (module and class name in stlab.devices)
+
+    Raises
+    ------
+    DeviceNotFound
+        If no field of the id string is a known model
+
+    """
+    for field in idstr.split(','):
+        field = field.strip()
+        if field in devdict:
+            return devdict[field]
+    raise DeviceNotFound(
+        'Id string retrieved ("{}"), but not among known devices'.format(
+            idstr.strip()))
+
+
+def load_driver(devstr):
+    """Return the driver class with the given name from stlab.devices
+
+    """
+    module = importlib.import_module('.' + devstr, __package__)
+    return getattr(module, devstr)
+
+
+def identify(addr, verb=True, timeout=None, query_delay=0., **kwargs):
+    """Open a resource and query its id string
+
+    Parameters
+    ----------
+    addr : str
+        Visa address string
+    verb : bool, optional
+        If True, prints the id string
+    timeout : float or None, optional
+        Visa timeout in ms used for the id query.  If None, the default is used
+    query_delay : float, optional
+        Delay in s between writing the id query and reading the reply.  Only needed for slow
+        instruments
+    kwargs
+        Additional parameters to be passed to the visa.open_instrument method
+
+    Returns
+    -------
+    (pyvisa.resources.Resource, str)
+        The open resource (to be passed on to the driver) and the id string
+
+    """
+    probe = test_instrument(
+        addr, reset=False, verb=verb, query_delay=query_delay, **kwargs)
+    dev = probe.dev
+    oldtimeout = dev.timeout
+    if timeout is not None:
+        dev.timeout = timeout
+    try:
+        idstr = dev.query('*IDN?')
+    except Exception:
+        dev.close()
+        raise
+    finally:
+        dev.timeout = oldtimeout
+    dev.query_delay = 0.
+    if verb:
+        print(idstr)
+    return dev, idstr
+
+
 def autodetect_instrument(addr, reset=True, verb=True, **kwargs):
     """Autodetect instrument function
 
@@ -42,6 +130,7 @@ def autodetect_instrument(addr, reset=True, verb=True, **kwargs):
     a new session with it using its corresponding driver.  It uses the response from :code:`*IDN?`
     to identify the correct driver to load from the :code:`dev_ids.txt` file.  This file contains
     model string and driver name pairs that this function searches in to find the correct driver.
+    The resource opened to query the id is handed over to the driver (not opened twice).
 
     Parameters
     ----------
@@ -56,33 +145,161 @@ def autodetect_instrument(addr, reset=True, verb=True, **kwargs):
 
     """
 
-    dev = test_instrument(addr, reset, verb, query_delay=100e-3, **kwargs)
-    idstr = dev.id()
-
-    dev.close()
-
-    found = False
-    for idtag in devdict:
-        if (',' + idtag + ',' in idstr) or (', ' + idtag + ',' in idstr) or (
-                ',' + idtag + ' ,' in idstr):
-            found = True
-            devstr = devdict[idtag]
-            devclass = '.' + devstr + '.' + devstr
-            print('Device found at address {}: {}'.format(addr, devstr))
-            break
-    if found is False:
-        raise DeviceNotFound(
-            'Id string retrieved ("{}"), but not among known devices'.format(
-                idstr))
+    dev, idstr = identify(addr, verb, query_delay=100e-3, **kwargs)
+    try:
+        devstr = find_driver(idstr)
+    except DeviceNotFound:
+        dev.close()
+        raise
+    print('Device found at address {}: {}'.format(addr, devstr))
 
-    devclass = locate(devclass)
+    devclass = load_driver(devstr)
 
     dev = devclass(
-        addr, reset, verb,
+        dev, reset, verb,
         **kwargs)  #Instantiate with the proper instrument and device
     return dev
 
 
+def load_cache(filename=None):
+    """Load the instrument scan cache
+
+    Parameters
+    ----------
+    filename : str or None, optional
+        Cache file.  :code:`cachefile` if None
+
+    Returns
+    -------
+    dict
+        Address as key and dict with keys 'idn', 'driver' and 'time' as value.  Empty if the
+        file does not exist or can not be read
+
+    """
+    try:
+        with open(filename or cachefile, 'r') as ff:
+            return json.load(ff)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache, filename=None):
+    """Save the instrument scan cache
+
+    """
+    try:
+        with open(filename or cachefile, 'w') as ff:
+            json.dump(cache, ff, indent=1)
+    except OSError:
+        print('Could not write instrument cache {}'.format(filename or cachefile))
+
+
+def scan_instruments(addresses='all',
+                     reset=True,
+                     verb=True,
+                     connect=True,
+                     timeout=1000,
+                     max_workers=16,
+                     ttl=24 * 3600.,
+                     cache=None,
+                     **kwargs):
+    """Detect and connect to many instruments in parallel
+
+    Each address is handled in a separate thread: the resource is opened, its id queried
+    with a short timeout and the matching driver instantiated on the already open
+    resource.  Address to driver mappings are cached on disk.  While a cache entry is valid it
+    is trusted: no id is queried and the cached driver is instantiated directly (with
+    :code:`connect` False, the entry is returned if the address is still listed by the resource
+    manager).  If that fails, the instrument is identified again.  If an instrument is swapped
+    for another one at the same address, remove its entry from the cache file.  Addresses that
+    do not respond or are not known devices are skipped with a message.
+
+    Parameters
+    ----------
+    addresses : str or list of str, optional
+        Visa addresses to scan.  If 'all', all resources listed by the resource manager
+        are scanned
+    reset : bool, optional
+        Passed to the drivers
+    verb : bool, optional
+        Passed to the drivers.  Also prints the results of the scan
+    connect : bool, optional
+        If False, only identifies the instruments and returns the driver names
+        (the resources are closed)
+    timeout : float, optional
+        Visa timeout in ms for the id query
+    max_workers : int, optional
+        Maximum number of instruments handled simultaneously
+    ttl : float, optional
+        Time in seconds a cache entry stays valid.  0 disables the cache
+    cache : str or None, optional
+        Cache file.  :code:`cachefile` (in the user home folder) if None
+    kwargs
+        Additional parameters passed to all drivers
+
+    Returns
+    -------
+    collections.OrderedDict
+        Address as key and driver instance (or driver name if :code:`connect` is False)
+        as value, in the order of the given addresses
+
+    """
+    if not instrument.global_rs or not instrument.rstype:
+        instrument.global_rs, instrument.rstype = makeRM()
+    known = load_cache(cache) if ttl else {}
+    now = time.time()
+    present = []
+    if addresses == 'all' or (not connect and known):
+        present = list(instrument.global_rs.list_resources())
+    if addresses == 'all':
+        addresses = present
+    elif isinstance(addresses, str):
+        addresses = [addresses]
+
+    def scan_one(addr):
+        entry = known.get(addr)
+        if entry and now - entry['time'] < ttl:
+            #Trust the cache.  Identify again only if the cached driver can not be opened
+            if not connect:
+                if addr in present:
+                    return entry, entry['driver']
+            else:
+                try:
+                    devclass = load_driver(entry['driver'])
+                    return entry, devclass(addr, reset, verb, **kwargs)
+                except Exception:
+                    pass
+        dev, idstr = identify(addr, False, timeout, **kwargs)
+        try:
+            entry = {'idn': idstr.strip(), 'driver': find_driver(idstr), 'time': now}
+        except DeviceNotFound:
+            dev.close()
+            raise
+        if not connect:
+            dev.close()
+            return entry, entry['driver']
+        devclass = load_driver(entry['driver'])
+        return entry, devclass(dev, reset, verb, **kwargs)
+
+    result = OrderedDict()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [(addr, pool.submit(scan_one, addr)) for addr in addresses]
+        for addr, fut in futures:
+            try:
+                entry, dev = fut.result()
+            except Exception as err:
+                if verb:
+                    print('No instrument detected at {}: {}'.format(addr, err))
+                continue
+            known[addr] = entry
+            result[addr] = dev
+            if verb:
+                print('Device found at address {}: {}'.format(addr, entry['driver']))
+    if ttl:
+        save_cache(known, cache)
+    return result
+
+
 if __name__ == "__main__":
     addr = input('Enter VISA string:\n')
     dev = autodetect_instrument('TCPIP::192.168.1.23::INSTR')
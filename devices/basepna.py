@@ -8,22 +8,10 @@ from stlabutils.stlabdict import stlabdict as stlabdict
 import numpy as np
 import pandas as pd
 import time
+from collections import OrderedDict
 
 import abc
 
-from contextlib import contextmanager
-import sys, os
-
-@contextmanager
-def suppress_stdout():
-    with open(os.devnull, "w") as devnull:
-        old_stdout = sys.stdout
-        sys.stdout = devnull
-        try:
-            yield
-        finally:
-            sys.stdout = old_stdout
-
 def numtostr(mystr):
     return '%20.15e' % mystr
 
@@ -31,6 +19,9 @@ def numtostr(mystr):
 class basepna(instrument, abc.ABC):
 
     def __init__(self, addr, reset, verb):
+        #Trace and frequency data are transferred in ASCII until SetBinaryTransfer is called
+        self.binary_transfer = False
+        self.last_timing = OrderedDict()  #Time spent in each step of the last GetAllData
         super().__init__(addr, reset, verb)
         #Remove timeout so long measurements do not produce -420 "Unterminated Query"
         self.dev.timeout = None
@@ -40,6 +31,111 @@ class basepna(instrument, abc.ABC):
 
 ##### METHODS THAT CAN GENERALLY BE USED ON ALL PNAs.  REIMPLEMENT IF NECESSARY #######
 
+    def reset(self):
+        super().reset()
+        #*RST returns the data format to ASCII.  Restore the negotiated binary format
+        if self.binary_transfer:
+            self.SetBinaryTransfer(True)
+
+    def SetBinaryTransfer(self, binary=True):
+        """Select binary or ASCII transfer of trace and frequency data
+
+        In binary mode the instrument is set to ``FORM:DATA REAL,64`` with swapped
+        (little endian) byte order once for the session and all trace and frequency
+        data are read as IEEE-488.2 binary blocks.  The format is then confirmed by querying
+        ``FORM:DATA?``.  If the instrument does not report the binary format, ASCII
+        transfer is kept as a fallback.  Leaving binary mode also restores the normal (big
+        endian) byte order used by :any:`GetFrequencyPrecise`.
+
+        Parameters
+        ----------
+        binary : bool, optional
+            If True, use binary REAL,64 transfer.  If False, use ASCII transfer
+
+        Returns
+        -------
+        bool
+            True if binary transfer is active after the call
+
+        """
+        if binary:
+            self.write('FORM:DATA REAL,64')
+            self.write('FORM:BORD SWAP')
+            fmt = self.query('FORM:DATA?').upper()
+            binary = 'REAL' in fmt and '64' in fmt
+            if not binary:
+                print('Binary transfer not supported.  Using ASCII')
+        if not binary:
+            self.write('FORM:DATA ASC,0')
+            if self.binary_transfer:
+                self.write('FORM:BORD NORM')
+        self.binary_transfer = binary
+        return binary
+
+    def GetBinaryTransfer(self):
+        return self.binary_transfer
+
+    def query_array(self, mystr):
+        """Query an array of floats in the current transfer format
+
+        Parameters
+        ----------
+        mystr : str
+            Query string for the data (e.g. ``'CALC:DATA? SDATA'``)
+
+        Returns
+        -------
+        numpy.ndarray
+            Float64 array with the data
+
+        """
+        if self.binary_transfer:
+            return self.query_binary_block(mystr, 'f8', '<')
+        yy = self.query(mystr)
+        return np.array(yy.split(','), dtype=float)
+
+    def query_complex(self, mystr):
+        """Query an array of interleaved real and imaginary values as complex numbers
+
+        Parameters
+        ----------
+        mystr : str
+            Query string for the data (e.g. ``'CALC:DATA? SDATA'``)
+
+        Returns
+        -------
+        numpy.ndarray
+            complex128 view on the received data (no copy is made)
+
+        """
+        yy = self.query_array(mystr)
+        return yy.view(np.dtype(complex).newbyteorder(yy.dtype.byteorder))
+
+    def query_complex_multi(self, queries):
+        """Run several :any:`query_complex` queries with as few round trips as possible
+
+        In ASCII transfer mode, all queries are sent in a single compound message and the
+        replies (separated by ``;``) are read at once.  In binary mode each query is done
+        separately, since the binary blocks of a compound reply can not be told apart
+        reliably.
+
+        Parameters
+        ----------
+        queries : list of str
+            Query strings for the data.  All replies must have the same length
+
+        Returns
+        -------
+        numpy.ndarray
+            Complex array of shape (len(queries), npoints)
+
+        """
+        if self.binary_transfer:
+            return np.array([self.query_complex(x) for x in queries])
+        yy = self.query(';:'.join(x.lstrip(':') for x in queries))
+        yy = np.array(yy.replace(';', ',').split(','), dtype=float)
+        return yy.view(complex).reshape(len(queries), -1)
+
     def SetContinuous(self, var=True):
         if var:
             self.write('INIT:CONT 1')  #Turn on continuous mode
@@ -50,90 +146,81 @@ class basepna(instrument, abc.ABC):
     def SetStart(self, x):
         mystr = numtostr(x)
         mystr = 'SENS:FREQ:STAR ' + mystr
-        self.write(mystr)
+        self.write_cached(mystr, 'SENS:FREQ:STAR?', x,
+                          ('SENS:FREQ:STOP?', 'SENS:FREQ:CENT?', 'SENS:FREQ:SPAN?'))
 
     def SetEnd(self, x):
         mystr = numtostr(x)
         mystr = 'SENS:FREQ:STOP ' + mystr
-        self.write(mystr)
+        self.write_cached(mystr, 'SENS:FREQ:STOP?', x,
+                          ('SENS:FREQ:STAR?', 'SENS:FREQ:CENT?', 'SENS:FREQ:SPAN?'))
 
     def SetCenter(self, x):
         mystr = numtostr(x)
         mystr = 'SENS:FREQ:CENT ' + mystr
-        self.write(mystr)
+        self.write_cached(mystr, 'SENS:FREQ:CENT?', x,
+                          ('SENS:FREQ:STAR?', 'SENS:FREQ:STOP?'))
 
     def SetSpan(self, x):
         mystr = numtostr(x)
         mystr = 'SENS:FREQ:SPAN ' + mystr
-        self.write(mystr)
+        self.write_cached(mystr, 'SENS:FREQ:SPAN?', x,
+                          ('SENS:FREQ:STAR?', 'SENS:FREQ:STOP?'))
 
     def GetStart(self):
         mystr = 'SENS:FREQ:STAR?'
-        pp = self.query(mystr)
-        pp = float(pp)
+        pp = self.query_cached(mystr, float)
         return pp
 
     def GetEnd(self):
         mystr = 'SENS:FREQ:STOP?'
-        pp = self.query(mystr)
-        pp = float(pp)
+        pp = self.query_cached(mystr, float)
         return pp
 
     def GetCenter(self):
         mystr = 'SENS:FREQ:CENT?'
-        pp = self.query(mystr)
-        pp = float(pp)
+        pp = self.query_cached(mystr, float)
         return pp
 
     def GetSpan(self):
         mystr = 'SENS:FREQ:SPAN?'
-        pp = self.query(mystr)
-        pp = float(pp)
+        pp = self.query_cached(mystr, float)
         return pp
 
     def SetIFBW(self, x):
         mystr = numtostr(x)
         mystr = 'SENS:BWID ' + mystr
-        self.write(mystr)
+        self.write_cached(mystr, 'SENS:BWID?', x)
 
     def GetIFBW(self):
         mystr = 'SENS:BWID?'
-        pp = self.query(mystr)
-        pp = float(pp)
+        pp = self.query_cached(mystr, float)
         return pp
 
     def SetPower(self, x):
         mystr = numtostr(x)
         mystr = 'SOUR:POW ' + mystr
-        self.write(mystr)
+        self.write_cached(mystr, 'SOUR:POW?', x)
 
     def GetPower(self):
         mystr = 'SOUR:POW?'
-        pp = self.query(mystr)
-        pp = float(pp)
+        pp = self.query_cached(mystr, float)
         return pp
 
     def SetPoints(self, x):
         mystr = '%d' % x
         mystr = 'SENS:SWE:POIN ' + mystr
-        self.write(mystr)
+        self.write_cached(mystr, 'SENS:SWE:POIN?', x)
 
     def GetPoints(self):
         mystr = 'SENS:SWE:POIN?'
-        pp = self.query(mystr)
-        pp = int(pp)
+        pp = self.query_cached(mystr, int)
         return pp
 
-    def Trigger(self, block=True):
+    def Trigger(self, block=True, timeout=None):
         if block:
-            self.write('*CLS')
-            self.write('INIT; *OPC')
-
-            done = 0
-            while done != 1:
-                with suppress_stdout():
-                    done = int(self.query('*ESR?'))&1 ## bitwise check if the first bit (OPC bit) of the status registry == 1
-                time.sleep(0.1)
+            #Waits for the sweep to complete (service request if available, otherwise *ESR? polling)
+            self.write_and_wait('INIT', timeout)
         else:
             self.write('INIT')
         return
@@ -175,46 +262,23 @@ class basepna(instrument, abc.ABC):
 
     @abc.abstractmethod
     def GetFrequency(self):
-        freq = self.query('CALC:X?')
-        freq = np.asarray([float(xx) for xx in freq.split(',')])
+        freq = self.query_array('CALC:X?')
         return freq
 
     def GetFrequencyPrecise(self):
+        # Frequencies are already read in binary format
+        if self.binary_transfer:
+            return self.GetFrequency()
+
         # Tell the pna to communicate in binary format
         self.write('FORM:DATA Real,64')
 
         # Read frequencies in raw binary format
-        self.write('CALC:X?')
-        raw = self.read_raw()
-
-
-        # Convert binary data to numpy array
-        if raw[0:1] != b'#':
-            raise ValueError("Not a SCPI binary block")
-
-        ndigits = int(raw[1:2].decode())
-
-        length_str = raw[2:2+ndigits].decode()
-        nbytes = int(length_str)
-
-        n_total = 2 + ndigits + nbytes + 1
-
-        while len(raw) < n_total:
-            raw += self.read_raw()
-
-
-        start = 2 + ndigits
-        end = start + nbytes
-        data = raw[start:end]
-
-        if len(data) % 8 != 0:
-            raise ValueError(f"Binary payload size {len(data)} is not divisible by 8")
+        freq = self.query_binary_block('CALC:X?', 'f8', '>')  # big-endian float64
 
         # Put pna back in ASCII encoding
         self.write('FORM:DATA ASC,0')
 
-        freq = np.frombuffer(data, dtype='>f8')  # big-endian float64
-
         return freq
 
     @abc.abstractmethod
@@ -231,10 +295,9 @@ class basepna(instrument, abc.ABC):
 
     @abc.abstractmethod
     def GetTraceData(self):
-        yy = self.query("CALC:DATA? SDATA")
-        yy = np.asarray([float(xx) for xx in yy.split(',')])
-        yyre = yy[::2]
-        yyim = yy[1::2]
+        yy = self.query_complex("CALC:DATA? SDATA")
+        yyre = yy.real
+        yyim = yy.imag
         return yyre, yyim
 
     @abc.abstractmethod
@@ -262,47 +325,111 @@ class basepna(instrument, abc.ABC):
         self.SetCenter(center)
         self.SetSpan(span)
 
+    def GetAllTraceData(self, pars, uncal=False):
+        """Get the complex data of several traces
+
+        Generic implementation that selects each trace in turn and reads it with
+        :any:`GetTraceData` (one query per trace, since the selection and data commands
+        differ between instruments).  For uncalibrated data the correction is switched off
+        during the readout.  Drivers reimplement this with the bulk transfer commands of their
+        instrument (e.g. ``CALC:DATA:MSD?`` in :any:`PNAN5221A`) or with
+        :any:`query_complex_multi` to reduce the number of round trips.
+
+        Parameters
+        ----------
+        pars : list of str
+            Trace identifiers as returned by :any:`GetTraceNames`
+        uncal : bool, optional
+            If True, read the uncorrected data instead of the calibrated data
+
+        Returns
+        -------
+        numpy.ndarray
+            Complex array of shape (len(pars), npoints)
+
+        """
+        if uncal:
+            self.CalOff()
+        data = None
+        for i, par in enumerate(pars):
+            self.SetActiveTrace(par)
+            yyre, yyim = self.GetTraceData()
+            if data is None:
+                data = np.empty((len(pars), len(yyre)), dtype=complex)
+            data[i].real = yyre
+            data[i].imag = yyim
+        if uncal:
+            self.CalOn()
+        return data
+
     def GetAllData(self, keep_uncal=True):
+        """Get frequency, all traces and power as a single table
+
+        All traces are read with :any:`GetAllTraceData` and the output table is built in a single
+        allocation.  The frequencies are read with :any:`GetFrequencyPrecise`.  The time spent in
+        each step of the acquisition is stored in :code:`self.last_timing` (in seconds).
+
+        Parameters
+        ----------
+        keep_uncal : bool, optional
+            If True and the calibration is on, also include the uncalibrated data
+
+        Returns
+        -------
+        stlabdict
+            Table with frequency, re, im, dB and phase of each trace and the power
+
+        """
+        return self._alldata(keep_uncal, self.GetFrequencyPrecise)
+
+    def _alldata(self, keep_uncal, getfrequency):
+        #Implementation of GetAllData and GetAllData_pd.  getfrequency reads the frequencies
+        timing = OrderedDict()
+        t0 = time.perf_counter()
         pars, parnames = self.GetTraceNames()
         self.SetActiveTrace(pars[0])
+        t1 = time.perf_counter()
+        timing['Trace names'] = t1 - t0
+        freq = getfrequency()
+        t0, t1 = t1, time.perf_counter()
+        timing['Frequency'] = t1 - t0
+        blocks = [self.GetAllTraceData(pars)]
+        t0, t1 = t1, time.perf_counter()
+        timing['Traces'] = t1 - t0
+        suffixes = ['']
+        if keep_uncal and self.GetCal():
+            blocks.append(self.GetAllTraceData(pars, uncal=True))
+            suffixes.append(' unc')
+            t0, t1 = t1, time.perf_counter()
+            timing['Uncalibrated traces'] = t1 - t0
+        power = self.GetPower()
+        t0, t1 = t1, time.perf_counter()
+        timing['Power'] = t1 - t0
+
         names = ['Frequency (Hz)']
-        alltrc = [self.GetFrequencyPrecise()]
-        for pp in parnames:
-            names.append('%sre ()' % pp)
-            names.append('%sim ()' % pp)
-            names.append('%sdB (dB)' % pp)
-            names.append('%sPh (rad)' % pp)
-        for par in pars:
-            self.SetActiveTrace(par)
-            yyre, yyim = self.GetTraceData()
-            alltrc.append(yyre)
-            alltrc.append(yyim)
-            yydb = 20. * np.log10(np.abs(yyre + 1j * yyim))
-            yyph = np.unwrap(np.angle(yyre + 1j * yyim))
-            alltrc.append(yydb)
-            alltrc.append(yyph)
-        Cal = self.GetCal()
-        if Cal and keep_uncal:
+        for suf in suffixes:
             for pp in parnames:
-                names.append('%sre unc ()' % pp)
-                names.append('%sim unc ()' % pp)
-                names.append('%sdB unc (dB)' % pp)
-                names.append('%sPh unc (rad)' % pp)
-            self.CalOff()
-            for par in pars:
-                self.SetActiveTrace(par)
-                yyre, yyim = self.GetTraceData()
-                alltrc.append(yyre)
-                alltrc.append(yyim)
-                yydb = 20. * np.log10(np.abs(yyre + 1j * yyim))
-                yyph = np.unwrap(np.angle(yyre + 1j * yyim))
-                alltrc.append(yydb)
-                alltrc.append(yyph)
-            self.CalOn()
-        final = stlabdict()
-        for name, data in zip(names, alltrc):
-            final[name] = data
-        final.addparcolumn('Power (dBm)', self.GetPower())
+                names.append('%sre%s ()' % (pp, suf))
+                names.append('%sim%s ()' % (pp, suf))
+                names.append('%sdB%s (dB)' % (pp, suf))
+                names.append('%sPh%s (rad)' % (pp, suf))
+        names.append('Power (dBm)')
+        table = np.empty((len(names), len(freq)))
+        table[0] = freq
+        for i, yy in enumerate(blocks):
+            ntrc = len(pars)
+            cols = table[1 + 4 * ntrc * i:1 + 4 * ntrc * (i + 1)]
+            cols = cols.reshape(ntrc, 4, len(freq))
+            cols[:, 0] = yy.real
+            cols[:, 1] = yy.imag
+            cols[:, 2] = 20. * np.log10(np.abs(yy))
+            cols[:, 3] = np.unwrap(np.angle(yy), axis=-1)
+        table[-1] = power
+        final = stlabdict(zip(names, table))
+        t0, t1 = t1, time.perf_counter()
+        timing['Table'] = t1 - t0
+        timing['Total'] = sum(timing.values())
+        self.last_timing = timing
         return final
 
     def MeasureScreen(self, keep_uncal=True, N_averages=1):
@@ -323,48 +450,8 @@ class basepna(instrument, abc.ABC):
         # return Dat
 
     def GetAllData_pd(self, keep_uncal=True):
-        pars, parnames = self.GetTraceNames()
-        self.SetActiveTrace(pars[0])
-        names = ['Frequency (Hz)']
-        alltrc = [self.GetFrequency()]
-        for pp in parnames:
-            names.append('%sre ()' % pp)
-            names.append('%sim ()' % pp)
-            names.append('%sdB (dB)' % pp)
-            names.append('%sPh (rad)' % pp)
-        for par in pars:
-            self.SetActiveTrace(par)
-            yyre, yyim = self.GetTraceData()
-            alltrc.append(yyre)
-            alltrc.append(yyim)
-            yydb = 20. * np.log10(np.abs(yyre + 1j * yyim))
-            yyph = np.unwrap(np.angle(yyre + 1j * yyim))
-            alltrc.append(yydb)
-            alltrc.append(yyph)
-        Cal = self.GetCal()
-        if Cal and keep_uncal:
-            for pp in parnames:
-                names.append('%sre unc ()' % pp)
-                names.append('%sim unc ()' % pp)
-                names.append('%sdB unc (dB)' % pp)
-                names.append('%sPh unc (rad)' % pp)
-            self.CalOff()
-            for par in pars:
-                self.SetActiveTrace(par)
-                yyre, yyim = self.GetTraceData()
-                alltrc.append(yyre)
-                alltrc.append(yyim)
-                yydb = 20. * np.log10(np.abs(yyre + 1j * yyim))
-                yyph = np.unwrap(np.angle(yyre + 1j * yyim))
-                alltrc.append(yydb)
-                alltrc.append(yyph)
-            self.CalOn()
-
-        final = pd.DataFrame()
-        for name, data in zip(names, alltrc):
-            final[name] = data
-        final['Power (dBm)'] = self.GetPower()
-        return final
+        #Frequencies are read with GetFrequency (GetAllData uses GetFrequencyPrecise)
+        return pd.DataFrame(self._alldata(keep_uncal, self.GetFrequency))
 
     def MeasureScreen_pd(self, keep_uncal=True):
         self.SetContinuous(False)
@@ -393,5 +480,6 @@ class basepna(instrument, abc.ABC):
         getters.remove('GetMetadataString')
         getters.remove('GetFrequency')
         getters.remove('GetTraceData')
+        getters.remove('GetAllTraceData')
 
         return getters
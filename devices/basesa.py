@@ -29,60 +29,66 @@ class basesa(instrument, abc.ABC):
 
     def SetStart(self, x):
         mystr = 'FREQ:STAR {}'.format(x)
-        self.write(mystr)
+        self.write_cached(mystr, 'FREQ:STAR?', x,
+                          ('FREQ:STOP?', 'FREQ:CENT?', 'FREQ:SPAN?', 'BAND:RES?', 'BAND:VID?',
+                           'SWE:TIME?'))
 
     def SetStop(self, x):
         mystr = 'FREQ:STOP {}'.format(x)
-        self.write(mystr)
+        self.write_cached(mystr, 'FREQ:STOP?', x,
+                          ('FREQ:STAR?', 'FREQ:CENT?', 'FREQ:SPAN?', 'BAND:RES?', 'BAND:VID?',
+                           'SWE:TIME?'))
 
     def SetCenter(self, x):
         mystr = 'FREQ:CENT {}'.format(x)
-        self.write(mystr)
+        self.write_cached(mystr, 'FREQ:CENT?', x,
+                          ('FREQ:STAR?', 'FREQ:STOP?', 'BAND:RES?', 'BAND:VID?', 'SWE:TIME?'))
 
     def SetSpan(self, x):
         mystr = 'FREQ:SPAN {}'.format(x)
-        self.write(mystr)
+        self.write_cached(mystr, 'FREQ:SPAN?', x,
+                          ('FREQ:STAR?', 'FREQ:STOP?', 'BAND:RES?', 'BAND:VID?', 'SWE:TIME?'))
 
     def GetStart(self):
-        aw = self.query('FREQ:STAR?')
-        return aw.strip('\n')
+        aw = self.query_cached('FREQ:STAR?', str.strip)
+        return aw
 
     def GetStop(self):
-        aw = self.query('FREQ:STOP?')
-        return aw.strip('\n')
+        aw = self.query_cached('FREQ:STOP?', str.strip)
+        return aw
 
     def GetCenter(self):
-        aw = float(self.query('FREQ:CENT?'))
+        aw = self.query_cached('FREQ:CENT?', float)
         return aw
 
     def GetSpan(self):
-        aw = self.query('FREQ:SPAN?')
-        return aw.strip('\n')
+        aw = self.query_cached('FREQ:SPAN?', str.strip)
+        return aw
 
     def SetResolutionBW(self, x):
         mystr = 'BAND:RES {}'.format(x)
-        self.write(mystr)
+        self.write_cached(mystr, 'BAND:RES?', x, ('BAND:VID?', 'SWE:TIME?'))
 
     def GetResolutionBW(self):
         mystr = 'BAND:RES?'
-        x = self.query(mystr)
-        return float(x)
+        x = self.query_cached(mystr, float)
+        return x
 
     def SetVideoBW(self, x):
         mystr = 'BAND:VID {}'.format(x)
-        self.write(mystr)
+        self.write_cached(mystr, 'BAND:VID?', x, ('SWE:TIME?',))
 
     def GetVideoBW(self):
         mystr = 'BAND:VID?'
-        x = self.query(mystr)
-        return float(x)
+        x = self.query_cached(mystr, float)
+        return x
 
     def SetSweepTime(self, tt):
-        self.write('SWE:TIME {}'.format(tt))
+        self.write_cached('SWE:TIME {}'.format(tt), 'SWE:TIME?', tt)
 
     def GetSweepTime(self):
-        tt = self.query('SWE:TIME?')
-        return float(tt)
+        tt = self.query_cached('SWE:TIME?', float)
+        return tt
 
     def SetSampleRate(self, x):
         mystr = 'WAV:SRAT {}'.format(x)
@@ -94,11 +100,12 @@ class basesa(instrument, abc.ABC):
         return float(x)
 
     def SetPoints(self, npoints):
-        self.write('SWE:POIN {}'.format(npoints))
+        self.write_cached('SWE:POIN {}'.format(npoints), 'SWE:POIN?', npoints,
+                          ('SWE:TIME?',))
 
     def GetPoints(self):
-        npts = self.query('SWE:POIN?')
-        return float(npts)
+        npts = self.query_cached('SWE:POIN?', float)
+        return npts
 
     def SetAverages(self, navg):
         #self.write('AVER:TYPE RMS')   # Power averaging
@@ -148,13 +155,10 @@ class basesa(instrument, abc.ABC):
         yunit = self.GetUnit()
         if measmode == 'SAN':
             self.SetContinuous(False)
-            self.write('INIT')
-            # sleep for averaging time, otherwise timeout
             navg = self.GetAverages()
             tt = self.GetSweepTime()
-            sleeptime = navg * tt
-            print('Measurement in progress. Waiting for {}s'.format(sleeptime))
-            time.sleep(sleeptime)
+            # wait for the sweeps to complete, allowing twice the expected time
+            self.write_and_wait('INIT', timeout=2 * navg * tt + 10)
             xvals = self.query('TRAC:DATA:X? TRACE{}'.format(ch))
             yvals = self.query('TRAC? TRACE{}'.format(ch))
             xvals = np.array([float(x) for x in xvals.split(',')])
@@ -12,6 +12,13 @@ already include a collection of commands and specific quality of life methods
 that allow you to already do basic functions.
 """
 import pyvisa as visa
+from pyvisa import constants
+import numpy as np
+import time
+import sys
+import re
+import logging
+from contextlib import contextmanager
 from .base_instrument import base_instrument
 # from ..misc.reset_popup_warning import popup_warning
 
@@ -34,6 +41,25 @@ def makeRMpy():
     return global_rs, '@py'
 
 
+#Verbose output of all instruments goes through this logger.  By default it prints the bare
+#commands to screen.  Use logging.getLogger('stlab.devices.instrument').setLevel(logging.WARNING)
+#to silence it or add/replace handlers to send it elsewhere
+logger = logging.getLogger('stlab.devices.instrument')
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+#Commands that do not change instrument settings and therefore keep the state cache valid
+#(common commands, triggering, continuous mode, display, trace selection and data transfer format)
+_cache_safe = re.compile(
+    r'^\s*(\*(CLS|OPC|ESE|SRE|WAI|TRG)\b|:?INIT\w*\d*(:IMM\w*)?\s*$|:?INIT\w*\d*:CONT|'
+    r':?ABOR\w*\s*$|:?DISP|:?CALC\w*\d*:PAR\w*:SEL|:?FORM)',
+    re.IGNORECASE)
+
+
 class instrument(base_instrument):
     """The main instrument class all visa instruments should inherit from
 
@@ -55,12 +81,26 @@ class instrument(base_instrument):
     dev : pyvisa.resources.Resource
         pyvisa resource that points to the desired device.  Created
         upon instantiation.
+    profiler : stlab.devices.scpi_profiler.SCPIProfiler or None
+        If set, every write, query and raw read is timed and recorded in it.  Can be set on a
+        single instrument or on the :code:`instrument` class to profile all instruments.
+        None by default (no overhead)
+    cache_enabled : bool
+        Whether the state cache used by :any:`write_cached` and :any:`query_cached` is active.
+        Off by default.  See :any:`setcache`
         
 
     """
 
     global_rs = None  #Static resource manager for all instruments.  rstype is '@ni' for NI backend and '@py' for pyvisa-py
     rstype = None
+    wait_method = 'auto'  #Default method used by write_and_wait.  'auto', 'srq', 'opc' or 'poll'
+    srq_supported = None  #Whether service requests work on this resource.  None if not tried yet
+    cache_enabled = False  #Opt-in cache of instrument settings.  See setcache
+    profiler = None  #SCPIProfiler recording all transactions.  Set on the class to profile all instruments
+    last_command = ''  #Last command written.  Used to label profiled reads
+    batch_depth = 0  #Nesting level of batch blocks.  Writes are buffered while > 0
+    batch_maxlen = 1024  #Maximum length of a compound command sent by flush
 
     def __init__(self, addr, reset=True, verb=True, **kwargs):
         """Instrument __init__ method.
@@ -72,14 +112,17 @@ class instrument(base_instrument):
 
         Parameters
         ----------
-        addr : str
-            Address of the VISA instrument to be instantiated
+        addr : str or pyvisa.resources.Resource
+            Address of the VISA instrument to be instantiated.  An already open pyvisa resource
+            can also be given, in which case it is used directly and the kwargs are set as its
+            attributes
         reset : bool, optional
             Will call :any:`reset` on instantiation to reset instrument to default settings.
             If set to False, the user will have to manually confirm three times that the reset is not wanted.
             This will happen once more if the device was instantiated using :code:`.adi`
         verb : bool, optional
-            Print strings written to the device on screen
+            Print strings written to the device on screen (through the
+            ``'stlab.devices.instrument'`` logger)
         **kwargs
             Additional keyword arguments to be passed to pyvisa's open_resource method.
             See pyvisa documentation for details.  Examples could be baud_rate,
@@ -93,36 +136,44 @@ class instrument(base_instrument):
 #        self.rs = visa.ResourceManager('@py')
 #        self.dev = self.rs.open_resource(addr)
 
-#To correct serial resource naming depending on backend...  @py uses ASRLCOM1 and @ni uses ASRL1
-        if 'ASRL' in addr:
-            if self.rstype == '@py':
-                if 'ASRLCOM' not in addr:
+        if not isinstance(addr, str):
+            #addr is an already open pyvisa resource (e.g. from autodetect_instrument).  Reuse it
+            self.dev = addr
+            for key, val in kwargs.items():
+                setattr(self.dev, key, val)
+        else:
+            #To correct serial resource naming depending on backend...  @py uses ASRLCOM1 and @ni uses ASRL1
+            if 'ASRL' in addr:
+                if self.rstype == '@py':
+                    if 'ASRLCOM' not in addr:
+                        idx = addr.find('ASRL') + 4
+                        addr = addr[:idx] + 'COM' + addr[idx:]
+                if self.rstype == '@ni':
+                    if 'ASRLCOM' in addr:
+                        idx = addr.find('ASRL') + 4
+                        addr = addr[:idx] + addr[idx + 3:]
+
+            #I have found that all our socket TCPIP devices need a \r\n line termination to work...  Add to kwargs it if not overridden
+            read_termination = None
+            if 'SOCKET' in addr:
+                read_termination = '\r\n'
+            if 'read_termination' not in kwargs:
+                kwargs['read_termination'] = read_termination
+            #Attempt to initialize instrument using current resource manager
+            try:
+                self.dev = self.global_rs.open_resource(addr, **kwargs)
+            #If NI visa fails, attempt to use pyvisa-py
+            except AttributeError:
+                print('NI backend not working... Trying pyvisa-py')
+                instrument.global_rs, instrument.rstype = makeRMpy()
+                #To correct serial resource naming depending on backend...  @py uses ASRLCOM1 and @ni uses ASRL1
+                if ('ASRL' in addr) and ('ASRLCOM' not in addr):
                     idx = addr.find('ASRL') + 4
                     addr = addr[:idx] + 'COM' + addr[idx:]
-            if self.rstype == '@ni':
-                if 'ASRLCOM' in addr:
-                    idx = addr.find('ASRL') + 4
-                    addr = addr[:idx] + addr[idx + 3:]
-
-        #I have found that all our socket TCPIP devices need a \r\n line termination to work...  Add to kwargs it if not overridden
-        read_termination = None
-        if 'SOCKET' in addr:
-            read_termination = '\r\n'
-        if 'read_termination' not in kwargs:
-            kwargs['read_termination'] = read_termination
-        #Attempt to initialize instrument using current resource manager
-        try:
-            self.dev = self.global_rs.open_resource(addr, **kwargs)
-        #If NI visa fails, attempt to use pyvisa-py
-        except AttributeError:
-            print('NI backend not working... Trying pyvisa-py')
-            instrument.global_rs, instrument.rstype = makeRMpy()
-            #To correct serial resource naming depending on backend...  @py uses ASRLCOM1 and @ni uses ASRL1
-            if ('ASRL' in addr) and ('ASRLCOM' not in addr):
-                idx = addr.find('ASRL') + 4
-                addr = addr[:idx] + 'COM' + addr[idx:]
-            self.dev = self.global_rs.open_resource(addr, **kwargs)
+                self.dev = self.global_rs.open_resource(addr, **kwargs)
         self.verb = verb  #Whether to print commands on screen
+        self.cache_set = {}  #Last values written with write_cached
+        self.cache_get = {}  #Last values read with query_cached
         # if not reset:
         #     popup = popup_warning(self.id())
         #     result = popup.run()
@@ -146,9 +197,107 @@ class instrument(base_instrument):
             The sring to write
 
         """
-        if self.verb:
-            print(mystr)
+        if self.cache_enabled and not all(
+                _cache_safe.match(x) for x in mystr.split(';')):
+            self.clearcache()
+        self._send(mystr)
+
+    def _send(self, mystr):
+        #Buffers the command while in a batch block.  Otherwise writes it to the device
+        if self.batch_depth:
+            self.batch_buffer.append(mystr)
+            return
+        if self.verb and logger.isEnabledFor(logging.INFO):
+            logger.info(mystr)
+        if self.profiler is None:
+            self.dev.write(mystr)
+            return
+        t0 = time.perf_counter()
         self.dev.write(mystr)
+        self.profiler.record(self, 'write', mystr, time.perf_counter() - t0,
+                             len(mystr))
+        self.last_command = mystr
+
+    @contextmanager
+    def batch(self, maxlen=None):
+        """Context manager that collects writes and sends them as compound commands
+
+        Inside the block, :any:`write` does not talk to the instrument but stores the command.
+        The stored commands are joined with ``;`` and sent in as few messages as possible
+        (each at most :code:`maxlen` characters) when a query or read is done, or when the
+        block ends.  Except before a read, a ``*OPC?`` is appended to the last message so
+        the instrument has processed all commands before continuing.  Blocks can be nested; the
+        commands are sent when the outermost block ends.  If an exception is raised
+        inside the block, the stored commands are discarded.
+
+        Example::
+
+            with pna.batch():
+                pna.SetRange(4e9, 8e9)
+                pna.SetIFBW(300.)
+                pna.SetPoints(1001)
+
+        Parameters
+        ----------
+        maxlen : int or None, optional
+            Maximum length of each compound message.  If None, :code:`self.batch_maxlen` is used
+
+        """
+        if not self.batch_depth:
+            self.batch_buffer = []
+            self.batch_len = self.batch_maxlen if maxlen is None else maxlen
+        self.batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self.batch_depth -= 1
+            if not self.batch_depth:
+                self.batch_buffer = []
+            raise
+        self.batch_depth -= 1
+        if not self.batch_depth:
+            self.flush()
+
+    def flush(self, sync=True):
+        """Send the writes stored by :any:`batch`
+
+        The commands are joined into compound messages.  Each command other than the
+        first one in a message is prefixed with ``:`` (unless it is a common ``*`` command)
+        so its header is taken from the root of the command tree.  Does nothing if no
+        commands are stored.
+
+        Parameters
+        ----------
+        sync : bool, optional
+            If True, the last message is sent followed by ``*OPC?`` and the reply is read,
+            so the instrument has processed all commands on return.  Must be False if the
+            last stored command is a query whose reply is still to be read.
+
+        """
+        cmds = getattr(self, 'batch_buffer', [])
+        if not cmds:
+            return
+        self.batch_buffer = []
+        depth, self.batch_depth = self.batch_depth, 0
+        try:
+            msgs = []
+            msg = cmds[0]
+            for cmd in cmds[1:]:
+                if not cmd.startswith((':', '*')):
+                    cmd = ':' + cmd
+                if len(msg) + len(cmd) + 7 > self.batch_len:  #Leave room for ';*OPC?'
+                    msgs.append(msg)
+                    msg = cmd
+                else:
+                    msg += ';' + cmd
+            for x in msgs:
+                self._send(x)
+            if sync:
+                self.query(msg + ';*OPC?')
+            else:
+                self._send(msg)
+        finally:
+            self.batch_depth = depth
 
     def query(self, mystr):
         """Write a string to instrument and read the reply
@@ -166,9 +315,15 @@ class instrument(base_instrument):
             The instrument reply string
 
         """
-        if self.verb:
-            print(mystr)
+        self.flush()
+        if self.verb and logger.isEnabledFor(logging.INFO):
+            logger.info(mystr)
+        if self.profiler is None:
+            return self.dev.query(mystr)
+        t0 = time.perf_counter()
         out = self.dev.query(mystr)
+        self.profiler.record(self, 'query', mystr, time.perf_counter() - t0,
+                             len(mystr) + len(out))
         return out
 
     def read(self):
@@ -182,23 +337,289 @@ class instrument(base_instrument):
             The string read from the instrument
 
         """
+        self.flush(sync=False)
+        if self.profiler is None:
+            return self.dev.read()
+        t0 = time.perf_counter()
         out = self.dev.read()
+        self.profiler.record(self, 'read', self.last_command,
+                             time.perf_counter() - t0, len(out))
         return out
 
-    def read_raw(self):
+    def read_raw(self, size=None):
         """Read binary data from the instrument
 
         Performs a read of raw bytes from the instrument, avoiding the ASCII encoding
 
+        Parameters
+        ----------
+        size : int or None, optional
+            Chunk size passed to pyvisa.  If None, the pyvisa default chunk size is used
+
         Returns
         -------
         out : binary data
             The binary data from the instrument
 
         """
-        out = self.dev.read_raw()
+        self.flush(sync=False)
+        if self.profiler is None:
+            return self.dev.read_raw(size)
+        t0 = time.perf_counter()
+        out = self.dev.read_raw(size)
+        self.profiler.record(self, 'read', self.last_command,
+                             time.perf_counter() - t0, len(out))
         return out
 
+    def read_binary_block(self, dtype='f8', endianness='>'):
+        """Read an IEEE-488.2 definite length binary block from the instrument
+
+        Reads a block of the form ``#<n><length><data>`` (as returned by most
+        instruments after setting ``FORM:DATA REAL,64`` or similar) and returns the
+        payload as a NumPy array.  The header is parsed from the first read and the
+        payload is then copied chunk by chunk into a preallocated buffer of the
+        announced length, so large traces do not suffer from repeated concatenation
+        of byte strings.  The returned array is a view on that buffer (no further copy).
+
+        Parameters
+        ----------
+        dtype : str or numpy.dtype, optional
+            Data type of each element in the block ('f8' for REAL,64, 'f4' for REAL,32,
+            'u1' for bytes, etc.)
+        endianness : {'>', '<'}, optional
+            Byte order of the data sent by the instrument.  Big endian ('>') is the
+            SCPI default.  Use '<' if the instrument byte order is set to swapped.
+
+        Returns
+        -------
+        numpy.ndarray
+            1D array with the block contents
+
+        """
+        dtype = np.dtype(dtype).newbyteorder(endianness)
+        raw = self.read_raw()
+        while len(raw) < 2:
+            raw += self.read_raw()
+        if raw[0:1] != b'#':
+            raise ValueError("Not a SCPI binary block")
+        ndigits = int(raw[1:2].decode())
+        if ndigits == 0:
+            # Indefinite length block.  Data runs until the message terminator, sent with END.
+            # Reads stopping earlier at a termination character in the data are continued
+            data = bytearray(raw[2:])
+            while self._termchar_read():
+                data += self.read_raw()
+            term = (getattr(self.dev, 'read_termination', None) or '\n').encode()
+            if data.endswith(term):
+                del data[-len(term):]
+        else:
+            while len(raw) < 2 + ndigits:
+                raw += self.read_raw()
+            nbytes = int(raw[2:2 + ndigits].decode())
+            start = 2 + ndigits
+            data = bytearray(nbytes)
+            view = memoryview(data)
+            ngot = min(len(raw) - start, nbytes)
+            view[:ngot] = raw[start:start + ngot]
+            # The block may be followed by a terminator (\n).  Make sure it is consumed
+            # along with the payload so it does not end up in the next read.
+            terminated = len(raw) > start + nbytes
+            while ngot < nbytes:
+                chunk = self.read_raw(nbytes - ngot + 1)
+                nn = min(len(chunk), nbytes - ngot)
+                view[ngot:ngot + nn] = chunk[:nn]
+                ngot += nn
+                terminated = len(chunk) > nn
+            if not terminated and self._terminator_pending(data[-1:]):
+                self.read_raw()
+        if len(data) % dtype.itemsize != 0:
+            raise ValueError(
+                "Binary payload size {} is not divisible by {}".format(
+                    len(data), dtype.itemsize))
+        return np.frombuffer(data, dtype=dtype)
+
+    def _termchar_read(self):
+        #Whether the last read stopped at the termination character instead of END (EOI).
+        #False if the resource does not report the read status
+        status = getattr(self.dev, 'last_status', None)
+        return status == constants.StatusCode.success_termination_character_read
+
+    def _terminator_pending(self, lastbyte):
+        #Whether the message terminator is still to be read after a binary block whose last read
+        #ended exactly with the payload.  That read stopped either at END (message complete) or at
+        #a termination character that is the last payload byte, with the real terminator after it.
+        #If the read status is not known, go by the last byte
+        if getattr(self.dev, 'last_status', None) is not None:
+            return self._termchar_read()
+        term = getattr(self.dev, 'read_termination', None)
+        return bool(term) and lastbyte == term[-1:].encode()
+
+    def query_binary_block(self, mystr, dtype='f8', endianness='>'):
+        """Write a string to the instrument and read the reply as a binary block
+
+        Writes the query and reads back the IEEE-488.2 binary block reply using
+        :any:`read_binary_block`.  The data format on the instrument (e.g. ``FORM:DATA REAL,64``)
+        must already be set accordingly.
+
+        Parameters
+        ----------
+        mystr : str
+            The query string to write
+        dtype : str or numpy.dtype, optional
+            Data type of each element in the block
+        endianness : {'>', '<'}, optional
+            Byte order of the data sent by the instrument
+
+        Returns
+        -------
+        numpy.ndarray
+            1D array with the block contents
+
+        """
+        self._send(mystr)  #Like query, does not clear the state cache
+        return self.read_binary_block(dtype, endianness)
+
+    def write_and_wait(self, mystr, timeout=None, method=None):
+        """Write a command that starts an operation and wait until the operation completes
+
+        Typically used to trigger a sweep (``'INIT'``) and block until it is done.  Three ways of
+        waiting are available:
+
+        - ``'srq'``: The instrument raises a service request when the operation completes
+          (``*OPC`` with ``*ESE 1`` and ``*SRE 32``) and the VISA library waits for the event.
+          No traffic goes over the bus while waiting.  Requires the NI backend and an INSTR resource.
+        - ``'opc'``: The command is sent followed by ``*OPC?`` and the reply is read with the visa
+          timeout temporarily set to the given timeout.
+        - ``'poll'``: The command is sent followed by ``*OPC`` and ``*ESR?`` is polled with an
+          interval that starts at 1 ms and doubles up to 100 ms.
+
+        With ``'auto'``, service requests are used if the resource supports them.  Otherwise
+        ``*OPC?`` is used if a timeout is given and polling if not.  If enabling service requests
+        fails, polling is used instead.
+
+        Parameters
+        ----------
+        mystr : str
+            Command that starts the operation (e.g. ``'INIT'``)
+        timeout : float or None, optional
+            Maximum time to wait in seconds.  If None, waits indefinitely
+        method : {'auto', 'srq', 'opc', 'poll'} or None, optional
+            Method used to wait.  If None, :code:`self.wait_method` is used
+
+        """
+        if method is None:
+            method = self.wait_method
+        if method == 'auto':
+            if self.srq_supported is not False and self.rstype == '@ni' and self.dev.resource_name.endswith('INSTR'):
+                method = 'srq'
+            elif timeout is not None:
+                method = 'opc'
+            else:
+                method = 'poll'
+        if method == 'srq':
+            if self.wait_srq(mystr, timeout):
+                return
+            method = 'poll'
+        if method == 'opc':
+            self.wait_opc(mystr, timeout)
+        elif method == 'poll':
+            self.wait_poll(mystr, timeout)
+        else:
+            raise ValueError('Unknown wait method: {}'.format(method))
+
+    def wait_srq(self, mystr, timeout=None):
+        """Write a command followed by ``*OPC`` and wait for the service request
+
+        Parameters
+        ----------
+        mystr : str
+            Command that starts the operation
+        timeout : float or None, optional
+            Maximum time to wait in seconds.  If None, waits indefinitely
+
+        Returns
+        -------
+        bool
+            False if service requests could not be enabled on this resource (the command is
+            not sent in this case).  True when the operation has completed.
+
+        """
+        event = constants.EventType.service_request
+        try:
+            self.dev.enable_event(event, constants.EventMechanism.queue)
+        except (visa.VisaIOError, NotImplementedError, AttributeError):
+            self.srq_supported = False
+            return False
+        try:
+            if not self.srq_supported:
+                self.write('*ESE 1')  #OPC bit sets the event status bit (ESB)...
+                self.write('*SRE 32')  #...and ESB raises a service request
+                self.srq_supported = True
+            self.write('*CLS')
+            self.write(mystr + ';*OPC')
+            self.flush(sync=False)
+            if timeout is None:
+                tmo = constants.VI_TMO_INFINITE
+            else:
+                tmo = int(timeout * 1000)
+            self.dev.wait_on_event(event, tmo)
+            self.dev.read_stb()  #Clears the service request
+        finally:
+            self.dev.disable_event(event, constants.EventMechanism.queue)
+            self.dev.discard_events(event, constants.EventMechanism.queue)
+        return True
+
+    def wait_opc(self, mystr, timeout=None):
+        """Write a command followed by ``*OPC?`` and block until the reply arrives
+
+        Parameters
+        ----------
+        mystr : str
+            Command that starts the operation
+        timeout : float or None, optional
+            Maximum time to wait in seconds.  If None, waits indefinitely
+
+        """
+        oldtimeout = self.dev.timeout
+        if timeout is None:
+            self.dev.timeout = None
+        else:
+            self.dev.timeout = timeout * 1000
+        try:
+            self.query(mystr + ';*OPC?')
+        finally:
+            self.dev.timeout = oldtimeout
+
+    def wait_poll(self, mystr, timeout=None, interval=1e-3, maxinterval=0.1):
+        """Write a command followed by ``*OPC`` and poll ``*ESR?`` until the operation completes
+
+        The polling interval starts small so short operations return quickly and is doubled
+        after every poll up to a maximum so long operations do not flood the bus.  The polls
+        themselves are not echoed on screen.
+
+        Parameters
+        ----------
+        mystr : str
+            Command that starts the operation
+        timeout : float or None, optional
+            Maximum time to wait in seconds.  If None, waits indefinitely
+        interval : float, optional
+            Initial polling interval in seconds
+        maxinterval : float, optional
+            Maximum polling interval in seconds
+
+        """
+        self.write('*CLS')
+        self.write(mystr + ';*OPC')
+        self.flush(sync=False)
+        t0 = time.perf_counter()
+        while not int(self.dev.query('*ESR?')) & 1:  #OPC bit of the event status register
+            if timeout is not None and time.perf_counter() - t0 > timeout:
+                raise TimeoutError('Operation "{}" not completed after {} s'.format(
+                    mystr, timeout))
+            time.sleep(interval)
+            interval = min(2 * interval, maxinterval)
+
     def id(self):
         """Query the device id string
         
@@ -214,12 +635,95 @@ class instrument(base_instrument):
         print(out)
         return out
 
+    def write_cached(self, mystr, key, value, invalidates=()):
+        """Write a setter command unless the value is already set
+
+        If the cache is enabled and the last value written for key is equal to value,
+        nothing is sent to the instrument.  Otherwise the command is written and the
+        value recorded.
+
+        Parameters
+        ----------
+        mystr : str
+            The setter command to write
+        key : str
+            Cache key for the setting.  Usually the query string of the corresponding getter
+        value
+            The value being set.  Compared by equality to the cached value
+        invalidates : iterable of str, optional
+            Keys of other settings modified by this command (e.g. setting the center
+            frequency changes start and stop, or the span changes an automatic sweep time).
+            Their cached values are dropped.
+
+        """
+        if not self.cache_enabled:
+            self.write(mystr)
+            return
+        if key in self.cache_set and self.cache_set[key] == value:
+            return
+        self._send(mystr)
+        for k in invalidates:
+            self.cache_set.pop(k, None)
+            self.cache_get.pop(k, None)
+        self.cache_get.pop(key, None)  #Instrument may round or clip the value
+        self.cache_set[key] = value
+
+    def query_cached(self, mystr, conv=float):
+        """Query a setting, serving it from the cache if it has been read since the last change
+
+        Parameters
+        ----------
+        mystr : str
+            The query string.  Also used as cache key
+        conv : callable, optional
+            Conversion applied to the reply string before caching (float by default)
+
+        Returns
+        -------
+        The converted reply
+
+        """
+        if self.cache_enabled and mystr in self.cache_get:
+            return self.cache_get[mystr]
+        out = conv(self.query(mystr))
+        if self.cache_enabled:
+            self.cache_get[mystr] = out
+        return out
+
+    def setcache(self, state=True):
+        """Enable or disable the instrument state cache
+
+        When enabled, setters using :any:`write_cached` skip writes that would not change
+        the current value and getters using :any:`query_cached` are served from memory
+        when the value has been read since the last change.  The cache is cleared on
+        :any:`reset` and by any :any:`write` that may change settings (everything except
+        ``*CLS``, ``*OPC``, ``*ESE``, ``*SRE``, ``*WAI``, ``*TRG``, ``INIT``, ``INIT:CONT``,
+        ``ABOR``, ``DISP``, ``CALC:PAR:SEL`` and ``FORM`` commands).  Changes done on the front panel are not seen, so only
+        enable it while the instrument is under remote control.
+
+        Parameters
+        ----------
+        state : bool, optional
+            Enable or disable the cache
+
+        """
+        self.cache_enabled = state
+        self.clearcache()
+
+    def clearcache(self):
+        """Forget all cached instrument settings
+
+        """
+        self.cache_set = {}
+        self.cache_get = {}
+
     def reset(self):
         """Send a reset command to the instrument
 
         Typically the reset command for VISA instruments is ``*RST``.
 
         """
+        self.clearcache()
         self.write('*RST')
 
     def setverbose(self, verb=True):
@@ -0,0 +1,208 @@
+"""SCPI traffic profiler for visa instruments
+
+Records every :code:`write`, :code:`query` and :code:`read_raw` done through
+:any:`instrument` with its duration, number of bytes transferred and the line of the
+measurement script that caused it.  Records are kept in a ring buffer so the profiler
+can be left running during long measurements.
+
+To profile all instruments::
+
+    from stlab.devices.instrument import instrument
+    from stlab.devices.scpi_profiler import SCPIProfiler
+
+    prof = SCPIProfiler()
+    instrument.profiler = prof   #or pna.profiler = prof for a single instrument
+    ... measurement ...
+    instrument.profiler = None
+    prof.print_histograms()
+    print(prof.top(10))
+
+"""
+
+import os
+import sys
+import time
+from collections import deque, namedtuple
+import numpy as np
+import pandas as pd
+
+SCPIRecord = namedtuple(
+    'SCPIRecord', ['t', 'driver', 'op', 'command', 'duration', 'nbytes', 'site'])
+
+#Frames from these files are skipped when looking for the call site
+_devdir = os.path.dirname(os.path.abspath(__file__))
+
+
+def _call_site():
+    #First frame outside the devices folder.  Returns 'file:line'
+    f = sys._getframe(2)
+    while f is not None and os.path.dirname(os.path.abspath(
+            f.f_code.co_filename)) == _devdir:
+        f = f.f_back
+    if f is None:
+        return ''
+    return '{}:{}'.format(os.path.basename(f.f_code.co_filename), f.f_lineno)
+
+
+class SCPIProfiler():
+    """Ring buffer of timed instrument transactions
+
+    Parameters
+    ----------
+    size : int, optional
+        Maximum number of records kept.  Older records are discarded
+    callsite : bool, optional
+        Whether to record the script line that caused each transaction.  Requires walking
+        the call stack, which takes a few microseconds per call
+
+    Attributes
+    ----------
+    records : collections.deque of SCPIRecord
+        The recorded transactions, oldest first.  Each record is a namedtuple with fields
+        t (time.time() at the end of the call), driver (class name), op ('write', 'query' or
+        'read'), command, duration (s), nbytes and site
+
+    """
+
+    def __init__(self, size=100000, callsite=True):
+        self.records = deque(maxlen=size)
+        self.callsite = callsite
+
+    def record(self, inst, op, command, duration, nbytes):
+        """Add a record.  Called by the instrument methods
+
+        Parameters
+        ----------
+        inst : instrument
+            Instrument doing the transaction
+        op : str
+            'write', 'query' or 'read'
+        command : str
+            Command sent (for reads, the last command written)
+        duration : float
+            Duration of the call in seconds
+        nbytes : int
+            Number of bytes sent and received
+
+        """
+        site = _call_site() if self.callsite else ''
+        self.records.append(
+            SCPIRecord(time.time(), type(inst).__name__, op, command, duration,
+                       nbytes, site))
+
+    def clear(self):
+        """Discard all records
+
+        """
+        self.records.clear()
+
+    def to_frame(self):
+        """Records as a pandas DataFrame
+
+        Returns
+        -------
+        pandas.DataFrame
+            One row per record.  An additional column 'header' contains the command
+            without its arguments (e.g. 'SENS:FREQ:STAR' for 'SENS:FREQ:STAR 1e9')
+
+        """
+        df = pd.DataFrame(list(self.records), columns=SCPIRecord._fields)
+        df['header'] = df['command'].str.split(n=1).str[0]
+        return df
+
+    def stats(self, by=('driver', 'header')):
+        """Aggregated timing per driver and command
+
+        Parameters
+        ----------
+        by : tuple of str, optional
+            Columns of :any:`to_frame` to group by.  Adding 'site' splits each command by the
+            script line that called it
+
+        Returns
+        -------
+        pandas.DataFrame
+            Count, total, mean and max duration (s) and total bytes for each group,
+            sorted by total time
+
+        """
+        df = self.to_frame()
+        g = df.groupby(list(by))
+        out = pd.DataFrame({
+            'count': g['duration'].count(),
+            'total (s)': g['duration'].sum(),
+            'mean (s)': g['duration'].mean(),
+            'max (s)': g['duration'].max(),
+            'bytes': g['nbytes'].sum()
+        })
+        return out.sort_values('total (s)', ascending=False)
+
+    def top(self, n=10, aggregate=False):
+        """Slowest commands
+
+        Parameters
+        ----------
+        n : int, optional
+            Number of commands to return
+        aggregate : bool, optional
+            If False, returns the n slowest single transactions.  If True, returns the n
+            commands with the largest total time (see :any:`stats`)
+
+        Returns
+        -------
+        pandas.DataFrame
+
+        """
+        if aggregate:
+            return self.stats().head(n)
+        return self.to_frame().nlargest(n, 'duration')
+
+    def histograms(self, bins=None):
+        """Latency histograms per driver
+
+        Parameters
+        ----------
+        bins : array_like or None, optional
+            Bin edges in seconds.  By default logarithmic bins from 10 us to 100 s,
+            5 per decade.  Durations outside the range are counted in the first or last bin
+
+        Returns
+        -------
+        dict
+            Driver name as key and (counts, edges) numpy arrays as value
+
+        """
+        if bins is None:
+            bins = np.logspace(-5, 2, 36)
+        bins = np.asarray(bins)
+        durations = {}
+        for rec in self.records:
+            durations.setdefault(rec.driver, []).append(rec.duration)
+        #Durations outside the bins are counted in the first or last bin
+        return {
+            k: np.histogram(np.clip(v, bins[0], bins[-1]), bins=bins)
+            for k, v in durations.items()
+        }
+
+    def print_histograms(self, bins=None, width=50):
+        """Print text latency histograms per driver
+
+        Empty bins at both ends are not shown
+
+        Parameters
+        ----------
+        bins : array_like or None, optional
+            Bin edges in seconds.  See :any:`histograms`
+        width : int, optional
+            Length in characters of the longest bar
+
+        """
+        for driver, (counts, edges) in self.histograms(bins).items():
+            print('{}: {} calls'.format(driver, counts.sum()))
+            nz = np.nonzero(counts)[0]
+            if len(nz) == 0:
+                continue
+            for i in range(nz[0], nz[-1] + 1):
+                bar = '#' * int(np.ceil(width * counts[i] / counts.max()))
+                print('  {:9.2e} - {:9.2e} s {:7d} {}'.format(
+                    edges[i], edges[i + 1], counts[i], bar))
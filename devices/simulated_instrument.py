@@ -0,0 +1,741 @@
+"""Simulated VISA resources and record/replay of instrument sessions
+
+This module allows drivers to be run without hardware.  It provides:
+
+- :any:`SimulatedResource`: an in-process stand-in for a pyvisa resource that parses
+  SCPI commands, keeps the instrument settings and answers queries in ASCII or binary
+  block form with a configurable latency and bandwidth.  :any:`SimulatedVNA`,
+  :any:`SimulatedSA`, :any:`SimulatedScope` and :any:`SimulatedAWG` answer the commands
+  used by :any:`basepna`, :any:`basesa`, :any:`Rigol_DS1054` and :any:`Tektronix_AWG520`.
+- :any:`SimulatedResourceManager`: a resource manager handing out simulated resources by
+  address.  After :any:`use_simulator`, all drivers (and :any:`autodetect_instrument`) open
+  their resources from it.
+- :any:`RecordingResource` and :any:`ReplayResource` to record the traffic of a real
+  instrument session to a file and play it back later in place of the instrument.
+
+Example::
+
+    from stlab.devices.simulated_instrument import use_simulator, SimulatedVNA
+    from stlab.devices.autodetect_instrument import autodetect_instrument
+
+    addr = 'TCPIP::192.168.1.216::INSTR'
+    use_simulator({addr: SimulatedVNA(addr, latency=1e-3, bandwidth=10e6)})
+    pna = autodetect_instrument(addr)  #Loads the PNAN5221A driver
+    data = pna.MeasureScreen()
+
+To go back to real instruments, set :code:`instrument.global_rs = None`.
+
+"""
+
+import base64
+import json
+import re
+import time
+from collections import OrderedDict
+import numpy as np
+import pyvisa as visa
+from pyvisa import constants
+from .instrument import instrument
+
+
+def _node(n):
+    #Reduce a SCPI node to its short form without a default suffix (e.g. FREQuency1 -> FREQ)
+    m = re.match(r'([A-Z]+)(\d*)\??$', n)
+    if not m:
+        return n
+    name, suffix = m.groups()
+    if len(name) > 4:
+        name = name[:3] if name[3] in 'AEIOU' else name[:4]
+    if suffix == '1':
+        suffix = ''
+    return name + suffix
+
+
+def normalize(header):
+    """Normalize a SCPI command header
+
+    The header is converted to upper case short form.  Numeric suffixes equal to 1 and
+    a leading ``SENS`` node (optional in most instruments) are dropped, so
+    ``':SENSe1:FREQuency:STARt'`` and ``'FREQ:STAR'`` give the same result.
+
+    Parameters
+    ----------
+    header : str
+        Command header (without arguments).  A trailing ``?`` is kept
+
+    Returns
+    -------
+    str
+        Normalized header
+
+    """
+    header = header.strip().lstrip(':').upper()
+    isquery = header.endswith('?')
+    if header.startswith('*'):
+        return header
+    nodes = [_node(n) for n in header.rstrip('?').split(':')]
+    if nodes[0] == 'SENS' and len(nodes) > 1:
+        nodes = nodes[1:]
+    return ':'.join(nodes) + ('?' if isquery else '')
+
+
+def _split(mystr):
+    #Split a message in commands at semicolons outside quotes
+    return [
+        x.strip() for x in re.findall(r'''(?:[^;"']|"[^"]*"|'[^']*')+''', mystr)
+        if x.strip()
+    ]
+
+
+class SimulatedResource():
+    """In-process stand-in for a pyvisa message based resource
+
+    Every command written is split in its header and arguments.  Commands with a registered
+    handler (see :any:`add_command`) call it.  Any other setter stores its arguments and
+    the matching query returns them, so unknown settings behave like a real instrument.
+    Query replies are buffered and returned by the next read.  The common commands
+    ``*IDN?``, ``*RST``, ``*CLS``, ``*OPC``, ``*OPC?``, ``*ESR?``, ``*ESE``, ``*SRE`` and ``*WAI``
+    are supported.  Operations complete instantly, so ``*OPC?`` and ``*ESR?`` always report
+    completion.
+
+    Parameters
+    ----------
+    resource_name : str, optional
+        VISA address of the simulated resource
+    idn : str or None, optional
+        Reply to ``*IDN?``.  Uses :code:`self.default_idn` if None
+    latency : float, optional
+        Time in seconds added to every write and read
+    bandwidth : float or None, optional
+        Transfer rate in bytes/s used to delay reads.  None for no delay
+    chunk_size : int, optional
+        Size of the low level reads (like pyvisa's chunk_size).  Each one adds the latency
+
+    Attributes
+    ----------
+    settings : dict
+        Current settings, normalized header as key and argument string as value.  Reset to
+        :code:`self.defaults` on ``*RST``
+    log : list of str
+        All commands received
+    reply_termination : str
+        Appended to each reply.  Replies always end with END (EOI), so this can be empty
+    last_status : pyvisa.constants.StatusCode or None
+        Status of the last read: :code:`success` if it ended with END or
+        :code:`success_termination_character_read` if it stopped at the termination character
+        (last character of :code:`read_termination`), as in pyvisa
+
+    """
+    default_idn = 'STLAB,SIMULATED,SIM00000,1.0'
+    defaults = {'FORM:DATA': 'ASC,0', 'FORM:BORD': 'NORM'}
+
+    def __init__(self,
+                 resource_name='TCPIP::127.0.0.1::INSTR',
+                 idn=None,
+                 latency=0.,
+                 bandwidth=None,
+                 chunk_size=20 * 1024):
+        self.resource_name = resource_name
+        self.idn = idn or self.default_idn
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.chunk_size = chunk_size
+        self.timeout = 2000
+        self.read_termination = '\n'
+        self.write_termination = '\n'
+        self.query_delay = 0.
+        self.reply_termination = '\n'
+        self.outbuf = bytearray()
+        self.msglens = []
+        self.last_status = None
+        self.log = []
+        self.settings = dict(self.defaults)
+        self.handlers = {}
+        self.add_command('*IDN?', lambda args: self.idn)
+        self.add_command('*RST', lambda args: self.reset())
+        self.add_command('*OPC?', lambda args: '1')
+        self.add_command('*ESR?', lambda args: '1')
+        for cmd in ['*CLS', '*OPC', '*ESE', '*SRE', '*WAI', '*TRG']:
+            self.add_command(cmd, lambda args: None)
+
+    def add_command(self, header, func):
+        """Register a handler for a command
+
+        Parameters
+        ----------
+        header : str
+            Command header, including the ``?`` for queries.  Normalized with :any:`normalize`
+        func : callable
+            Called with the argument string of the command.  For queries it should return
+            the reply (str, bytes or a numpy array, see :any:`array_reply`)
+
+        """
+        self.handlers[normalize(header)] = func
+
+    def reset(self):
+        """Return the settings to their defaults (``*RST``)
+
+        """
+        self.settings = dict(self.defaults)
+
+    def array_reply(self, arr):
+        """Format an array according to the current ``FORM:DATA`` and ``FORM:BORD`` settings
+
+        Parameters
+        ----------
+        arr : array_like
+            Values to return
+
+        Returns
+        -------
+        str or bytes
+            Comma separated values for ASCII format or an IEEE-488.2 definite length block
+            for ``REAL,32`` and ``REAL,64``
+
+        """
+        arr = np.asarray(arr)
+        fmt = self.settings.get('FORM:DATA', 'ASC').upper().replace(' ', '')
+        if not fmt.startswith('REAL'):
+            return ','.join('%.15e' % x for x in arr.ravel())
+        order = '<' if self.settings.get('FORM:BORD', '').upper().startswith('SWAP') else '>'
+        dtype = order + ('f4' if fmt.endswith('32') else 'f8')
+        return self.block(arr.astype(dtype).tobytes())
+
+    @staticmethod
+    def block(data):
+        """Wrap bytes in an IEEE-488.2 definite length block header
+
+        """
+        nn = str(len(data))
+        return '#{}{}'.format(len(nn), nn).encode() + data
+
+    def process(self, cmd):
+        #Execute a single command and return the reply or None
+        parts = cmd.split(None, 1)
+        header = normalize(parts[0])
+        args = parts[1].strip() if len(parts) > 1 else ''
+        if header in self.handlers:
+            return self.handlers[header](args)
+        if header.endswith('?'):
+            return self.settings.get(header[:-1], '0')
+        self.settings[header] = args
+        return None
+
+    def write(self, mystr):
+        if self.latency:
+            time.sleep(self.latency)
+        replies = []
+        path = ''
+        for cmd in _split(mystr):
+            #Commands in a compound message are relative to the path of the previous one
+            if path and not cmd.startswith((':', '*')):
+                cmd = path + cmd
+            elif not cmd.startswith('*'):
+                path = cmd.split(None, 1)[0].lstrip(':')
+                path = path[:path.rfind(':') + 1]
+            self.log.append(cmd)
+            reply = self.process(cmd)
+            if reply is None:
+                continue
+            if isinstance(reply, np.ndarray):
+                reply = self.array_reply(reply)
+            if isinstance(reply, str):
+                reply = reply.encode()
+            replies.append(reply)
+        if replies:
+            reply = b';'.join(replies) + self.reply_termination.encode()
+            self.outbuf += reply
+            self.msglens.append(len(reply))
+        return len(mystr)
+
+    def read_raw(self, size=None):
+        #Like pyvisa, reads chunks of size bytes until END (end of the reply) or the
+        #termination character.  END takes precedence if both come with the same byte
+        if not self.outbuf:
+            raise visa.VisaIOError(constants.StatusCode.error_timeout)
+        size = size or self.chunk_size
+        nn = self.msglens[0]
+        self.last_status = constants.StatusCode.success
+        if self.read_termination:
+            pos = self.outbuf.find(self.read_termination[-1:].encode(), 0, nn)
+            if 0 <= pos < nn - 1:
+                nn = pos + 1
+                self.last_status = constants.StatusCode.success_termination_character_read
+        out = bytes(self.outbuf[:nn])
+        del self.outbuf[:nn]
+        self.msglens[0] -= nn
+        if not self.msglens[0]:
+            del self.msglens[0]
+        delay = self.latency * -(-nn // size)
+        if self.bandwidth:
+            delay += nn / self.bandwidth
+        if delay:
+            time.sleep(delay)
+        return out
+
+    def read(self):
+        out = self.read_raw().decode()
+        if self.read_termination and out.endswith(self.read_termination):
+            out = out[:-len(self.read_termination)]
+        return out
+
+    def query(self, mystr):
+        self.write(mystr)
+        return self.read()
+
+    def clear(self):
+        self.outbuf = bytearray()
+        self.msglens = []
+
+    def close(self):
+        pass
+
+
+class SimulatedVNA(SimulatedResource):
+    """Simulated Keysight PNA (N5221A)
+
+    Measures a notch type resonance (S21) and its reflection (S11) centered in the current
+    frequency range, with a linewidth of 1/20 of the span and gaussian noise.  Answers the
+    trace and frequency queries used by :any:`basepna` and :any:`PNAN5221A` including
+    ``CALC:DATA:MSD?``.
+
+    Parameters
+    ----------
+    resource_name : str, optional
+        VISA address of the simulated resource
+    noise : float, optional
+        Standard deviation of the noise added to the traces
+    **kwargs
+        Passed to :any:`SimulatedResource`
+
+    """
+    default_idn = 'Keysight Technologies,N5221A,SIM00001,A.13.00.00'
+    defaults = {
+        'FORM:DATA': 'ASC,0',
+        'FORM:BORD': 'NORM',
+        'FREQ:STAR': '4E9',
+        'FREQ:STOP': '8E9',
+        'SWE:POIN': '201',
+        'BWID': '1E3',
+        'SOUR:POW': '-10',
+        'CORR': '0',
+        'INIT:CONT': 'ON'
+    }
+
+    def __init__(self, resource_name='TCPIP::192.168.1.216::INSTR', noise=1e-3,
+                 **kwargs):
+        super().__init__(resource_name, **kwargs)
+        self.noise = noise
+        self.rng = np.random.RandomState(0)
+        self.traces = OrderedDict([('CH1_S11_1', 'S11'), ('CH1_S21_2', 'S21')])
+        self.selected = 'CH1_S11_1'
+        self.add_command('CALC:PAR:CAT:EXT?', self.catalog)
+        self.add_command('CALC:PAR:CAT?', self.catalog)
+        self.add_command('CALC:PAR:DEF:EXT', self.define)
+        self.add_command('CALC:PAR:SEL', self.select)
+        self.add_command('CALC:PAR:MNUM?',
+                         lambda args: str(list(self.traces).index(self.selected) + 1))
+        self.add_command('CALC:X?', lambda args: self.frequency())
+        self.add_command('CALC:DATA:STIM?', lambda args: self.frequency())
+        self.add_command('FREQ:DATA?', lambda args: self.frequency())
+        self.add_command('CALC:DATA?', lambda args: self.sdata(self.selected))
+        self.add_command('CALC:DATA:MSD?', self.msd)
+        self.add_command('INIT', lambda args: None)
+        self.add_command('INIT:IMM', lambda args: None)
+
+    def frequency(self):
+        start = float(self.settings['FREQ:STAR'])
+        stop = float(self.settings['FREQ:STOP'])
+        return np.linspace(start, stop, int(float(self.settings['SWE:POIN'])))
+
+    def sparameter(self, meas, freq):
+        #Notch resonance in the middle of the range with Qc = 2*Q
+        f0 = (freq[0] + freq[-1]) / 2
+        Q = 20 * f0 / max(freq[-1] - freq[0], 1.)
+        s21 = 1 - 0.5 / (1 + 2j * Q * (freq - f0) / f0)
+        if meas.upper() == 'S21':
+            return s21
+        return s21 - 1 + 0.5 * np.exp(-2j * np.pi * freq * 1e-9)
+
+    def sdata(self, name):
+        freq = self.frequency()
+        yy = self.sparameter(self.traces[name], freq)
+        yy = yy + self.noise * (self.rng.standard_normal(len(freq)) +
+                                1j * self.rng.standard_normal(len(freq)))
+        return yy.view(float)
+
+    def catalog(self, args):
+        return '"' + ','.join(x for kv in self.traces.items() for x in kv) + '"'
+
+    def define(self, args):
+        name, meas = [x.strip(' \'"') for x in args.split(',')[:2]]
+        self.traces[name] = meas
+
+    def select(self, args):
+        self.selected = args.strip(' \'"')
+
+    def msd(self, args):
+        names = list(self.traces)
+        mnums = [int(x) for x in args.strip(' \'"').split(',')]
+        return np.concatenate([self.sdata(names[i - 1]) for i in mnums])
+
+
+class SimulatedSA(SimulatedResource):
+    """Simulated Keysight spectrum analyzer (N9010B)
+
+    Shows a single tone in the center of the range over a noise floor.  Answers the
+    commands used by :any:`basesa` and :any:`Keysight_N9010B`.
+
+    """
+    default_idn = 'Keysight Technologies,N9010B,SIM00002,A.25.05'
+    defaults = {
+        'FORM:DATA': 'ASC,8',
+        'FORM:BORD': 'NORM',
+        'FREQ:STAR': '9E3',
+        'FREQ:STOP': '3E9',
+        'SWE:POIN': '1001',
+        'SWE:TIME': '1E-2',
+        'BAND:RES': '3E6',
+        'BAND:VID': '3E6',
+        'INST:SEL': 'SA',
+        'AVER:COUN': '1',
+        'TRAC:TYPE': 'WRIT',
+        'UNIT:POW': 'DBM'
+    }
+
+    def __init__(self, resource_name='TCPIP::192.168.1.228::INSTR', **kwargs):
+        super().__init__(resource_name, **kwargs)
+        self.rng = np.random.RandomState(0)
+        self.add_command('READ:SAN?', lambda args: self.screen())
+        self.add_command('FETC:SAN?', lambda args: self.screen())
+        self.add_command('TRAC:DATA:X?', lambda args: self.frequency())
+        self.add_command('TRAC?', lambda args: self.spectrum(self.frequency()))
+        self.add_command('TRAC:DATA?', lambda args: self.spectrum(self.frequency()))
+        self.add_command('INIT', lambda args: None)
+        self.add_command('INIT:SAN', lambda args: None)
+
+    def frequency(self):
+        start = float(self.settings['FREQ:STAR'])
+        stop = float(self.settings['FREQ:STOP'])
+        return np.linspace(start, stop, int(float(self.settings['SWE:POIN'])))
+
+    def spectrum(self, freq):
+        f0 = (freq[0] + freq[-1]) / 2
+        rbw = float(self.settings['BAND:RES'])
+        tone = 10**(-2) * np.exp(-0.5 * ((freq - f0) / rbw)**2)
+        floor = 10**(-9) * self.rng.exponential(size=len(freq))
+        return 10 * np.log10(tone + floor)
+
+    def screen(self):
+        freq = self.frequency()
+        return np.stack([freq, self.spectrum(freq)], axis=1).ravel()
+
+
+class SimulatedScope(SimulatedResource):
+    """Simulated Rigol DS1054Z oscilloscope
+
+    Returns a 1 kHz sine wave as unsigned bytes for ``WAV:DATA?``, honouring the
+    ``WAV:STAR`` and ``WAV:STOP`` settings in RAW mode.
+
+    """
+    default_idn = 'RIGOL TECHNOLOGIES,DS1054Z,SIM00003,00.04.04.SP3'
+    defaults = {
+        'TIM:SCAL': '1E-3',
+        'ACQ:MDEP': '12000',
+        'ACQ:SRAT': '1E6',
+        'WAV:MODE': 'NORM',
+        'WAV:FORM': 'BYTE',
+        'WAV:SOUR': 'CHAN1',
+        'WAV:STAR': '1',
+        'WAV:STOP': '1200',
+        'WAV:YINC': '4E-2',
+        'WAV:YOR': '0',
+        'WAV:YREF': '127'
+    }
+
+    def __init__(self, resource_name='TCPIP::192.168.1.236::INSTR', **kwargs):
+        super().__init__(resource_name, **kwargs)
+        self.add_command('WAV:DATA?', self.wavedata)
+
+    def wavedata(self, args):
+        if self.settings['WAV:MODE'].upper().startswith('NORM'):
+            start, stop = 1, 1200
+        else:
+            start = int(float(self.settings['WAV:STAR']))
+            stop = int(float(self.settings['WAV:STOP']))
+        n = np.arange(start - 1, stop)
+        tt = n / float(self.settings['ACQ:SRAT'])
+        yy = 127 + 100 * np.sin(2 * np.pi * 1e3 * tt)
+        return self.block(yy.astype('u1').tobytes())
+
+
+class SimulatedAWG(SimulatedResource):
+    """Simulated Tektronix AWG520
+
+    Only stores settings and answers them back.  Enough to instantiate and configure the
+    :any:`Tektronix_AWG520` driver.
+
+    """
+    default_idn = 'SONY/TEK,AWG520,SIM00004,SCPI:95.0 OS:2.0 USR:4.0'
+    defaults = {
+        'AWGC:RST': '0',
+        'AWGC:RMOD': 'CONT',
+        'TRIG:IMP': '50',
+        'TRIG:LEV': '1.0',
+        'MMEM:CDIR': '"\\"',
+        'MMEM:CAT': '0,0'
+    }
+
+    def __init__(self, resource_name='GPIB0::1::INSTR', **kwargs):
+        super().__init__(resource_name, **kwargs)
+
+
+class SimulatedResourceManager():
+    """Resource manager handing out simulated resources
+
+    Parameters
+    ----------
+    resources : dict or None, optional
+        VISA address as key and resource (:any:`SimulatedResource`, :any:`ReplayResource`)
+        as value.  More can be added later with :any:`add`
+
+    """
+
+    def __init__(self, resources=None):
+        self.resources = dict(resources or {})
+
+    def add(self, resource):
+        """Add a resource under its resource_name
+
+        """
+        self.resources[resource.resource_name] = resource
+
+    def list_resources(self, query='?*::INSTR'):
+        return tuple(self.resources)
+
+    def open_resource(self, addr, **kwargs):
+        if addr not in self.resources:
+            raise visa.VisaIOError(constants.StatusCode.error_resource_not_found)
+        dev = self.resources[addr]
+        for key, val in kwargs.items():
+            if val is not None:
+                setattr(dev, key, val)
+        return dev
+
+    def close(self):
+        pass
+
+
+def use_simulator(resources=None):
+    """Make all instruments open their resources from a :any:`SimulatedResourceManager`
+
+    Parameters
+    ----------
+    resources : dict, list or None, optional
+        Either a dictionary of address and resource pairs or a list of resources (added
+        under their resource_name)
+
+    Returns
+    -------
+    SimulatedResourceManager
+        The resource manager now used by :any:`instrument`
+
+    """
+    if isinstance(resources, dict) or resources is None:
+        rm = SimulatedResourceManager(resources)
+    else:
+        rm = SimulatedResourceManager()
+        for res in resources:
+            rm.add(res)
+    instrument.global_rs, instrument.rstype = rm, '@sim'
+    return rm
+
+
+class RecordingResource():
+    """Wrapper around a pyvisa resource that records all traffic
+
+    All attributes not defined here are forwarded to the wrapped resource.  Use
+    :any:`record` to install it on an instrument.
+
+    Parameters
+    ----------
+    dev : pyvisa.resources.Resource
+        The resource to record
+
+    Attributes
+    ----------
+    log : list of dict
+        One entry per call with keys 'op' ('write', 'read' or 'read_raw'), 'data' and 't'
+        (duration in seconds)
+
+    """
+
+    def __init__(self, dev):
+        self.__dict__['dev'] = dev
+        self.__dict__['log'] = []
+
+    def __getattr__(self, name):
+        return getattr(self.dev, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.dev, name, value)  #timeout, read_termination...
+
+    def _add(self, op, data, t0):
+        self.log.append({'op': op, 'data': data, 't': time.perf_counter() - t0})
+
+    def write(self, mystr):
+        t0 = time.perf_counter()
+        out = self.dev.write(mystr)
+        self._add('write', mystr, t0)
+        return out
+
+    def read(self):
+        t0 = time.perf_counter()
+        out = self.dev.read()
+        self._add('read', out, t0)
+        return out
+
+    def read_raw(self, size=None):
+        t0 = time.perf_counter()
+        out = self.dev.read_raw(size)
+        self._add('read_raw', base64.b64encode(out).decode('ascii'), t0)
+        return out
+
+    def query(self, mystr):
+        self.write(mystr)
+        return self.read()
+
+    def save(self, filename):
+        """Save the recorded session to a JSON file
+
+        """
+        with open(filename, 'w') as ff:
+            json.dump({
+                'resource_name': self.dev.resource_name,
+                'log': self.log
+            }, ff, indent=0)
+
+
+def record(inst):
+    """Start recording the traffic of an instrument
+
+    Parameters
+    ----------
+    inst : instrument
+        Instrument to record.  Its :code:`dev` is replaced by a :any:`RecordingResource`
+
+    Returns
+    -------
+    RecordingResource
+        The recorder.  Call its :code:`save` method to store the session
+
+    """
+    inst.dev = RecordingResource(inst.dev)
+    return inst.dev
+
+
+def stop_recording(inst, filename=None):
+    """Stop recording an instrument and optionally save the session
+
+    Parameters
+    ----------
+    inst : instrument
+        Instrument previously passed to :any:`record`
+    filename : str or None, optional
+        If given, the session is saved to this file
+
+    Returns
+    -------
+    list of dict
+        The recorded log
+
+    """
+    recorder = inst.dev
+    if filename is not None:
+        recorder.save(filename)
+    inst.dev = recorder.dev
+    return recorder.log
+
+
+class ReplayMismatch(Exception):
+    pass
+
+
+class ReplayResource():
+    """Resource that plays back a session recorded with :any:`RecordingResource`
+
+    Writes are checked against the recorded ones and reads return the recorded replies in
+    order.  Can be passed to :any:`SimulatedResourceManager` to run a script or driver
+    against the recorded session.
+
+    Parameters
+    ----------
+    session : str or dict
+        File name of a recorded session or the loaded session dictionary
+    strict : bool, optional
+        If True, a write different from the recorded one raises :any:`ReplayMismatch`
+    speed : float, optional
+        Each call waits for its recorded duration multiplied by speed.  0 (default) replays
+        as fast as possible, 1 in real time
+
+    """
+
+    def __init__(self, session, strict=True, speed=0.):
+        if isinstance(session, str):
+            with open(session, 'r') as ff:
+                session = json.load(ff)
+        self.resource_name = session['resource_name']
+        self.log = session['log']
+        self.strict = strict
+        self.speed = speed
+        self.index = 0
+        self.timeout = 2000
+        self.read_termination = '\n'
+        self.write_termination = '\n'
+
+    def _next(self, ops):
+        if self.index >= len(self.log):
+            raise ReplayMismatch('End of recorded session reached')
+        entry = self.log[self.index]
+        if entry['op'] not in ops:
+            raise ReplayMismatch('Entry {}: expected {} but recorded {} "{}"'.format(
+                self.index, ops, entry['op'], entry['data']))
+        self.index += 1
+        if self.speed:
+            time.sleep(entry['t'] * self.speed)
+        return entry
+
+    def write(self, mystr):
+        entry = self._next(('write', ))
+        if self.strict and entry['data'] != mystr:
+            raise ReplayMismatch('Entry {}: wrote "{}" but recorded "{}"'.format(
+                self.index - 1, mystr, entry['data']))
+        return len(mystr)
+
+    def read(self):
+        entry = self._next(('read', 'read_raw'))
+        if entry['op'] == 'read':
+            return entry['data']
+        return base64.b64decode(entry['data']).decode().rstrip('\r\n')
+
+    def read_raw(self, size=None):
+        entry = self._next(('read', 'read_raw'))
+        if entry['op'] == 'read':
+            return (entry['data'] + '\n').encode()
+        return base64.b64decode(entry['data'])
+
+    def query(self, mystr):
+        self.write(mystr)
+        return self.read()
+
+    def rewind(self):
+        """Restart the playback from the beginning
+
+        """
+        self.index = 0
+
+    def clear(self):
+        pass
+
+    def close(self):
+        pass
@@ -1 +1 @@
-__all__ = ["metagen", "readdata", "S11fit", "newfile"]
+__all__ = ["metagen", "readdata", "S11fit", "newfile", "asyncwriter", "binarydata", "touchstone"]
@@ -0,0 +1,253 @@
+"""Background writer for measurement files
+
+Writing to the data file (especially on network shares) can take a significant amount of time
+and, when done in the acquisition loop, delays the next instrument trigger.  :any:`AsyncWriter`
+wraps an open file and behaves as a file for writing: everything written to it is put in a queue
+and written to disk by a background thread, so the acquisition and disk access overlap.  All the
+writing functions (:code:`stlab.savedict`, :code:`stlab.saveframe`, :code:`stlab.writeline`,
+...) can be used on it unchanged.  It is normally obtained from :any:`newfile`::
+
+    myfile = stlab.newfile('test', '_power_sweep', asyncwrite=True)
+    for pp in powers:
+        pna.SetPower(pp)
+        data = pna.MeasureScreen_pd()
+        stlab.saveframe(myfile, data)  #Returns as soon as the data is formatted
+    myfile.close()  #Waits for all data to be written and synced to disk
+
+Data is formatted in the calling thread (the strings are queued) so objects can be modified
+after being saved.  The queue is bounded: if the disk can not keep up, writes block until
+there is space again (backpressure) and the waiting time is recorded.
+
+"""
+
+import functools
+import os
+import queue
+import threading
+import time
+
+
+class AsyncWriter():
+    """File-like object that writes to a file in a background thread
+
+    Parameters
+    ----------
+    myfile : _io.TextIOWrapper
+        Open file handle for writing.  Is closed when the writer is closed
+    maxsize : int, optional
+        Maximum number of pending writes in the queue.  Further writes block until the
+        background thread catches up
+    flush_interval : float, optional
+        Minimum time in seconds between flushes of the file.  Calls to :any:`flush` in between
+        (e.g. from :code:`writeline`) are merged into a single flush
+
+    Attributes
+    ----------
+    name : str
+        Name of the underlying file
+    maxdepth : int
+        Maximum queue depth seen so far
+    nblocked : int
+        Number of writes that had to wait for space in the queue
+    blocked_time : float
+        Total time in seconds spent waiting for space in the queue
+
+    """
+
+    def __init__(self, myfile, maxsize=1000, flush_interval=1.):
+        self.file = myfile
+        self.name = myfile.name
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize)
+        self.pos = myfile.tell()
+        self.closed = False
+        self.error = None
+        self.flush_requested = False
+        self.filelock = threading.Lock()
+        self.maxdepth = 0
+        self.nblocked = 0
+        self.blocked_time = 0.
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        lastflush = time.time()
+        while True:
+            #Wake up after flush_interval if a flush is pending
+            timeout = self.flush_interval if self.flush_requested else None
+            try:
+                items = [self.queue.get(timeout=timeout)]
+            except queue.Empty:
+                items = []
+            #Take everything that is already waiting and write it in one go
+            while items and items[-1] is not None:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = bool(items) and items[-1] is None
+            try:
+                with self.filelock:
+                    if self.error is None:
+                        #Consecutive strings are written in one go.  Callables are run in order
+                        data = []
+                        for item in items:
+                            if isinstance(item, str):
+                                data.append(item)
+                                continue
+                            if data:
+                                self.file.write(''.join(data))
+                                data = []
+                            if item is not None:
+                                item()
+                        if data:
+                            self.file.write(''.join(data))
+                        now = time.time()
+                        if stop or (self.flush_requested
+                                    and now - lastflush >= self.flush_interval):
+                            self.flush_requested = False
+                            self.file.flush()
+                            lastflush = now
+            except Exception as err:
+                self.error = err  #Raised in the calling thread on the next call
+            for item in items:
+                self.queue.task_done()
+            if stop:
+                return
+
+    def _check(self):
+        if self.error is not None:
+            raise self.error
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+
+    def _put(self, item):
+        #Queue an item, waiting (and recording the wait) if the queue is full
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            t0 = time.time()
+            self.queue.put(item)
+            self.nblocked += 1
+            self.blocked_time += time.time() - t0
+        self.maxdepth = max(self.maxdepth, self.queue.qsize())
+
+    def write(self, mystr):
+        """Queue a string for writing
+
+        Blocks only if the queue is full
+
+        Parameters
+        ----------
+        mystr : str
+            String to write
+
+        Returns
+        -------
+        int
+            Number of characters queued
+
+        """
+        self._check()
+        self._put(mystr)
+        self.pos += len(mystr)
+        return len(mystr)
+
+    def submit(self, func, *args, **kwargs):
+        """Queue a function call to be run by the background thread
+
+        The call is done in order with the queued writes.  Used to write the binary block file
+        of :any:`newfile` (see :any:`BinaryWriter`) in the background.  The arguments should
+        not be modified after the call.  Exceptions are raised in the calling thread on the
+        next call, like write errors
+
+        Parameters
+        ----------
+        func : callable
+            Function to run
+        *args, **kwargs
+            Arguments passed to func
+
+        """
+        self._check()
+        self._put(functools.partial(func, *args, **kwargs))
+
+    def tell(self):
+        """Position in the file after all queued writes are done
+
+        """
+        return self.pos
+
+    @property
+    def depth(self):
+        """Number of writes waiting in the queue
+
+        """
+        return self.queue.qsize()
+
+    def flush(self):
+        """Request a flush of the file
+
+        Does not wait.  The flush is done by the background thread once the queued data is
+        written, at most once every :code:`flush_interval` seconds.  Use :any:`sync` to wait for
+        the data to be on disk
+
+        """
+        self._check()
+        self.flush_requested = True
+
+    def sync(self):
+        """Wait for all queued data to be written, then flush and sync the file to disk
+
+        Needed before reading the file while the measurement is running (e.g. for
+        :code:`stlab.metagen.fromdatafile`)
+
+        """
+        self._check()
+        self.queue.join()
+        self._check()
+        with self.filelock:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def status(self):
+        """Queue statistics
+
+        Returns
+        -------
+        dict
+            Current and maximum queue depth, number of blocked writes and total blocked time
+
+        """
+        return {
+            'depth': self.depth,
+            'maxdepth': self.maxdepth,
+            'nblocked': self.nblocked,
+            'blocked_time': self.blocked_time
+        }
+
+    def close(self):
+        """Write all queued data, sync the file to disk and close it
+
+        Raises any error that happened in the background thread
+
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+        try:
+            if self.error is None:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+        finally:
+            self.file.close()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,322 @@
+"""Binary block files for measurement data
+
+Large measurements (e.g. 2D maps with thousands of :code:`GetAllData` blocks) are slow to write
+and read as text.  This module provides an appendable binary format with the same structure as
+the usual :code:`.dat` files (a list of blocks, each with the same columns) and converters between
+the two.  A binary file can be written alongside the :code:`.dat` file by :any:`newfile` with
+:code:`binary=True`, in which case :code:`stlab.saveframe` and :code:`stlab.savedict` write each
+block to both files.
+
+File layout
+-----------
+A binary data file consists of two files:
+
+* :code:`<name>.npb`: the data.  A sequence of `npy <https://numpy.org/doc/stable/reference/generated/numpy.lib.format.html>`_
+  records, one per block, each containing a 2D array with shape (ncols, npoints).  The data is
+  column oriented, so a single column of a block is contiguous on disk.  The file can be read
+  without this module by calling :code:`np.load` repeatedly on the open file.
+* :code:`<name>.npb.idx`: the index.  Text file with one JSON object per line.  The first line
+  is the header :code:`{"format": "npb", "version": 1, "columns": [...], "meta": ...}` with the
+  column titles and the contents of the spyview metafile if known (or null).  Each following line
+  describes one block: :code:`{"offset": ..., "shape": [ncols, npoints], "dtype": "<f8",
+  "params": {...}}` where offset is the byte position of the block data (after the npy header)
+  and params is a dict of user defined block parameters (e.g. the value of the outer sweep
+  variable).
+
+Both files are only ever appended to, so a file being written can be read at any time and an
+interrupted measurement leaves a valid file.
+
+"""
+
+import json
+import os
+import numpy as np
+import pandas as pd
+
+from .writematrix import writeframe
+
+NPB_VERSION = 1
+
+
+def _index_name(filename):
+    return filename + '.idx'
+
+
+def _to_columns(data, columns=None):
+    #Convert a DataFrame, dict or matrix (rows are points) to column titles and a column array
+    if isinstance(data, pd.DataFrame):
+        return list(data), data.values.T
+    if isinstance(data, dict):
+        return list(data.keys()), np.asarray([data[k] for k in data])
+    return columns, np.asarray(data).T
+
+
+class BinaryWriter():
+    """Appendable binary block file writer
+
+    If the file already exists, new blocks are appended to it and its column titles are used.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the data file (usually ending in .npb).  The index is written to
+        :code:`filename + '.idx'`
+    columns : list of str or None, optional
+        Column titles.  If None, they are taken from the first block written
+    dtype : str or numpy.dtype, optional
+        Data type used on disk.  '<f4' halves the file size at the cost of precision
+    meta : str or None, optional
+        Contents of the spyview metafile to store in the header
+    asyncwriter : AsyncWriter or None, optional
+        If given, the blocks are written to disk by its background thread, in order with the
+        text written to it (used by :any:`newfile` with :code:`asyncwrite=True`).  The block
+        data is copied before returning
+
+    """
+
+    def __init__(self, filename, columns=None, dtype='<f8', meta=None, asyncwriter=None):
+        self.filename = filename
+        self.dtype = np.dtype(dtype)
+        self.columns = None
+        self.meta = meta
+        self.asyncwriter = asyncwriter
+        if os.path.exists(_index_name(filename)):
+            self.columns, _ = read_index(filename)
+        elif columns is not None:
+            self._write_header(list(columns))
+        #Create (or check) the data file
+        open(self.filename, 'ab').close()
+
+    def _write_header(self, columns):
+        header = {
+            'format': 'npb',
+            'version': NPB_VERSION,
+            'columns': columns,
+            'meta': self.meta
+        }
+        with open(_index_name(self.filename), 'w') as ff:
+            ff.write(json.dumps(header) + '\n')
+        self.columns = columns
+
+    def write_block(self, data, params=None):
+        """Append a block to the file
+
+        Parameters
+        ----------
+        data : pandas.DataFrame, dict or array_like
+            Block data.  Either a DataFrame or dict of columns (titles must match the file
+            columns) or a matrix with one line per point (like for :any:`writematrix`)
+        params : dict or None, optional
+            Block parameters to store in the index.  Must be json serializable
+
+        """
+        columns, arr = _to_columns(data, self.columns)
+        if arr.ndim != 2:
+            raise ValueError('Block data must be 2 dimensional')
+        if self.columns is None:
+            if columns is None:
+                columns = ['Col{}'.format(i + 1) for i in range(arr.shape[0])]
+            self._write_header(list(columns))
+        elif list(columns) != self.columns:
+            raise ValueError('Block columns {} do not match file columns {}'.format(
+                columns, self.columns))
+        if self.asyncwriter is not None:
+            #Copies the data and params so the caller can modify them while they wait in the queue
+            arr = np.array(arr, dtype=self.dtype, order='C')
+            self.asyncwriter.submit(self._append, arr, json.loads(json.dumps(params or {})))
+        else:
+            self._append(np.ascontiguousarray(arr, dtype=self.dtype), params)
+
+    def _append(self, arr, params):
+        #Write the block data and its index entry
+        with open(self.filename, 'ab') as ff:
+            np.lib.format.write_array(ff, arr, allow_pickle=False)
+            offset = ff.tell() - arr.nbytes
+        entry = {
+            'offset': offset,
+            'shape': list(arr.shape),
+            'dtype': self.dtype.str,
+            'params': params or {}
+        }
+        #The index is written after the data so it never points to incomplete blocks
+        with open(_index_name(self.filename), 'a') as ff:
+            ff.write(json.dumps(entry) + '\n')
+
+    def close(self):
+        """Nothing to do.  Files are only open while writing a block
+
+        """
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_index(filename):
+    """Read the index of a binary block file
+
+    Parameters
+    ----------
+    filename : str
+        Name of the data file (not the index)
+
+    Returns
+    -------
+    columns : list of str
+        Column titles
+    blocks : list of dict
+        One dict per block with keys 'offset', 'shape', 'dtype' and 'params'
+
+    """
+    with open(_index_name(filename), 'r') as ff:
+        header = json.loads(ff.readline())
+        if header.get('format') != 'npb':
+            raise ValueError('{} is not a binary block file'.format(filename))
+        blocks = []
+        for line in ff:
+            if not line.endswith('\n'):  #Block being written
+                break
+            blocks.append(json.loads(line))
+    return header['columns'], blocks
+
+
+def read_meta(filename):
+    """Return the spyview metafile contents of a binary block file (or None)
+
+    Uses the metafile stored in the header if there is one.  Otherwise (e.g. files written during
+    a measurement by :any:`newfile`, where the metafile is generated later alongside the .dat
+    file) reads the metafile with the same base name next to the binary file if it exists.
+
+    """
+    with open(_index_name(filename), 'r') as ff:
+        meta = json.loads(ff.readline()).get('meta')
+    if meta is None and os.path.exists(_metaname(filename)):
+        with open(_metaname(filename), 'r') as ff:
+            meta = ff.read()
+    return meta
+
+
+def readbin_pd(filename, blocks=None):
+    """Read a binary block file as a list of DataFrames
+
+    Equivalent of :code:`readdat_pd` for binary files.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the data file
+    blocks : list of int, slice or None, optional
+        Blocks to read.  All if None
+
+    Returns
+    -------
+    list of pandas.DataFrame
+        One DataFrame per block
+
+    """
+    columns, index = read_index(filename)
+    if blocks is None:
+        selected = index
+    elif isinstance(blocks, slice):
+        selected = index[blocks]
+    else:
+        selected = [index[i] for i in blocks]
+    with open(filename, 'rb') as ff:
+        return [_read_block(ff, entry, columns) for entry in selected]
+
+
+def _read_block(ff, entry, columns):
+    ncols, npoints = entry['shape']
+    ff.seek(entry['offset'])
+    arr = np.fromfile(ff, dtype=entry['dtype'], count=ncols * npoints)
+    return pd.DataFrame(arr.reshape(ncols, npoints).T, columns=columns)
+
+
+def readbin_params(filename):
+    """Block parameters of a binary block file as a DataFrame (one line per block)
+
+    """
+    _, index = read_index(filename)
+    return pd.DataFrame([entry['params'] for entry in index])
+
+
+def _metaname(filename):
+    return os.path.splitext(filename)[0] + '.meta.txt'
+
+
+def dat_to_bin(datfile, binfile=None, dtype='<f8', delim=', '):
+    """Convert a .dat text file (and its spyview metafile if present) to a binary block file
+
+    Parameters
+    ----------
+    datfile : str
+        Name of the text file
+    binfile : str or None, optional
+        Name of the binary file.  If None, the .dat extension is replaced by .npb
+    dtype : str or numpy.dtype, optional
+        Data type used on disk
+    delim : str, optional
+        Field delimiter of the text file
+
+    Returns
+    -------
+    str
+        Name of the binary file
+
+    """
+    from .readdata import readdat_pd
+    if binfile is None:
+        binfile = os.path.splitext(datfile)[0] + '.npb'
+    meta = None
+    if os.path.exists(_metaname(datfile)):
+        with open(_metaname(datfile), 'r') as ff:
+            meta = ff.read()
+    for name in (binfile, _index_name(binfile)):
+        if os.path.exists(name):
+            os.remove(name)
+    frames = readdat_pd(datfile, delim)
+    writer = BinaryWriter(binfile, list(frames[0]), dtype, meta)
+    for frame in frames:
+        writer.write_block(frame)
+    writer.close()
+    return binfile
+
+
+def bin_to_dat(binfile, datfile=None, f='%.10e', delim=', '):
+    """Convert a binary block file to a .dat text file (and spyview metafile if known)
+
+    The metafile is taken from the binary file header or from the metafile next to the binary
+    file (see :any:`read_meta`).
+
+    Parameters
+    ----------
+    binfile : str
+        Name of the binary file
+    datfile : str or None, optional
+        Name of the text file.  If None, the .npb extension is replaced by .dat
+    f : str, optional
+        Format specifier for the data (old style)
+    delim : str, optional
+        Field delimiter
+
+    Returns
+    -------
+    str
+        Name of the text file
+
+    """
+    if datfile is None:
+        datfile = os.path.splitext(binfile)[0] + '.dat'
+    columns, index = read_index(binfile)
+    with open(binfile, 'rb') as fin, open(datfile, 'w') as ff:
+        for entry in index:
+            writeframe(ff, _read_block(fin, entry, columns), f, delim)
+    meta = read_meta(binfile)
+    if meta is not None and not (os.path.exists(_metaname(datfile)) and os.path.samefile(
+            _metaname(datfile), _metaname(binfile))):
+        with open(_metaname(datfile), 'w') as ff:
+            ff.write(meta)
+    return datfile
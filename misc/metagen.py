@@ -174,28 +174,218 @@ def fromlimits(myfile,
     f.write('#Column labels\n')
     if colnames != None:
         if colnames == 'auto':
-            ff = open(filename, 'r')
-            titleline = ff.readline()
-            if titleline[0] == '#':
-                titleline = titleline[1:]
-            colnames = titleline.split(', ')
+            colnames = _titles(filename)
         else:
             colnames = list(colnames)
         for i, name in enumerate(colnames):
             f.write(str(i + 1) + '\n')
             f.write(str(name) + '\n')
-        f.close()
+    f.close()
     return
 
 
+def _flush(myfile):
+    #Make the data written so far readable from the file.  AsyncWriter.flush (newfile with
+    #asyncwrite=True) does not wait, so its sync is used instead
+    try:
+        if hasattr(myfile, 'sync'):
+            myfile.sync()
+        else:
+            myfile.flush()
+    except (AttributeError, ValueError):
+        pass
+
+
+def _titles(filename):
+    #Column titles from the title line of a data file
+    with open(filename, 'r') as ff:
+        titleline = ff.readline().strip('\n')
+    if titleline[0] == '#':
+        titleline = titleline[1:]
+    return titleline.split(', ')
+
+
+class MetaWriter():
+    """Keeps the metafile of a running measurement up to date
+
+    Writes the metafile once and, after each new block (outer loop point), only overwrites
+    the outer loop point count and limits in place.  The updated values are padded with spaces
+    to a fixed width so the file does not need to be rewritten (it is if a value is longer than
+    the width).  Column titles are determined once.  Replaces calling :any:`fromarrays` after
+    every block::
+
+        myfile = stlab.newfile(prefix, idstring)
+        meta = MetaWriter(myfile, xtitle='Frequency (Hz)', ytitle='Power (dB)')
+        for rfpower in powers:
+            pna.SetPower(rfpower)
+            data = pna.MeasureScreen_pd()
+            stlab.saveframe(myfile, data)
+            meta.update(data['Frequency (Hz)'], rfpower, colnames=data.keys())
+        meta.close()
+        myfile.close()
+
+    Parameters
+    ----------
+    myfile : file or string
+        Base file for metafile
+    xtitle, ytitle, ztitle : str, optional
+        Title for x, y, z axis axis
+    zarray : array of floats or empty list, optional
+        Array for z axis limits and number of points (for data cubes)
+    colnames : list of str, 'auto' or None, optional
+        List of column titles for the given file.  If 'auto', the title line of the file is read
+        on the first update.  Can also be given on the first call to :any:`update`
+
+    """
+    width = 25  #Width of the fields updated in place
+
+    def __init__(self,
+                 myfile,
+                 xtitle='',
+                 ytitle='',
+                 ztitle='',
+                 zarray=[],
+                 colnames=None):
+        if isinstance(myfile, str):
+            self.filename = myfile
+        else:
+            self.filename = os.path.realpath(myfile.name)
+        self.datafile = myfile
+        self.xtitle = xtitle
+        self.ytitle = ytitle
+        self.ztitle = ztitle
+        self.zarray = np.array(zarray)
+        self.colnames = colnames
+        self.yfirst = None
+        self.ny = 0
+        self.f = None
+        self.ypos = None
+        self.xfields = None
+        self.inplace = False  #Whether the outer loop fields in the file have the fixed width
+
+    def _yfields(self, ylast):
+        #Outer loop count and limits padded to the fixed width and whether they fit in it
+        ymin = self.yfirst
+        ymax = ylast
+        if ymin == ymax:
+            ymax = ymin + 1
+        fields = [str(x) for x in (self.ny, ymax, ymin)]
+        fits = all(len(x) <= self.width for x in fields)
+        return ''.join(x.ljust(self.width) + '\n' for x in fields), fits
+
+    def update(self, xarray, y, colnames=None):
+        """Add a point to the outer loop (call after saving each block)
+
+        Parameters
+        ----------
+        xarray : array of floats
+            Inner loop (x axis) values.  Only used on the first call
+        y : float
+            Outer loop value of the new block
+        colnames : list of str or None, optional
+            Column titles.  Only used on the first call if no column titles were given before
+
+        """
+        self.ny += 1
+        if self.f is not None:
+            yfields, fits = self._yfields(y)
+            if fits and self.inplace:
+                self.f.seek(self.ypos)
+                self.f.write(yfields)
+                self.f.flush()
+                return
+            self._write(y)
+            return
+        self.yfirst = y
+        if colnames is not None and self.colnames is None:
+            self.colnames = colnames
+        if self.colnames == 'auto':
+            _flush(self.datafile)
+            self.colnames = _titles(self.filename)
+        xarray = np.array(xarray)
+        xmin = xarray[0]
+        xmax = xarray[-1]
+        if xmin == xmax:
+            xmax = xmin + 1
+        self.xfields = (len(xarray), xmin, xmax)
+        base, _ = os.path.splitext(self.filename)
+        self.f = open(base + '.meta.txt', 'w')
+        self._write(y)
+
+    def _write(self, ylast):
+        #Write the whole metafile
+        f = self.f
+        f.seek(0)
+        f.truncate()
+        f.write('#Inner loop, X\n')
+        for x in self.xfields:
+            f.write(str(x) + '\n')
+        f.write(str(self.xtitle) + '\n')
+        f.write('#Outer loop, Y\n')
+        self.ypos = f.tell()
+        yfields, self.inplace = self._yfields(ylast)
+        f.write(yfields)
+        f.write(str(self.ytitle) + '\n')
+        if len(self.zarray) == 0:
+            f.write('#No loop, Z\n')
+            f.write(str(1) + '\n')
+            f.write(str(0) + '\n')
+            f.write(str(1) + '\n')
+            f.write('Nothing\n')
+        else:
+            zmin = self.zarray[0]
+            zmax = self.zarray[-1]
+            if zmin == zmax:
+                zmax = zmin + 1
+            f.write('#Outer outer loop, Z\n')
+            f.write(str(len(self.zarray)) + '\n')
+            f.write(str(zmin) + '\n')
+            f.write(str(zmax) + '\n')
+            f.write(str(self.ztitle) + '\n')
+        f.write('#Column labels\n')
+        if self.colnames is not None:
+            for i, name in enumerate(self.colnames):
+                f.write(str(i + 1) + '\n')
+                f.write(str(name) + '\n')
+        f.flush()
+
+    def close(self):
+        """Close the metafile
+
+        """
+        if self.f is not None:
+            self.f.close()
+
+
 #Somewhat specific for datafiles from the solderroom, 2D "gnuplot" files only
 def fromdatafile(myfile, xcol=None, ycol=None, xtitle=None, ytitle=None):
+    """Generates a metafile for a data file from the data in the file
+
+    The x axis is taken from the first block of the file and the y axis from the first value
+    of each block.  Only the first and last line of each block are parsed, using the block
+    index of the file (see :any:`readdata.build_index`).  The index is saved alongside the data
+    file, so later calls (e.g. during a running measurement) only scan the newly written data.
+
+    Parameters
+    ----------
+    myfile : file or string
+        Data file
+    xcol, ycol : int or None, optional
+        Column numbers (starting at 1) of the x and y axis
+    xtitle, ytitle : str or None, optional
+        Column titles of the x and y axis (used if the column number is not given)
+
+    """
     if isinstance(myfile, str):
         filename = myfile
     else:
         filename = os.path.realpath(myfile.name)
-    mydata = readdata.readdat(filename)
-    keylist = list(mydata[0].keys())
+        _flush(myfile)
+    index = readdata.build_index(filename)
+    nonempty = index['nrows'] > 0  #Repeated blank lines give empty blocks
+    first = index['first'][nonempty]
+    last = index['last'][nonempty]
+    keylist = index['names'][:first.shape[1]]
 
     if (type(xcol) is not int) and (type(ycol) is not int) and (
             type(xtitle) is str) and (type(ytitle) is str):
@@ -222,12 +412,12 @@ def fromdatafile(myfile, xcol=None, ycol=None, xtitle=None, ytitle=None):
     xkey = keylist[xcol]
     ykey = keylist[ycol]
 
-    Nx = len(mydata[0][xkey])
-    xmin = mydata[0][xkey][0]
-    xmax = mydata[0][xkey][-1]
-    Ny = len(mydata)
-    ymin = mydata[-1][ykey][0]
-    ymax = mydata[0][ykey][0]
+    Nx = index['nrows'][nonempty][0]
+    xmin = first[0][xcol]
+    xmax = last[0][xcol]
+    Ny = len(first)
+    ymin = first[-1][ycol]
+    ymax = first[0][ycol]
 
     print(xkey, Nx, xmin, xmax)
     print(ykey, Ny, ymin, ymax)
@@ -10,6 +10,8 @@ import os
 import shutil
 import re
 from stlab.utils import getgitid
+from stlab.utils.asyncwriter import AsyncWriter
+from stlab.utils.binarydata import BinaryWriter
 
 # Creates new measurement folder using prefix + datetime + idstring.
 # If colnames (array of column names) is included, the title line is written
@@ -24,7 +26,9 @@ def newfile(prefix,
             usefolder=True,
             autoindex=False,
             return_folder_name=False,
-            git_id=True):
+            git_id=True,
+            asyncwrite=False,
+            binary=False):
     """Creates a new file for storing data.
 
     By default will create a folder (at the location of the running script) with a new file open for writing
@@ -57,10 +61,17 @@ def newfile(prefix,
         Is False by default.
     git_id : bool, optional
         Boolean to query and save the git id of stlab
+    asyncwrite : bool, optional
+        If True, the file is wrapped in a :any:`AsyncWriter` so data is written to disk by a
+        background thread.  The returned object is used as the usual file handle.  False by default
+    binary : bool, optional
+        If True, a binary block file (:any:`BinaryWriter`) with the same name and extension .npb is
+        created alongside the .dat file.  Blocks saved with :code:`stlab.saveframe` or :code:`stlab.savedict`
+        are written to both (also in the background with :code:`asyncwrite`).  False by default
 
     Returns
     -------
-    myfile : _io.TextIOWrapper
+    myfile : _io.TextIOWrapper or AsyncWriter
         Open file handle for writing
 
     """
@@ -141,6 +152,12 @@ def newfile(prefix,
             print("##################\nget_gitid failed:\n", e.output)
         except FileNotFoundError:
             print("##################\nget_gitid failed:\nYour stlab(utils) is most likely not a git repo but was downloaded")
+    if asyncwrite:
+        myfile = AsyncWriter(myfile)
+    if binary:
+        myfile.binfile = BinaryWriter(
+            os.path.splitext(fullfilename)[0] + '.npb', colnames,
+            asyncwriter=myfile if asyncwrite else None)
     if return_folder_name:
         return myfile, fullfoldername
     else:
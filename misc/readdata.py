@@ -3,9 +3,14 @@
 # Sets are separated by a newline
 # Single title line and ', ' field delimeter
 
+import io
+import os
+import re
+import time
 import numpy as np
 import pandas as pd
 from stlab.utils.stlabdict import stlabdict
+from stlab.utils.touchstone import readtouchstone
 
 
 def readdat(filename, delim=', ', nlines=None):
@@ -64,24 +69,7 @@ def readdat(filename, delim=', ', nlines=None):
 
 
 def reads2p(filename):
-    with open(filename, 'r') as f:
-        names = [
-            'Frequency (Hz)', 'S11re ()', 'S11im ()', 'S21re ()', 'S21im ()',
-            'S12re ()', 'S12im ()', 'S22re ()', 'S22im ()'
-        ]
-
-        measurement = []
-        for line in f:
-            if line.startswith('!') or line.startswith('#'):
-                continue
-            line = [float(x) for x in line.strip('\n').split()]
-            measurement.append(line)
-        measurement = np.asarray(measurement)
-        measurement = measurement.T
-        mydict = stlabdict()
-        for name, data in zip(names, measurement):
-            mydict[name] = data
-        return pd.DataFrame(mydict)
+    return readtouchstone(filename, nports=2, frame=True)
 
 
 #        return mydict
@@ -132,74 +120,560 @@ def readQUCS(filename):
         return mylists, swept
 
 
-def readdat_pd(filename, delim=', ', nlines=None):
-    with open(filename, 'r') as f:
-        # variables = {}
-        # ivar = 0
-        # mylists = {}
-        # col = []
-        # currentvarname = ""
+def _split_blocks(text):
+    #Split text (starting at the beginning of a line) at blank lines.  Returns the row counts of
+    #the complete blocks (terminated by a blank line), the position after the last blank line
+    #and the position of each blank line
+    t = '\n' + text  #A blank line at position i of text is a '\n\n' at position i of t
+    counts = []
+    blanks = []
+    start = 0
+    i = t.find('\n\n')
+    while i >= 0:
+        counts.append(text.count('\n', start, i))
+        blanks.append(i)
+        start = i + 1
+        i = t.find('\n\n', start)
+    return counts, start, blanks
+
+
+def _parse_blocks(text, counts, names, delim):
+    #Parse the numeric lines in text in a single pass and split them in blocks of counts rows
+    sep = delim.strip() or None  #None for whitespace delimiters
+    if sum(counts) == 0:
+        data = np.empty((0, len(names)))
+    else:
+        #No comment lines: each line must be a row, as counted in counts
+        data = np.loadtxt(io.StringIO(text), delimiter=sep, ndmin=2, comments=None)
+    ncols = min(data.shape[1], len(names))
+    frames = []
+    first = 0
+    for nn in counts:
+        if nn == 0:
+            frames.append(pd.DataFrame())
+        else:
+            frames.append(
+                pd.DataFrame(data[first:first + nn, :ncols], columns=names[:ncols]))
+        first += nn
+    return frames
+
+
+def readdat_pd(filename, delim=', ', nlines=None, chunksize=1 << 24):
+    """Read a measurement data file as a list of DataFrames
+
+    The file is expected to have a single title line (starting with '#') with the column titles
+    separated by delim, followed by blocks of data lines separated by blank lines, as written by
+    :code:`stlab.saveframe` or :code:`stlab.savedict`.
+
+    The file is read in chunks of several MB.  All complete blocks in a chunk are parsed in a
+    single call to :code:`np.loadtxt` and each block is converted to a DataFrame in one go.
 
+    Parameters
+    ----------
+    filename : str
+        Name of the file to read
+    delim : str, optional
+        Field delimiter
+    nlines : int or None, optional
+        Maximum number of blocks to read.  If None, the full file is read
+    chunksize : int, optional
+        Number of characters read from the file at a time
+
+    Returns
+    -------
+    list of pandas.DataFrame
+        One DataFrame per block
+
+    """
+    with open(filename, 'r') as f:
         line = f.readline()
         line = line.strip("\n").strip("# ")
-        #        print(line)
         names = line.split(delim)
-        print(names)
 
-        block = []
         arrayofframes = []
-        nblocks = 0
-
-        for point in f:
-            if point == '\n':
-                block = np.asarray(block)
-                block = block.T
-                newframe = pd.DataFrame()
-                for name, dat in zip(names, block):
-                    newframe[name] = dat
-                arrayofframes.append(newframe)
-                block = []
-                nblocks += 1
-                if nlines == None:
-                    continue
-                elif nblocks < nlines:
-                    continue
-                else:
-                    break
-            point = [float(x) for x in point.strip('\n').split(delim)]
-            block.append(point)
-        if len(block) != 0:
-            block = np.asarray(block)
-            block = block.T
-            newframe = pd.DataFrame()
-            for name, dat in zip(names, block):
-                newframe[name] = dat
-            arrayofframes.append(newframe)
+        rest = ''
+        while True:
+            chunk = f.read(chunksize)
+            text = rest + chunk
+            if not chunk:  #End of file.  Last block may not end in a blank line
+                if text.strip('\n'):
+                    arrayofframes += _parse_blocks(text, [text.count('\n') + (
+                        not text.endswith('\n'))], names, delim)
+                break
+            counts, end, blanks = _split_blocks(text)
+            if nlines is not None and counts and len(arrayofframes) + len(
+                    counts) >= nlines:
+                counts = counts[:max(nlines - len(arrayofframes), 1)]
+                end = blanks[len(counts) - 1] + 1
+                arrayofframes += _parse_blocks(text[:end], counts, names, delim)
+                break
+            arrayofframes += _parse_blocks(text[:end], counts, names, delim)
+            rest = text[end:]
         return arrayofframes
 
 
-def reads2p_pd(filename):
-    with open(filename, 'r') as f:
-        names = [
-            'Frequency (Hz)', 'S11re ()', 'S11im ()', 'S21re ()', 'S21im ()',
-            'S12re ()', 'S12im ()', 'S22re ()', 'S22im ()'
+def _parse_line(line, ncols, delim):
+    #Values of a single data line as a float array of length ncols (padded with nan)
+    values = np.full(ncols, np.nan)
+    fields = line.decode().split(delim.strip() or None)[:ncols]
+    values[:len(fields)] = [float(x) for x in fields]
+    return values
+
+
+def _index_name(filename):
+    return filename + '.idx.npz'
+
+
+_blankline = re.compile(b'\n(?=\r?\n)')  #Line end followed by a blank line
+
+
+def _scan_blocks(f, start, names, delim, chunksize):
+    #Find the blocks in an open binary file starting at byte start (at the beginning of a line).
+    #Returns a list of (offset, nbytes, nrows, first, last), the position after the last
+    #complete block and the number of complete blocks.  A last block not terminated by a blank
+    #line is included (with its data up to the last complete line) but not counted as complete
+    ncols = len(names)
+    blocks = []
+    f.seek(start)
+    base = start  #File position of text[0]
+    rest = b''
+    while True:
+        chunk = f.read(chunksize)
+        text = rest + chunk
+        pos = 0
+        #Position of each blank line ('\n' or '\r\n' at the start of a line)
+        for match in _blankline.finditer(b'\n' + text):
+            i = match.start()
+            blank = 2 if text[i:i + 1] == b'\r' else 1
+            data = text[pos:i]
+            if data:
+                first = _parse_line(data[:data.find(b'\n')].strip(), ncols, delim)
+                last = _parse_line(data[data.rfind(b'\n', 0, -1) + 1:].strip(), ncols,
+                                   delim)
+            else:
+                first = last = np.full(ncols, np.nan)
+            blocks.append((base + pos, len(data), data.count(b'\n'), first, last))
+            pos = i + blank
+        rest = text[pos:]
+        base += pos
+        if not chunk:
+            break
+    end = base
+    ncomplete = len(blocks)
+    data = rest[:rest.rfind(b'\n') + 1]  #Complete lines of an unterminated last block
+    if data.strip():
+        blocks.append((base, len(data), data.count(b'\n'),
+                       _parse_line(data[:data.find(b'\n')].strip(), ncols, delim),
+                       _parse_line(data[data.rfind(b'\n', 0, -1) + 1:].strip(), ncols,
+                                   delim)))
+    return blocks, end, ncomplete
+
+
+def build_index(filename, delim=', ', save=True, chunksize=1 << 24):
+    """Build (or update) the block index of a measurement data file
+
+    The index contains the byte offset, size and number of lines of each block as well as the
+    values of the first and last line of each block.  It is saved alongside the data file (as
+    :code:`<filename>.idx.npz`) and reused on later calls.  If the data file has grown since the
+    index was saved (a measurement still running), only the new part of the file is scanned.
+    If the file is shorter than when indexed or its title line changed, the index is rebuilt.
+
+    A last block not (yet) terminated by a blank line is included in the index but rescanned
+    on the next update.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the data file
+    delim : str, optional
+        Field delimiter
+    save : bool, optional
+        Whether to save the index to disk.  Failure to save (e.g. read only folder) is ignored
+    chunksize : int, optional
+        Number of bytes read from the file at a time when scanning
+
+    Returns
+    -------
+    dict
+        Index with keys 'names' (column titles), 'offset', 'nbytes', 'nrows' (arrays with one
+        element per block), 'first' and 'last' (arrays of shape (nblocks, ncols) with the first
+        and last line of each block), 'end' (position after the last complete block) and
+        'ncomplete' (number of complete blocks)
+
+    """
+    idxname = _index_name(filename)
+    with open(filename, 'rb') as f:
+        header = f.readline()
+        size = os.fstat(f.fileno()).st_size
+        names = header.decode().strip("\r\n").strip("# ").split(delim)
+        index = None
+        if os.path.exists(idxname):
+            try:
+                with np.load(idxname) as saved:
+                    index = {key: saved[key] for key in saved.files}
+            except (OSError, ValueError):
+                index = None
+        #Check that the saved index belongs to this file (same header, not truncated)
+        if index is not None and (bytes(index['header']) != header
+                                  or int(index['end']) > size
+                                  or int(index['size']) > size):
+            index = None
+        if index is None:
+            ncomplete = 0
+            start = len(header)
+            old = ([], [], [], np.empty((0, len(names))), np.empty((0, len(names))))
+        else:
+            ncomplete = int(index['ncomplete'])
+            start = int(index['end'])
+            old = tuple(index[key][:ncomplete]
+                        for key in ('offset', 'nbytes', 'nrows', 'first', 'last'))
+            if int(index['size']) == size:  #Nothing new
+                return _index_dict(index, names)
+        blocks, end, newcomplete = _scan_blocks(f, start, names, delim, chunksize)
+    index = {
+        'header': np.frombuffer(header, dtype=np.uint8),
+        'size': size,
+        'end': end,
+        'ncomplete': ncomplete + newcomplete,
+        'offset': np.concatenate([old[0], [b[0] for b in blocks]]).astype(np.int64),
+        'nbytes': np.concatenate([old[1], [b[1] for b in blocks]]).astype(np.int64),
+        'nrows': np.concatenate([old[2], [b[2] for b in blocks]]).astype(np.int64),
+        'first': np.vstack([old[3]] + [b[3] for b in blocks]),
+        'last': np.vstack([old[4]] + [b[4] for b in blocks]),
+    }
+    if save:
+        try:
+            with open(idxname, 'wb') as ff:
+                np.savez(ff, **index)
+        except OSError:
+            pass
+    return _index_dict(index, names)
+
+
+def _index_dict(index, names):
+    out = {
+        key: index[key]
+        for key in ('offset', 'nbytes', 'nrows', 'first', 'last')
+    }
+    out['names'] = names
+    out['end'] = int(index['end'])
+    out['ncomplete'] = int(index['ncomplete'])
+    return out
+
+
+def _block_frame(data, names, delim):
+    #DataFrame from the bytes of the lines of a block
+    if not data.strip():
+        return pd.DataFrame()
+    data = np.loadtxt(
+        io.StringIO(data.decode()), delimiter=delim.strip() or None, ndmin=2, comments=None)
+    ncols = min(data.shape[1], len(names))
+    return pd.DataFrame(data[:, :ncols], columns=names[:ncols])
+
+
+def _read_block(f, index, i, delim):
+    f.seek(int(index['offset'][i]))
+    return _block_frame(f.read(int(index['nbytes'][i])), index['names'], delim)
+
+
+def read_blocks(filename, indices, delim=', '):
+    """Read selected blocks of a measurement data file
+
+    Uses the block index (see :any:`build_index`, built or updated if needed) to seek directly
+    to the requested blocks, so only the requested data is parsed.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the data file
+    indices : int, list of int or slice
+        Block numbers to read.  Negative numbers count from the end
+    delim : str, optional
+        Field delimiter
+
+    Returns
+    -------
+    pandas.DataFrame or list of pandas.DataFrame
+        A single DataFrame if indices is an int, else a list with one DataFrame per block
+
+    """
+    index = build_index(filename, delim)
+    nblocks = len(index['offset'])
+    if isinstance(indices, slice):
+        indices = range(nblocks)[indices]
+    single = np.isscalar(indices)
+    if single:
+        indices = [indices]
+    with open(filename, 'rb') as f:
+        frames = [
+            _read_block(f, index, range(nblocks)[i], delim) for i in indices
         ]
+    return frames[0] if single else frames
 
-        measurement = []
-        for line in f:
-            if line.startswith('!') or line.startswith('#'):
+
+def iter_blocks(filename, start=0, stop=None, delim=', '):
+    """Iterate over the blocks of a measurement data file
+
+    Like :any:`read_blocks` but yields one DataFrame at a time, so files larger than memory can be
+    processed block by block.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the data file
+    start, stop : int or None, optional
+        Range of blocks to iterate over (as in a slice)
+    delim : str, optional
+        Field delimiter
+
+    Yields
+    ------
+    pandas.DataFrame
+        One DataFrame per block
+
+    """
+    index = build_index(filename, delim)
+    with open(filename, 'rb') as f:
+        for i in range(len(index['offset']))[start:stop]:
+            yield _read_block(f, index, i, delim)
+
+
+class DataArray():
+    """Measurement data of a regular file as a 3D array with column titles
+
+    Returned by :any:`readdat_array`.  Indexing with a column title returns that column for
+    all blocks as a (nblocks, npoints) array.  Any other index is applied to the underlying
+    array.  Since the data is usually memory mapped, only the parts actually used are read
+    from disk.
+
+    Attributes
+    ----------
+    data : numpy.ndarray or numpy.memmap
+        Array of shape (nblocks, npoints, ncols)
+    names : list of str
+        Column titles
+
+    """
+
+    def __init__(self, data, names):
+        self.data = data
+        self.names = list(names)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.data[:, :, self.names.index(key)]
+        return self.data[key]
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.data, dtype=dtype)
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def frame(self, i):
+        """Block i as a DataFrame (as returned by :any:`readdat_pd`)
+
+        """
+        return pd.DataFrame(np.array(self.data[i]), columns=self.names)
+
+
+def _npb_array(filename):
+    #Memory mapped (nblocks, npoints, ncols) view of a binary block file, None if not regular
+    from stlab.utils.binarydata import read_index
+    names, index = read_index(filename)
+    if not index:
+        return None
+    shapes = {tuple(entry['shape']) for entry in index}
+    dtypes = {entry['dtype'] for entry in index}
+    offsets = np.array([entry['offset'] for entry in index])
+    steps = np.unique(np.diff(offsets))
+    if len(shapes) != 1 or len(dtypes) != 1 or len(steps) > 1:
+        return None
+    ncols, npoints = shapes.pop()
+    dtype = np.dtype(dtypes.pop())
+    step = int(steps[0]) if len(steps) else ncols * npoints * dtype.itemsize
+    mm = np.memmap(filename, dtype=np.uint8, mode='r')
+    arr = np.ndarray((len(index), ncols, npoints),
+                     dtype=dtype,
+                     buffer=mm,
+                     offset=int(offsets[0]),
+                     strides=(step, npoints * dtype.itemsize, dtype.itemsize))
+    return DataArray(arr.transpose(0, 2, 1), names)
+
+
+def readdat_array(filename, delim=', ', cache=True):
+    """Read a regular measurement file as a lazily loaded 3D array
+
+    For files where all blocks have the same number of lines, returns the data as an array of
+    shape (nblocks, npoints, ncols) that is only read from disk when used, e.g.
+    :code:`readdat_array(filename)['Power (dBm)'][:, 0]` only reads the first value of one column
+    of each block.
+
+    If a binary block file (see :any:`binarydata`) with the same name and extension .npb exists
+    (or filename is the .npb file), it is memory mapped directly.  Otherwise the text file is
+    parsed once, block by block, into a :code:`<filename>.npy` cache that is memory mapped and
+    reused on later calls while it is newer than the data file and has the right shape.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the data file (.dat or .npb)
+    delim : str, optional
+        Field delimiter of the text file
+    cache : bool, optional
+        Whether to write the .npy cache for text files.  If False (or the cache can not be
+        written), the data is loaded in memory
+
+    Returns
+    -------
+    DataArray
+        3D array with column title lookup
+
+    Raises
+    ------
+    ValueError
+        If the blocks do not all have the same length.  Use :any:`readdat_pd` for those files
+
+    """
+    base, ext = os.path.splitext(filename)
+    binfile = filename if ext == '.npb' else base + '.npb'
+    if os.path.exists(binfile + '.idx'):
+        arr = _npb_array(binfile)
+        if arr is not None:
+            return arr
+        if binfile == filename:
+            raise ValueError('Blocks in {} are not all the same size'.format(filename))
+
+    cachename = filename + '.npy'
+    index = build_index(filename, delim)
+    names = index['names']
+    nrows = index['nrows']
+    nblocks = len(nrows)
+    if nblocks > 1 and index['ncomplete'] < nblocks and nrows[-1] != nrows[0]:
+        nblocks -= 1  #Last block still being written
+    nrows = nrows[:nblocks][nrows[:nblocks] > 0]  #Skip empty blocks (repeated blank lines)
+    if len(nrows) == 0 or np.any(nrows != nrows[0]):
+        raise ValueError('Blocks in {} are not all the same size'.format(filename))
+    ncols = index['first'].shape[1]
+    shape = (len(nrows), int(nrows[0]), ncols)
+    if cache and os.path.exists(cachename) and os.path.getmtime(
+            cachename) > os.path.getmtime(filename):
+        arr = np.load(cachename, mmap_mode='r')
+        if arr.shape == shape:
+            return DataArray(arr, names[:ncols])
+    arr = None
+    if cache:
+        try:  #Written under a temporary name so an interrupted parse leaves no cache
+            arr = np.lib.format.open_memmap(
+                cachename + '.tmp', mode='w+', dtype=np.float64, shape=shape)
+        except OSError:
+            arr = None
+    inmemory = arr is None
+    if inmemory:
+        arr = np.empty(shape)
+    i = 0
+    for block in iter_blocks(filename, stop=nblocks, delim=delim):
+        if len(block) == 0:
+            continue
+        arr[i] = block.values
+        i += 1
+    if inmemory:
+        return DataArray(arr, names[:ncols])
+    arr.flush()
+    del arr
+    try:
+        os.replace(cachename + '.tmp', cachename)
+    except OSError:  #Old cache still mapped (Windows).  Use the new one under its temporary name
+        cachename = cachename + '.tmp'
+    return DataArray(np.load(cachename, mmap_mode='r'), names[:ncols])
+
+
+def follow(filename, delim=', ', fromstart=True, interval=0.5, timeout=None):
+    """Follow a data file that is being written and yield its blocks as they are completed
+
+    Generator for live plotting or online analysis of a running measurement (possibly from a
+    different process).  Keeps track of the position in the file so each update only reads
+    the newly appended data.  A block is yielded once the blank line that ends it is written.
+    Partially written lines and blocks are kept until they are completed.
+
+    Example::
+
+        for block in stlab.readdata.follow(filename, timeout=600):
+            plt.plot(block['Frequency (Hz)'], block['S21dB (dB)'])
+            plt.pause(0.01)
+
+    Parameters
+    ----------
+    filename : str
+        Name of the data file
+    delim : str, optional
+        Field delimiter
+    fromstart : bool, optional
+        If True, the blocks already in the file are yielded first.  If False, only blocks
+        completed after the call are yielded
+    interval : float, optional
+        Time in seconds between checks for new data
+    timeout : float or None, optional
+        Stop after this many seconds without new data.  If None, follows the file forever
+
+    Yields
+    ------
+    pandas.DataFrame
+        One DataFrame per completed block
+
+    """
+    with open(filename, 'rb') as f:
+        header = b''
+        lastdata = time.time()
+        while not header.endswith(b'\n'):  #Wait for the complete title line
+            newdata = f.readline()
+            if newdata:
+                header += newdata
+                lastdata = time.time()
+            elif timeout is not None and time.time() - lastdata > timeout:
+                return
+            else:
+                time.sleep(interval)
+        names = header.decode().strip("\r\n").strip("# ").split(delim)
+        if fromstart:
+            rest = b''
+        else:  #Skip to the end of the last complete block
+            rest = f.read()
+            last = None
+            for last in _blankline.finditer(b'\n' + rest):
+                pass
+            if last is not None:
+                i = last.start()
+                rest = rest[i + (2 if rest[i:i + 1] == b'\r' else 1):]
+        while True:
+            newdata = f.read()
+            if not newdata:
+                if timeout is not None and time.time() - lastdata > timeout:
+                    return
+                time.sleep(interval)
                 continue
-            line = [float(x) for x in line.strip('\n').split()]
-            measurement.append(line)
-        measurement = np.asarray(measurement)
-        measurement = measurement.T
-        myframe = pd.DataFrame()
-        for name, data in zip(names, measurement):
-            myframe[name] = data
-        return myframe
+            lastdata = time.time()
+            text = rest + newdata
+            pos = 0
+            for match in _blankline.finditer(b'\n' + text):
+                i = match.start()
+                yield _block_frame(text[pos:i], names, delim)
+                pos = i + (2 if text[i:i + 1] == b'\r' else 1)
+            rest = text[pos:]
 
 
-pi = np.pi
+def reads2p_pd(filename):
+    """Read a 2-port Touchstone file as a DataFrame
+
+    The option line is honoured (frequency in Hz and real/imaginary data whatever the file
+    format).  See :any:`touchstone.readtouchstone` for general N-port files
+
+    """
+    return readtouchstone(filename, nports=2, frame=True)
 
 
 def readQUCS_pd(filename):  #BROKEN
@@ -275,30 +275,230 @@ def dictarr_to_mtx(data, key, rangex=None, rangey=None, xkey=None, ykey=None, xt
         return stlabmtx(zz, xtitle=xtitle, ytitle=ytitle, ztitle=ztitle)
     return 
 
+def _rowpercentiles(data, n, qs):
+    #Percentiles qs of each row of data with n valid values per row (invalid values are NaN).
+    #Same as np.percentile with the default linear interpolation.  Rows with the same number of
+    #valid values are partitioned together, which is much faster than sorting
+    pos = [q/100.*np.maximum(n-1,0) for q in qs]
+    lo = [np.floor(p).astype(int) for p in pos]
+    hi = [np.minimum(l+1,np.maximum(n-1,0)) for l in lo]
+    out = [np.full(len(n),np.nan) for q in qs]
+    for nn in np.unique(n):
+        if nn == 0:
+            continue
+        rows = np.nonzero(n==nn)[0]
+        r = rows[0]
+        kth = sorted(set([l[r] for l in lo]+[h[r] for h in hi]))
+        part = data[rows] #Copy, partitioned in place
+        part.partition(kth,axis=1)
+        for p, l, h, o in zip(pos,lo,hi,out):
+            a = part[:,l[r]]
+            b = part[:,h[r]]
+            t = p[r]-l[r]
+            #Same rounding as np.percentile
+            o[rows] = a+(b-a)*t if t<0.5 else b-(b-a)*(1-t)
+    return out
+
+def _sub_lbl_block(y, lowp, highp, low_limit, high_limit):
+    #Line means of y (see sub_lbl).  Returns the means and the number of lines with no values to average
+    valid = (y>=low_limit) & (y<=high_limit)
+    n = valid.sum(axis=1)
+    if not valid.all():
+        #Values outside the limits are excluded the same way as NaN
+        y = np.where(valid,y,np.nan)
+    low_thres, high_thres = _rowpercentiles(y,n,[lowp,100-highp])
+    crop = (y>=low_thres[:,None]) & (y<=high_thres[:,None])
+    count = crop.sum(axis=1)
+    total = np.sum(y,axis=1,where=crop)
+    ok = (n>0) & (count>0)
+    mean = np.zeros(len(y))
+    mean[ok] = total[ok]/count[ok]
+    return mean, np.count_nonzero(~ok)
+
 def sub_lbl(data, lowp=40, highp=40, low_limit=-1e99, high_limit=1e99):
-    new_mtx = []
-    mtx=data.copy() # for some reason this makes it faster
-    for y in mtx:
-        # Find boundaries
-        min0 = max(y.min(),low_limit)
-        max0 = min(y.max(),high_limit)
-        crop = np.logical_and(min0<=y,y<=max0) # crop list accordingly
-        # Find upper and lower percentiles and assign truthvalue to elements
-        # This is a major time contributor
-        if len(y[crop]) == 0:
-            print('sub_lbl: Warning, no values to average')
-            mean = 0
+    """Line by line background subtraction
+
+    For each line, the values within [low_limit, high_limit] are taken and the mean of the ones
+    between their lowp and (100-highp) percentiles is subtracted from the line.  NaN values are
+    ignored.  Lines with no values to average are left unchanged.
+
+    Parameters
+    ----------
+    data : array_like
+        2D data matrix
+    lowp, highp : float, optional
+        Percentage of lowest and highest values excluded from the mean
+    low_limit, high_limit : float, optional
+        Values outside these limits are not used for the mean
+
+    Returns
+    -------
+    numpy.matrix
+        Data with the mean of each line subtracted
+
+    """
+    y = np.asarray(data, dtype=float)
+    if y.ndim == 1:
+        y = y[None,:]
+    #Lines are processed in blocks of about 1M values so the temporaries stay in cache
+    step = max(1,(1<<20)//max(1,y.shape[1]))
+    mean = np.empty(len(y))
+    nbad = 0
+    for i in range(0,len(y),step):
+        mean[i:i+step], nb = _sub_lbl_block(y[i:i+step],lowp,highp,low_limit,high_limit)
+        nbad += nb
+    if nbad:
+        print('sub_lbl: Warning, no values to average in {} lines'.format(nbad))
+    return np.matrix(np.squeeze(y-mean[:,None]))
+
+def _interp_block(x, y, xnew):
+    #interp_columns on a block of columns
+    #Work on the transpose (one line per column) so the data of each column is contiguous
+    xt = np.array(x.T,order='C')
+    ncols, n = xt.shape
+    m = len(xnew)
+    yt = None
+    #Sort the non monotonic columns (stable sort as in interp1d, NaN go last)
+    unsorted = np.nonzero(~(np.diff(xt,axis=1)>=0).all(axis=1))[0]
+    if len(unsorted):
+        order = np.argsort(xt[unsorted],axis=1,kind='stable')
+        xt[unsorted] = np.take_along_axis(xt[unsorted],order,axis=1)
+        yt = np.repeat(y[None,:],ncols,axis=0)
+        yt[unsorted] = y[order]
+    #Number of samples of each column at or below each new point (searchsorted(column, xnew, 'right')
+    #as in np.interp, which interp1d uses).  Each sample is at or below the new points from
+    #searchsorted(xnew, sample, 'left') on, so the counts are a cumulative histogram of these positions.
+    #With repeated sample values the bracket starts at the last repeat, so a new point equal to them
+    #gets the value of the last one
+    pos = np.searchsorted(xnew,xt,side='left')
+    pos += np.arange(ncols)[:,None]*(m+1)
+    counts = np.bincount(pos.ravel(),minlength=ncols*(m+1)).reshape(ncols,m+1)
+    hi = np.cumsum(counts[:,:-1],axis=1).clip(1,n-1)
+    if yt is None:
+        y_lo = y[hi-1]
+        y_hi = y[hi]
+    hi += np.arange(ncols)[:,None]*n #Indexes in the flattened xt
+    x_lo = np.take(xt,hi-1)
+    x_hi = np.take(xt,hi)
+    if yt is not None:
+        y_lo = np.take(yt,hi-1)
+        y_hi = np.take(yt,hi)
+    #Same expression as interp1d (in place to limit temporaries)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        ynew = np.subtract(y_hi,y_lo,out=y_hi)
+        ynew /= np.subtract(x_hi,x_lo,out=x_hi)
+        ynew *= np.subtract(xnew,x_lo,out=x_lo)
+        ynew += y_lo
+    #New points equal to the last sample take its value (the bracket is clipped to the last interval)
+    first = np.searchsorted(xnew,xt[:,0],side='left')
+    end = np.searchsorted(xnew,xt[:,-1],side='left')
+    last = np.searchsorted(xnew,xt[:,-1],side='right')
+    k = np.arange(m)
+    atend = (k>=end[:,None]) & (k<last[:,None])
+    ynew[atend] = np.broadcast_to(y[-1] if yt is None else yt[:,-1:],ynew.shape)[atend]
+    #Outside the range of each column
+    ynew[(k<first[:,None]) | (k>=last[:,None])] = np.nan
+    return ynew.T
+
+def interp_columns(x, y, xnew):
+    """Linear interpolation of y as a function of each column of x
+
+    Vectorized equivalent of applying :code:`interp1d(x[:,i], y, bounds_error=False, fill_value=np.nan)(xnew)`
+    to all columns (same results, NaN outside the range of each column).  Columns do not need to be
+    monotonic, the ones that are not are sorted first.
+
+    Parameters
+    ----------
+    x : 2D array
+        Sample points, one column per curve (shape (n, ncols))
+    y : 1D array
+        Values at the sample points, common to all columns (length n)
+    xnew : 1D array, sorted
+        Points to interpolate at
+
+    Returns
+    -------
+    numpy.ndarray
+        Interpolated values with shape (len(xnew), ncols)
+
+    """
+    x = np.asarray(x,dtype=float)
+    y = np.asarray(y,dtype=float)
+    xnew = np.asarray(xnew,dtype=float)
+    ynew = np.empty((len(xnew),x.shape[1]))
+    #Blocks of columns small enough for the temporaries to stay in cache
+    step = max(1,(1<<17)//max(1,len(x)))
+    for i in range(0,x.shape[1],step):
+        ynew[:,i:i+step] = _interp_block(x[:,i:i+step],y,xnew)
+    return ynew
+
+#Process strings that differ from the method name
+_stepnames = {'abs': 'absolute', 'scale': 'scale_data'}
+
+def _parsestep(line):
+    #Parse a process string into (method name, parameters).  Used as step cache key so
+    #'lowpass 2,2' and 'lowpass 2.0,2.0' are the same step.  Returns None for empty lines
+    sline = line.strip().split(' ',1)
+    func = sline[0].strip()
+    if func == '':
+        return None
+    if len(sline) == 1 or sline[1].strip() == '':
+        pars = ()
+    else:
+        pars = tuple(float(x) for x in sline[1].split(','))
+    return _stepnames.get(func,func), pars
+
+def _nextkey(key, line):
+    #Step cache key after applying the filter in line.  None (no caching from there on) if the
+    #key is already None or the parameters are not numbers (e.g. outlier with a list of lines)
+    if key is None:
+        return None
+    try:
+        return key + (_parsestep(line),)
+    except ValueError:
+        return None
+
+def _writemtxheader(outfile, rangex, rangey, xtitle, ytitle, ztitle, dtype=np.float64):
+    #Header of a spyview mtx file
+    #Units, Dataset name, xname, xmin, xmax, yname, ymin, ymax, zname, zmin, zmax
+    #nx ny nz length
+    line = ['Units',ztitle, xtitle,'{:e}'.format(rangex[0]),'{:e}'.format(rangex[-1]), ytitle,'{:e}'.format(rangey[0]),'{:e}'.format(rangey[-1]), 'Nothing',str(0),str(1)]
+    outfile.write(bytes(', '.join(line) + '\n', 'ASCII'))
+    outfile.write(bytes('{} {} 1 {}\n'.format(len(rangex),len(rangey),np.dtype(dtype).itemsize), 'ASCII'))
+
+def _openmtx(filename, lazy=False):
+    #Read (or memory map if lazy) a spyview mtx file.  Returns the matrix (ny, nx) and a dict with the
+    #axes and titles (None if the file has no Units line)
+    header = {'xtitle': None, 'ytitle': None, 'ztitle': None}
+    with open(filename,'rb') as infile:
+        content = infile.readline().decode('ASCII')
+        if content[:5] == 'Units':
+            content = [x.strip() for x in content.split(',')]
+            header['ztitle'] = content[1]
+            header['xtitle'] = content[2]
+            header['ytitle'] = content[5]
+            xlow, xhigh = np.float64(content[3]), np.float64(content[4])
+            ylow, yhigh = np.float64(content[6]), np.float64(content[7])
+            content = infile.readline().decode('ASCII')
         else:
-            low_thres = np.percentile(y[crop],lowp)
-            high_thres = np.percentile(y[crop],100-highp)
-            crop2 = np.logical_and(low_thres<=y,y<=high_thres) # crop again
-            if len(y[crop2]) == 0:
-                print('sub_lbl: Warning, no values to average')
-                mean = 0
-            else:
-                mean = y[crop2].mean() # Calculate mean of remaining values
-        new_mtx.append(y-mean)
-    return np.matrix(np.squeeze(new_mtx))
+            xlow, ylow, xhigh, yhigh = None, None, None, None
+        content = content.split()
+        nx = int(content[0])
+        ny = int(content[1])
+        lb = int(content[3])
+        offset = infile.tell()
+        dtype = {8: '<f8', 4: '<f4'}[lb]
+        if lazy:
+            data = np.memmap(filename,dtype=dtype,mode='r',offset=offset,shape=(ny,nx),order='F')
+        else:
+            data = np.fromfile(infile,dtype=dtype,count=nx*ny).reshape((ny,nx),order='F')
+    if xlow is None:
+        header['rangex'] = np.linspace(1,nx,nx)
+        header['rangey'] = np.linspace(1,ny,ny)
+    else:
+        header['rangex'] = np.linspace(xlow,xhigh,nx)
+        header['rangey'] = np.linspace(ylow,yhigh,ny)
+    return data, header
 
 #Main stlabmtx_pd class
 class stlabmtx():
@@ -320,9 +520,18 @@ class stlabmtx():
         Titles for the x,y and z (data) axes 
     xtitle0, ytitle0, ztitle0 : str
         Initial Titles for the x,y and z (data) axes (so, in case they are changed, reset can recover them)
+    cache : collections.OrderedDict
+        Step cache.  Processed matrix (and titles) after each applied sequence of filters, keyed by
+        the sequence.  Changing a step in the process list (:any:`delstep`, :any:`insertstep`) then only
+        recomputes the steps after it.  Least recently used results are dropped when the total size
+        exceeds cache_budget.  Filters called with parameters that are not numbers (e.g. :any:`outlier`
+        with a list) and the ones after them are not cached
+    cache_budget : int
+        Memory budget of the step cache in bytes (class attribute, can be changed per object)
 
     """
-    def __init__(self, mtx, xtitle='xtitle', ytitle='ytitle', ztitle = 'ztitle'):
+    cache_budget = 1<<30
+    def __init__(self, mtx, xtitle='xtitle', ytitle='ytitle', ztitle = 'ztitle', copy=True):
         """stlab mtx initialization
 
         Takes an input DataFrame and sets up the object
@@ -333,13 +542,17 @@ class stlabmtx():
             Intup Dataframe
         xtitle, ytitle, ztitle : str
             Title for x,y and z axes
+        copy : bool, optional
+            If False, the data of the input DataFrame is used without copying it (only the axes are
+            copied).  Saves memory for large maps but the DataFrame must then not be modified
 
         """
-        self.mtx = copy.deepcopy(mtx)
-        self.mtx.index.name = str(ytitle)
-        self.mtx.columns.name = str(xtitle)
+        #rename_axis also copies the axes so the input DataFrame is not modified
+        self.mtx = mtx.copy(deep=bool(copy)).rename_axis(index=str(ytitle),columns=str(xtitle))
         print(self.mtx.shape)
         self.processlist = []
+        self._key = ()
+        self.clearcache()
         self.pmtx = self.mtx
         self.xtitle=str(xtitle)
         self.ytitle=str(ytitle)
@@ -370,7 +583,7 @@ class stlabmtx():
 
         """
         self.pmtx = np.abs(self.pmtx)
-        self.processlist.append('abs')
+        self._done('abs')
     def crop(self,left=None,right=None,up=None,low=None):
         """Crop filter
 
@@ -401,7 +614,7 @@ class stlabmtx():
         for key,val in valdict.items():
             if val==None:
                 valdict[key] = 0
-        self.processlist.append('crop {},{},{},{}'.format(valdict['left'],valdict['right'],valdict['up'],valdict['low']))
+        self._done('crop {},{},{},{}'.format(valdict['left'],valdict['right'],valdict['up'],valdict['low']))
     def flip(self,x=False,y=False):
         """Flip filter
 
@@ -420,7 +633,7 @@ class stlabmtx():
             self.pmtx = self.pmtx.iloc[:,::-1]
         if y:
             self.pmtx = self.pmtx.iloc[::-1,:]
-        self.processlist.append('flip {:d},{:d}'.format(x,y))
+        self._done('flip {:d},{:d}'.format(x,y))
     def log10(self):
         """Log10 filter
 
@@ -428,7 +641,7 @@ class stlabmtx():
 
         """
         self.pmtx = np.log10(self.pmtx)
-        self.processlist.append('log10')
+        self._done('log10')
     def lowpass(self,x=0,y=0):
         """Low Pass filter
 
@@ -442,8 +655,8 @@ class stlabmtx():
 
         """
         # TODO implement different filter types
-        self.pmtx.loc[:,:] = gaussian_filter( self.pmtx, sigma=[int(y),int(x)])
-        self.processlist.append('lowpass {},{}'.format(x,y))
+        self.pmtx = self._replaced(gaussian_filter( self.pmtx.values, sigma=[int(y),int(x)]))
+        self._done('lowpass {},{}'.format(x,y))
     def neg(self):
         """Negative filter
 
@@ -451,7 +664,7 @@ class stlabmtx():
 
         """
         self.pmtx = -self.pmtx
-        self.processlist.append('neg')
+        self._done('neg')
     def offset(self,x=0):
         """Offset filter
 
@@ -464,7 +677,7 @@ class stlabmtx():
 
         """
         self.pmtx = self.pmtx + x
-        self.processlist.append('offset {}'.format(x))
+        self._done('offset {}'.format(x))
     def offset_axes(self,x=0,y=0):
         """Axes offset filter
 
@@ -476,9 +689,9 @@ class stlabmtx():
             Values to add to the axes values of the matrix
 
         """
-        self.pmtx.columns = self.pmtx.columns + x
-        self.pmtx.index = self.pmtx.index + y
-        self.processlist.append('offset_axes {},{}'.format(x,y))
+        self.pmtx = self.pmtx.set_axis(self.pmtx.columns + x, axis=1)
+        self.pmtx = self.pmtx.set_axis(self.pmtx.index + y, axis=0)
+        self._done('offset_axes {},{}'.format(x,y))
     def outlier(self,line,vertical=1):
         """Outlier filter
         
@@ -494,7 +707,7 @@ class stlabmtx():
         """
         axis = 1-vertical #swap 1 and 0 since vertical axis is 0 and horizontal is 1
         self.pmtx = self.pmtx.drop(line,axis = axis)
-        self.processlist.append('outlier {},{}'.format(line,vertical))
+        self._done('outlier {},{}'.format(line,vertical))
     def pixel_avg(self,nx=0,ny=0,center=0):
         """Pixel average filter
         
@@ -511,12 +724,12 @@ class stlabmtx():
         """
         nx=int(nx); ny=int(ny)
         if bool(center):
-            self.pmtx.loc[:,:] = ndimage.generic_filter(self.pmtx, np.nanmean, size=(nx,ny), mode='constant',cval=np.NaN)
+            self.pmtx = self._replaced(ndimage.generic_filter(self.pmtx.values, np.nanmean, size=(nx,ny), mode='constant',cval=np.nan))
         else:
             mask = np.ones((nx, ny))
             mask[int(nx/2), int(ny/2)] = 0
-            self.pmtx.loc[:,:] = ndimage.generic_filter(self.pmtx, np.nanmean, footprint=mask, mode='constant', cval=np.NaN)
-        self.processlist.append('pixel_avg {},{},{}'.format(nx,ny,center))
+            self.pmtx = self._replaced(ndimage.generic_filter(self.pmtx.values, np.nanmean, footprint=mask, mode='constant', cval=np.nan))
+        self._done('pixel_avg {},{},{}'.format(nx,ny,center))
     def rotate_ccw(self):
         """Rotate counter-clockwise filter
 
@@ -526,7 +739,7 @@ class stlabmtx():
         self.ytitle, self.xtitle = self.xtitle, self.ytitle
         self.pmtx = self.pmtx.transpose()
         self.pmtx = self.pmtx.iloc[::-1,:]
-        self.processlist.append('rotate_ccw')
+        self._done('rotate_ccw')
     def rotate_cw(self):
         """Rotate clockwise filter
 
@@ -536,7 +749,7 @@ class stlabmtx():
         self.ytitle, self.xtitle = self.xtitle, self.ytitle
         self.pmtx = self.pmtx.transpose()
         self.pmtx = self.pmtx.iloc[:,::-1]
-        self.processlist.append('rotate_cw')
+        self._done('rotate_cw')
     def scale_data(self,factor=1.):
         """Scale filter
 
@@ -549,7 +762,7 @@ class stlabmtx():
 
         """
         self.pmtx = factor*self.pmtx
-        self.processlist.append('scale {}'.format(factor))
+        self._done('scale {}'.format(factor))
     def sub_lbl(self,lowp=40, highp=40, low_limit=-1e99, high_limit=1e99):
         """Substract line by line filter
 
@@ -570,16 +783,16 @@ class stlabmtx():
             Absolute value above which points are ignored for the average (and percentile calculations)
 
         """
-        self.pmtx.loc[:,:] = sub_lbl(self.pmtx.values,lowp,highp,low_limit,high_limit)
-        self.processlist.append('sub_lbl {},{},{},{}'.format(lowp,highp,low_limit,high_limit))
+        self.pmtx = self._replaced(sub_lbl(self.pmtx.values,lowp,highp,low_limit,high_limit))
+        self._done('sub_lbl {},{},{},{}'.format(lowp,highp,low_limit,high_limit))
     def sub_cbc(self,lowp=40, highp=40, low_limit=-1e99, high_limit=1e99):
         """ Subtract column by column filter
     
         Same as :any:`sub_lbl` but done on a column by column basis.  Process string :code:`sub_cbc lowp,highp,low_limit,high_limit`
 
         """
-        self.pmtx.loc[:,:] = sub_lbl(self.pmtx.values.T,lowp,highp,low_limit,high_limit).T
-        self.processlist.append('sub_cbc {},{},{},{}'.format(lowp,highp,low_limit,high_limit))
+        self.pmtx = self._replaced(sub_lbl(self.pmtx.values.T,lowp,highp,low_limit,high_limit).T)
+        self._done('sub_cbc {},{},{},{}'.format(lowp,highp,low_limit,high_limit))
     def sub_linecut(self, pos, horizontal=1):
         """Subtract lincut filter
 
@@ -601,7 +814,7 @@ class stlabmtx():
         else:
             v = self.pmtx.iloc[:,pos]
             self.pmtx = self.pmtx.subtract(v,axis=0)
-        self.processlist.append('sub_linecut {},{}'.format(pos,horizontal))
+        self._done('sub_linecut {},{}'.format(pos,horizontal))
     def vi_to_iv(self,vmin,vmax,nbins):
         """vi to iv filter
 
@@ -624,11 +837,11 @@ class stlabmtx():
             Number of points in the new axis
 
         """
-        vinterpol = np.linspace(vmin,vmax,nbins)
-        pmtx = [interp1d(x=self.pmtx[column],y=self.pmtx.axes[0],bounds_error=False,fill_value=np.nan)(vinterpol) for column in self.pmtx]
-        self.pmtx = pd.DataFrame(np.array(pmtx).T, index=vinterpol, columns=self.pmtx.axes[1])
+        vinterpol = np.linspace(vmin,vmax,int(nbins))
+        pmtx = interp_columns(self.pmtx.values,np.asarray(self.pmtx.axes[0],dtype=float),vinterpol)
+        self.pmtx = pd.DataFrame(pmtx, index=vinterpol, columns=self.pmtx.axes[1])
         self.pmtx.index.name, self.ztitle, self.xtitle = self.ztitle, self.pmtx.index.name, self.ztitle
-        self.processlist.append('vi_to_iv {},{},{}'.format(vmin,vmax,nbins))
+        self._done('vi_to_iv {},{},{}'.format(vmin,vmax,nbins))
     def xderiv(self,direction=1):
         """X derivative filter
 
@@ -641,7 +854,7 @@ class stlabmtx():
         
         """
         self.pmtx = xderiv_pd(self.pmtx,direction)
-        self.processlist.append('xderiv {}'.format(direction))
+        self._done('xderiv {}'.format(direction))
     def yderiv(self,direction=1):
         """Y derivative filter
 
@@ -654,7 +867,7 @@ class stlabmtx():
         
         """
         self.pmtx = yderiv_pd(self.pmtx,direction)
-        self.processlist.append('yderiv {}'.format(direction))
+        self._done('yderiv {}'.format(direction))
     def transpose(self):
         """Transpose filter
 
@@ -662,7 +875,7 @@ class stlabmtx():
         """
         self.ytitle, self.xtitle = self.xtitle, self.ytitle
         self.pmtx = self.pmtx.transpose()
-        self.processlist.append('transpose')
+        self._done('transpose')
 
     # Processlist
     def saveprocesslist(self,filename = './process.pl'):
@@ -683,7 +896,9 @@ class stlabmtx():
     def applystep(self,line):
         """Apply step from a process list string
 
-        Takes in input string descibing one filter application and applies it to the data
+        Takes in input string descibing one filter application and applies it to the data.
+        If the resulting matrix is in the step cache (same steps applied before in the same
+        order), it is taken from there instead of being recomputed.
 
         Parameters
         ----------
@@ -691,21 +906,16 @@ class stlabmtx():
             String describing the desired filter to be applied
 
         """
-        sline = line.split(' ')
-        if len(sline) == 1:
-            func = sline[0]
-            pars = []
-        else:
-            pars = sline[1].split(',')
-            func = sline[0].strip()
-        if func is '':
+        step = _parsestep(line)
+        if step is None:
+            return
+        func, pars = step
+        if self._key is not None and self._key + (step,) in self.cache:
+            self._restore(self._key + (step,))
             return
-        else:
-            pars = [float(x) for x in pars]
         method = getattr(self, func)
-        print(func,pars)
+        print(func,list(pars))
         method(*pars)
-        self.processlist.append(line.strip())
     def applyprocesslist(self,pl):
         """Apply all steps in array of process strings
 
@@ -713,8 +923,8 @@ class stlabmtx():
 
         Parameters
         ----------
-        line : str
-            String describing the desired filter to be applied
+        pl : list of str
+            Strings describing the desired filters to be applied
 
         """
         for line in pl:
@@ -738,30 +948,36 @@ class stlabmtx():
     def reset(self):
         """Reset filters
 
-        Resets all filters and returns matrix to its initial state
+        Resets all filters and returns matrix to its initial state.  The step cache is kept, so
+        reapplying the same filters is fast
 
         """
         self.processlist = []
+        self._key = ()
         self.xtitle = self.xtitle0
         self.ytitle = self.ytitle0
+        self.ztitle = self.ztitle0
         self.pmtx = self.mtx
     def delstep(self,ii):
         """Removes a filter from the current process list by index
 
+        Only the steps after the removed one are recomputed (earlier ones come from the step cache).
+
         Parameters
         ----------
         ii : int
             Index of filter to be removed from applied filters
 
         """
-        newpl = copy.deepcopy(self.processlist)
+        newpl = list(self.processlist)
         del newpl[ii]
         self.reset()
         self.applyprocesslist(newpl)
     def insertstep(self,ii,line):
         """Inserts new filter into process list
 
-        Adds a new filter at a specific position in the process list
+        Adds a new filter at a specific position in the process list.  Only the new step and the
+        ones after it are recomputed.
 
         Parameters
         ----------
@@ -771,11 +987,58 @@ class stlabmtx():
             Process string for the new filter
 
         """
-        newpl = copy.deepcopy(self.processlist)
+        newpl = list(self.processlist)
         newpl.insert(ii,line)
         self.reset()
         self.applyprocesslist(newpl)
 
+    # Step cache
+    def _done(self,line):
+        #Record an applied filter and store the result in the step cache
+        self.processlist.append(line)
+        self._key = _nextkey(self._key,line)
+        if self._key is None: #Not cached
+            return
+        if self._key in self.cache:
+            self.cachesize -= self.cache.pop(self._key)[0].memory_usage(index=True).sum()
+        self.cache[self._key] = (self.pmtx, self.xtitle, self.ytitle, self.ztitle, list(self.processlist))
+        self.cachesize += self.pmtx.memory_usage(index=True).sum()
+        self._evict()
+    def _restore(self,key):
+        self.cache.move_to_end(key)
+        self.pmtx, self.xtitle, self.ytitle, self.ztitle, pl = self.cache[key]
+        self.processlist = list(pl)
+        self._key = key
+    def _evict(self):
+        #Drop least recently used results until the cache fits in the budget.  The last result is always kept
+        while self.cachesize > self.cache_budget and len(self.cache) > 1:
+            _, item = self.cache.popitem(last=False)
+            self.cachesize -= item[0].memory_usage(index=True).sum()
+    def _replaced(self,values):
+        #New frame with the same axes as pmtx.  Filters never modify pmtx in place since it can be shared with the cache (or be mtx)
+        return pd.DataFrame(values, index=self.pmtx.index, columns=self.pmtx.columns)
+    def clearcache(self):
+        """Empty the step cache
+
+        Frees the memory used by intermediate results.  Needed if mtx is modified by hand.
+
+        """
+        self.cache = OrderedDict()
+        self.cachesize = 0
+    def __getstate__(self):
+        #The step cache is not pickled
+        state = self.__dict__.copy()
+        state['cache'] = OrderedDict()
+        state['cachesize'] = 0
+        return state
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if 'cache' not in state: #Objects pickled before the step cache existed
+            self._key = ()
+            for line in self.processlist:
+                self._key = _nextkey(self._key,line)
+            self.clearcache()
+
     #Uses pickle to save to file
     def save(self,name = 'output'):
         """Save matrix to file
@@ -796,7 +1059,7 @@ class stlabmtx():
     #with open(filename, 'rb') as input:
     #   mtx1 = pickle.load(input)
 
-    def savemtx(self,filename = './output'):
+    def savemtx(self,filename = './output',dtype=np.float64):
         """Save to Spyview mtx format
 
         Saves current processed matrix to a spyview mtx file
@@ -805,25 +1068,15 @@ class stlabmtx():
         ----------
         filename : str
             Name of the new mtx file.  ".mtx" will be appended.
+        dtype : numpy.float64 or numpy.float32, optional
+            Data type in the file.  float32 halves the file size
 
         """
         filename = filename + '.mtx'
         with open(filename, 'wb') as outfile:
-            ztitle = self.ztitle
-            xx = np.array(self.pmtx.columns)
-            yy = np.array(self.pmtx.index)
-            line = ['Units',ztitle, self.xtitle,'{:e}'.format(xx[0]),'{:e}'.format(xx[-1]), self.ytitle,'{:e}'.format(yy[0]),'{:e}'.format(yy[-1]), 'Nothing',str(0),str(1)]
-            mystr = ', '.join(line)
-            mystr = bytes(mystr + '\n', 'ASCII')
-            outfile.write(mystr)
-            mystr = str(self.pmtx.shape[1]) + ' ' + str(self.pmtx.shape[0]) + ' ' + '1 8\n'
-            mystr = bytes(mystr, 'ASCII')
-            outfile.write(mystr)
-            data = self.pmtx.values
-            data = np.squeeze(np.asarray(np.ndarray.flatten(data,order='F')))
-            print(len(data))
-            s = struct.pack('d'*len(data), *data)
-            outfile.write(s)
+            _writemtxheader(outfile,self.pmtx.columns,self.pmtx.index,self.xtitle,self.ytitle,self.ztitle,dtype)
+            #Spyview files are in column order, which is the line order of the transpose
+            np.asarray(self.pmtx.values.T,dtype=np.dtype(dtype).newbyteorder('<')).tofile(outfile)
 
 #           Units, Data Value ,Y, 0.000000e+00, 2.001000e+03,Z, 0.000000e+00, 6.010000e+02,Nothing, 0, 1
 #           2001 601 1 8
@@ -834,60 +1087,384 @@ class stlabmtx():
             #dB, S21dB, Frequency (Hz), 6.000000e+09, 8.300000e+09, Vgate (V), 3.000000e+01, -3.000000e+01, Nothing, 0, 1
             #2001 601 1 8
 
-    def loadmtx(self,filename):
+    def loadmtx(self,filename,lazy=False):
         """Load matrix from an existing Spyview mtx file
 
         Parameters
         ----------
         filename : string
             Name of the mtx file to open
+        lazy : bool, optional
+            If True, the file is memory mapped (read only) instead of read, so only the parts of the
+            matrix that are used are loaded from disk.  The file must not be modified while in use.
+            The matrix then keeps the dtype of the file (float32 for single precision files)
+            instead of being converted to float64
 
         """
-        with open(filename,'rb') as infile:
-            content = infile.readline()
-            content = content.decode('ASCII')
-            if content[:5] == 'Units':
-                content = content.split(',')
-                content = [x.strip() for x in content]
-                self.ztitle0 = content[1]
-                self.xtitle0 = content[2]
-                self.ytitle0 = content[5]
-                xlow = np.float64(content[3])
-                xhigh = np.float64(content[4])
-                ylow = np.float64(content[6])
-                yhigh = np.float64(content[7])
-                content = infile.readline()
-                content = content.decode('ASCII')
-                content = content.split(' ')
-                nx = int(content[0])
-                ny = int(content[1])
-                lb = int(content[3])
-                rangex0 = np.linspace(xlow,xhigh,nx)
-                rangey0 = np.linspace(ylow,yhigh,ny)
-            else:
-                content = content.decode('ASCII')
-                content = content.split(' ')
-                nx = int(content[0])
-                ny = int(content[1])
-                lb = int(content[3])
-                rangex0 = np.linspace(1,nx,nx)
-                rangey0 = np.linspace(1,ny,ny)
-            n = nx*ny
-            content = infile.read()
-            if lb == 8:
-                s = struct.unpack('d'*n, content)
-            elif lb == 4:
-                s = struct.unpack('f'*n, content)
-            s = np.asarray(s)
-            s = np.matrix(np.reshape(s,(ny,nx),order='F'))
-            self.mtx = pd.DataFrame(s)
-            self.mtx.columns = rangex0
-            self.mtx.index = rangey0
-            self.reset()
+        data, header = _openmtx(filename,lazy)
+        if not lazy:
+            data = data.astype(np.float64,copy=False)
+        for key in ('xtitle','ytitle','ztitle'):
+            if header[key] is not None:
+                setattr(self,key+'0',header[key])
+        self.mtx = pd.DataFrame(data,index=header['rangey'],columns=header['rangex'],copy=False)
+        self.clearcache()
+        self.reset()
 
 stlabmtx_pd = stlabmtx
 
 
+#Filters that act on each line independently and can be applied tile by tile
+_rowfilters = ('absolute','log10','neg','offset','scale_data','sub_lbl','xderiv')
+
+class stlabmtx_mmap():
+    """Out of core stlabmtx for maps larger than memory
+
+    Keeps the original matrix on disk (memory mapped) and records the applied filters without
+    computing them.  Only filters acting on each line independently are supported (:code:`abs`,
+    :code:`log10`, :code:`neg`, :code:`offset`, :code:`scale`, :code:`sub_lbl` and :code:`xderiv`,
+    same methods and process strings as :any:`stlabmtx`).  The processed matrix is computed by
+    streaming tiles of lines through the filters, either in full (:any:`getmtx`, optionally into a
+    new memory mapped file) or at display resolution (:any:`decimate`).  For other filters, convert
+    the (possibly decimated) result with :any:`tostlabmtx`.
+
+    Example::
+
+        mtx = stlabmtx_mmap('bigmap.npy', rangex=freqs, rangey=powers)
+        mtx.sub_lbl()
+        mtx.xderiv()
+        plt.imshow(mtx.decimate(1000,2000), aspect='auto')
+
+    Attributes
+    ----------
+    data : array_like
+        Original matrix (lines along the y axis).  Anything supporting slicing of lines (np.memmap, h5py dataset, ...)
+    rangex0, rangey0 : numpy.ndarray
+        Original x and y axes
+    rangex : numpy.ndarray
+        x axis after the applied filters
+    processlist : list of str
+        List strings specifying the applied filters (in order)
+    xtitle, ytitle, ztitle : str
+        Titles for the x,y and z (data) axes
+    tilesize : int
+        Approximate size in bytes of the tiles of lines processed at once
+
+    """
+    def __init__(self, data, rangex=None, rangey=None, xtitle=None, ytitle=None, ztitle=None, tilesize=1<<26):
+        """Initialization
+
+        Parameters
+        ----------
+        data : str, pandas.DataFrame or 2D array_like
+            Original matrix.  A string is the name of a .npy or spyview .mtx file, which is memory
+            mapped (read only).  For a DataFrame or .mtx file, the axes are taken from it
+        rangex, rangey : array_like or None, optional
+            x (columns) and y (lines) axes.  Line and column numbers if None
+        xtitle, ytitle, ztitle : str or None, optional
+            Titles for x,y and z axes.  From the file for .mtx files, 'xtitle', 'ytitle' and 'ztitle' otherwise
+        tilesize : int, optional
+            Approximate size in bytes of the tiles of lines processed at once
+
+        """
+        if isinstance(data, str) and data.endswith('.mtx'):
+            data, header = _openmtx(data, lazy=True)
+            rangex = header['rangex'] if rangex is None else rangex
+            rangey = header['rangey'] if rangey is None else rangey
+            xtitle = header['xtitle'] if xtitle is None else xtitle
+            ytitle = header['ytitle'] if ytitle is None else ytitle
+            ztitle = header['ztitle'] if ztitle is None else ztitle
+        elif isinstance(data, str):
+            data = np.load(data, mmap_mode='r')
+        elif isinstance(data, pd.DataFrame):
+            if rangex is None:
+                rangex = data.columns
+            if rangey is None:
+                rangey = data.index
+            data = data.values
+        if len(data.shape) != 2:
+            raise ValueError('stlabmtx_mmap: Data must be 2 dimensional')
+        self.data = data
+        ny, nx = data.shape
+        self.rangex0 = np.arange(nx,dtype=float) if rangex is None else np.asarray(rangex,dtype=float)
+        self.rangey0 = np.arange(ny,dtype=float) if rangey is None else np.asarray(rangey,dtype=float)
+        if len(self.rangex0) != nx or len(self.rangey0) != ny:
+            raise ValueError('stlabmtx_mmap: Axes do not match data shape {}'.format(data.shape))
+        self.xtitle = 'xtitle' if xtitle is None else str(xtitle)
+        self.ytitle = 'ytitle' if ytitle is None else str(ytitle)
+        self.ztitle = 'ztitle' if ztitle is None else str(ztitle)
+        self.tilesize = tilesize
+        self.reset()
+    @property
+    def shape(self):
+        """Shape of the processed matrix
+
+        """
+        return (len(self.rangey0), len(self.rangex))
+    def getextents(self):
+        """Get the extents of the processed matrix (xmin, xmax, ymin, ymax).  See :any:`stlabmtx.getextents`
+
+        """
+        return (self.rangex[0],self.rangex[-1],self.rangey0[-1],self.rangey0[0])
+
+    # Line filters (computed when the matrix is requested)
+    def absolute(self):
+        """Absolute value filter.  Process string :code:`abs`
+
+        """
+        self._add('abs')
+    def log10(self):
+        """Log10 filter.  Process string :code:`log10`
+
+        """
+        self._add('log10')
+    def neg(self):
+        """Negative filter.  Process string :code:`neg`
+
+        """
+        self._add('neg')
+    def offset(self,x=0):
+        """Offset filter.  Process string :code:`offset x`
+
+        """
+        self._add('offset {}'.format(x))
+    def scale_data(self,factor=1.):
+        """Scale filter.  Process string :code:`scale x`
+
+        """
+        self._add('scale {}'.format(factor))
+    def sub_lbl(self,lowp=40, highp=40, low_limit=-1e99, high_limit=1e99):
+        """Line by line background subtraction (see :any:`sub_lbl`).  Process string :code:`sub_lbl lowp,highp,low_limit,high_limit`
+
+        """
+        self._add('sub_lbl {},{},{},{}'.format(lowp,highp,low_limit,high_limit))
+    def xderiv(self,direction=1):
+        """X derivative filter.  Process string :code:`xderiv direction`
+
+        Unlike :any:`stlabmtx.xderiv`, columns containing NaN are kept
+
+        """
+        self._add('xderiv {}'.format(direction))
+
+    # Processlist
+    def _add(self,line):
+        func, pars = _parsestep(line)
+        if func not in _rowfilters:
+            raise ValueError('stlabmtx_mmap: {} is not a line filter.  Apply it on the result of tostlabmtx()'.format(func))
+        self.steps.append((func,pars,self.rangex))
+        if func == 'xderiv':
+            self.rangex = self.rangex[1:] if pars[0] > 0 else self.rangex[:-1]
+        self.processlist.append(line.strip())
+    def applystep(self,line):
+        """Apply step from a process list string
+
+        Parameters
+        ----------
+        line : str
+            String describing the desired filter to be applied
+
+        """
+        if _parsestep(line) is not None:
+            self._add(line)
+    def applyprocesslist(self,pl):
+        """Apply all steps in array of process strings
+
+        Parameters
+        ----------
+        pl : list of str
+            Strings describing the desired filters to be applied
+
+        """
+        for line in pl:
+            self.applystep(line)
+    def applyprocessfile(self,filename):
+        """Apply all steps in a process list file
+
+        Parameters
+        ----------
+        filename : str
+            Process file name
+
+        """
+        with open(filename,'r') as myfile:
+            for line in myfile:
+                if '#' == line[0]:
+                    continue
+                self.applystep(line)
+    def saveprocesslist(self,filename = './process.pl'):
+        """Save applied filter list to a text file
+
+        """
+        with open(filename,'w') as myfile:
+            for line in self.processlist:
+                myfile.write(line + '\n')
+    def reset(self):
+        """Reset filters
+
+        """
+        self.processlist = []
+        self.steps = []
+        self.rangex = self.rangex0
+    def delstep(self,ii):
+        """Removes a filter from the current process list by index
+
+        """
+        newpl = list(self.processlist)
+        del newpl[ii]
+        self.reset()
+        self.applyprocesslist(newpl)
+    def insertstep(self,ii,line):
+        """Inserts new filter into process list at the given index
+
+        """
+        newpl = list(self.processlist)
+        newpl.insert(ii,line)
+        self.reset()
+        self.applyprocesslist(newpl)
+
+    # Processing
+    def _process(self,block):
+        #Apply the filters to a block of lines
+        block = np.array(block,dtype=float)
+        for func, pars, rangex in self.steps:
+            if func == 'absolute':
+                np.abs(block,out=block)
+            elif func == 'log10':
+                with np.errstate(divide='ignore',invalid='ignore'):
+                    np.log10(block,out=block)
+            elif func == 'neg':
+                np.negative(block,out=block)
+            elif func == 'offset':
+                block += pars[0]
+            elif func == 'scale_data':
+                block *= pars[0]
+            elif func == 'sub_lbl':
+                block = np.asarray(sub_lbl(block,*pars)).reshape(block.shape)
+            elif func == 'xderiv':
+                block = np.diff(block,axis=1)/np.diff(rangex)
+        return block
+    def _tilerows(self):
+        return max(1,self.tilesize//(8*max(1,self.data.shape[1])))
+    def tiles(self,rowstep=1):
+        """Iterate over the processed matrix by tiles of lines
+
+        Parameters
+        ----------
+        rowstep : int, optional
+            Only process every rowstep-th line
+
+        Yields
+        ------
+        rows : slice
+            Lines of the tile in the processed (and decimated) matrix
+        block : numpy.ndarray
+            Processed lines
+
+        """
+        ny = self.data.shape[0]
+        step = self._tilerows()*rowstep
+        for i in range(0,ny,step):
+            block = self._process(self.data[i:min(i+step,ny):rowstep])
+            start = i//rowstep
+            yield slice(start,start+len(block)), block
+    def getmtx(self,out=None,rowstep=1,colstep=1):
+        """Compute the processed matrix
+
+        Parameters
+        ----------
+        out : str or None, optional
+            If given, the matrix is written to this .npy file (memory mapped) instead of memory,
+            for results that do not fit in memory either
+        rowstep, colstep : int, optional
+            Only keep every rowstep-th line and colstep-th column
+
+        Returns
+        -------
+        pandas.DataFrame
+            Processed matrix with its axes
+
+        """
+        rangey = self.rangey0[::rowstep]
+        rangex = self.rangex[::colstep]
+        shape = (len(rangey),len(rangex))
+        if out is None:
+            mtx = np.empty(shape)
+        else:
+            mtx = np.lib.format.open_memmap(out,mode='w+',dtype=float,shape=shape)
+        for rows, block in self.tiles(rowstep):
+            mtx[rows] = block[:,::colstep]
+        if out is not None:
+            mtx.flush()
+        frame = pd.DataFrame(mtx,index=rangey,columns=rangex,copy=False)
+        frame.index.name = self.ytitle
+        frame.columns.name = self.xtitle
+        return frame
+    def savemtx(self,filename = './output',dtype=np.float64):
+        """Save the processed matrix to a spyview mtx file
+
+        The matrix is written tile by tile, so it does not need to fit in memory
+
+        Parameters
+        ----------
+        filename : str
+            Name of the new mtx file.  ".mtx" will be appended.
+        dtype : numpy.float64 or numpy.float32, optional
+            Data type in the file.  float32 halves the file size
+
+        """
+        filename = filename + '.mtx'
+        dtype = np.dtype(dtype).newbyteorder('<')
+        shape = self.shape
+        with open(filename, 'wb') as outfile:
+            _writemtxheader(outfile,self.rangex,self.rangey0,self.xtitle,self.ytitle,self.ztitle,dtype)
+            offset = outfile.tell()
+            outfile.truncate(offset + shape[0]*shape[1]*dtype.itemsize)
+        mtx = np.memmap(filename,dtype=dtype,mode='r+',offset=offset,shape=shape,order='F')
+        for rows, block in self.tiles():
+            mtx[rows] = block
+        mtx.flush()
+        del mtx
+    def decimate(self,maxrows=1000,maxcols=2000):
+        """Processed matrix at display resolution
+
+        Takes every n-th line and column so the result has at most maxrows lines and maxcols
+        columns.  Only the needed lines are read and processed.
+
+        Parameters
+        ----------
+        maxrows, maxcols : int, optional
+            Maximum size of the result
+
+        Returns
+        -------
+        pandas.DataFrame
+            Decimated processed matrix
+
+        """
+        ny, nx = self.shape
+        return self.getmtx(rowstep=-(-ny//maxrows),colstep=-(-nx//maxcols))
+    def tostlabmtx(self,maxrows=None,maxcols=None):
+        """Processed matrix as an (in memory) stlabmtx to apply further filters
+
+        Parameters
+        ----------
+        maxrows, maxcols : int or None, optional
+            If given, the matrix is decimated to this size (see :any:`decimate`)
+
+        Returns
+        -------
+        stlabmtx
+            New stlabmtx with the processed matrix as original matrix
+
+        """
+        if maxrows is None and maxcols is None:
+            mtx = self.getmtx()
+        else:
+            ny, nx = self.shape
+            mtx = self.decimate(maxrows or ny,maxcols or nx)
+        return stlabmtx(mtx,self.xtitle,self.ytitle,self.ztitle,copy=False)
+
+
 def yderiv_pd(data,direction=1):
     dy = np.diff(data.index)
     data = data.diff(axis=0,periods=direction)
@@ -1320,3 +1897,62 @@ class stlabmtx():
             self.mtx = s
             self.reset()
 '''
+
+
+if __name__ == "__main__":
+    #Benchmark of sub_lbl against the line by line loop it replaces
+    import time
+
+    def sub_lbl_loop(data, lowp=40, highp=40, low_limit=-1e99, high_limit=1e99):
+        new_mtx = []
+        for y in data:
+            crop = np.logical_and(low_limit<=y,y<=high_limit)
+            if len(y[crop]) == 0:
+                mean = 0
+            else:
+                low_thres = np.percentile(y[crop],lowp)
+                high_thres = np.percentile(y[crop],100-highp)
+                crop2 = np.logical_and(low_thres<=y,y<=high_thres)
+                mean = y[crop2].mean() if crop2.any() else 0
+            new_mtx.append(y-mean)
+        return np.array(new_mtx)
+
+    data = np.random.randn(2000,20000).cumsum(axis=1)
+    #Line by line (sub_lbl) and column by column (sub_cbc, done on the transpose)
+    for name, mtx in [('sub_lbl',data), ('sub_cbc',data.T)]:
+        for args in [(40,40), (10,30,-20.,20.)]:
+            t0 = time.time()
+            ref = sub_lbl_loop(mtx,*args)
+            t1 = time.time()
+            new = np.asarray(sub_lbl(mtx,*args))
+            t2 = time.time()
+            print('{}{}: loop {:.2f} s, vectorized {:.2f} s, max difference {:.2e}'.format(name,args,t1-t0,t2-t1,np.abs(ref-new).max()))
+
+    #Benchmark of interp_columns (used by vi_to_iv) against one interp1d per column
+    for n, ncols in [(201,20000), (1001,2000)]:
+        vv = np.cumsum(np.random.rand(n,ncols),axis=0)
+        ii = np.linspace(0,1,n)
+        vinterpol = np.linspace(0,n/2.,n)
+        t0 = time.time()
+        ref = np.array([interp1d(x=vv[:,i],y=ii,bounds_error=False,fill_value=np.nan)(vinterpol) for i in range(ncols)]).T
+        t1 = time.time()
+        new = interp_columns(vv,ii,vinterpol)
+        t2 = time.time()
+        print('vi_to_iv {}x{}: interp1d {:.2f} s, vectorized {:.2f} s, identical {}'.format(n,ncols,t1-t0,t2-t1,np.array_equal(ref,new,equal_nan=True)))
+
+    #Benchmark of savemtx/loadmtx (2000x5000 matrix, 80 MB) against struct packing
+    import os, tempfile
+    mtx = stlabmtx(pd.DataFrame(np.random.rand(2000,5000)),copy=False)
+    name = os.path.join(tempfile.mkdtemp(),'bench')
+    data = np.ravel(mtx.pmtx.values,order='F')
+    t0 = time.time()
+    packed = struct.pack('d'*len(data),*data)
+    t1 = time.time()
+    struct.unpack('d'*len(data),packed)
+    t2 = time.time()
+    mtx.savemtx(name)
+    t3 = time.time()
+    mtx.loadmtx(name+'.mtx')
+    t4 = time.time()
+    print('mtx file: struct pack {:.2f} s / unpack {:.2f} s, savemtx {:.2f} s / loadmtx {:.2f} s'.format(t1-t0,t2-t1,t3-t2,t4-t3))
+    os.remove(name+'.mtx')
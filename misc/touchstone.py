@@ -0,0 +1,253 @@
+"""Touchstone (.sNp) file reading and writing
+
+Reads and writes N-port network parameter files in the Touchstone format as exported by most
+VNAs.  The option line (:code:`# <frequency unit> <parameter> <format> R <impedance>`) is
+honoured: frequencies are converted to Hz and the data to complex values whatever the format
+(RI, MA or DB).  The numeric data is parsed in bulk, so many files can be loaded quickly.
+
+Data is returned as a complex array of shape (nfreq, N, N) where :code:`data[:, i, j]` is the
+parameter :math:`S_{i+1,j+1}`.  Keyword lines of Touchstone 2.0 files (:code:`[Number of Ports]`,
+:code:`[Two-Port Data Order]`, :code:`[Matrix Format]`, ...) are understood as far as needed to
+read the network data.  Upper and Lower matrix formats are filled to the full symmetric matrix.
+Noise parameters of 2-port files are ignored.
+
+"""
+
+import re
+import numpy as np
+import pandas as pd
+
+_funits = {'HZ': 1., 'KHZ': 1e3, 'MHZ': 1e6, 'GHZ': 1e9}
+
+
+def _options(line):
+    #Parse the option line.  Defaults are given by the standard
+    opts = {'unit': 'GHZ', 'parameter': 'S', 'format': 'MA', 'R': 50.}
+    tokens = line[1:].upper().split()
+    i = 0
+    while i < len(tokens):
+        tok = tokens[i]
+        if tok in _funits:
+            opts['unit'] = tok
+        elif tok in ('S', 'Y', 'Z', 'H', 'G'):
+            opts['parameter'] = tok
+        elif tok in ('RI', 'MA', 'DB'):
+            opts['format'] = tok
+        elif tok == 'R' and i + 1 < len(tokens):
+            opts['R'] = float(tokens[i + 1])
+            i += 1
+        i += 1
+    return opts
+
+
+def _nports_from_name(filename):
+    match = re.search(r'\.s(\d+)p$', filename, re.IGNORECASE)
+    return int(match.group(1)) if match else None
+
+
+def readtouchstone(filename, nports=None, frame=False):
+    """Read a Touchstone file
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file
+    nports : int or None, optional
+        Number of ports.  If None, taken from the :code:`[Number of Ports]` keyword or the file
+        extension (.s<N>p)
+    frame : bool, optional
+        If True, return a DataFrame instead (see Returns)
+
+    Returns
+    -------
+    freq : numpy.ndarray
+        Frequencies in Hz
+    data : numpy.ndarray of complex
+        Network parameters with shape (nfreq, N, N)
+    opts : dict
+        Options of the file: 'unit' (frequency unit in the file), 'parameter' ('S', 'Y', ...),
+        'format' ('RI', 'MA' or 'DB'), 'R' (reference impedance) and 'nports'
+
+    If frame is True, a single DataFrame is returned instead, with a 'Frequency (Hz)' column
+    followed by real and imaginary part columns for each parameter (e.g. 'S21re ()' and
+    'S21im ()').  For 2-ports the column order is the one of the file (S11, S21, S12, S22).
+
+    """
+    opts = None
+    order = None
+    matrix = 'full'
+    datalines = []
+    with open(filename, 'r') as f:
+        for line in f:
+            line = line.split('!', 1)[0].strip()
+            if not line:
+                continue
+            if line[0] == '#':
+                if opts is None:
+                    opts = _options(line)
+                continue
+            if line[0] == '[':
+                key, _, value = line[1:].partition(']')
+                key = key.strip().lower()
+                if key == 'number of ports' and nports is None:
+                    nports = int(value)
+                elif key == 'two-port data order':
+                    order = value.strip()
+                elif key == 'matrix format':
+                    matrix = value.strip().lower()
+                    if matrix not in ('full', 'upper', 'lower'):
+                        raise ValueError('Unknown matrix format {}'.format(value.strip()))
+                elif key in ('noise data', 'end'):
+                    break
+                continue
+            datalines.append(line)
+    if opts is None:
+        opts = _options('#')
+    if nports is None:
+        nports = _nports_from_name(filename)
+    if nports is None:
+        raise ValueError(
+            'Number of ports of {} unknown.  Specify nports'.format(filename))
+    if nports == 2:  #Noise data follows the network data, starting at a lower frequency
+        freqs = [float(line.split(None, 1)[0]) for line in datalines]
+        for i in range(1, len(freqs)):
+            if freqs[i] <= freqs[i - 1]:
+                datalines = datalines[:i]
+                break
+    values = np.array(' '.join(datalines).split(), dtype=float)
+    if matrix == 'full':
+        npar = nports * nports
+    else:
+        #Only one triangle of the symmetric matrix is stored, row by row
+        rows, cols = np.triu_indices(nports) if matrix == 'upper' else np.tril_indices(nports)
+        npar = len(rows)
+    values = values.reshape(-1, 1 + 2 * npar)
+    freq = values[:, 0] * _funits[opts['unit']]
+    a = values[:, 1::2]
+    b = values[:, 2::2]
+    if opts['format'] == 'RI':
+        data = a + 1j * b
+    elif opts['format'] == 'MA':
+        data = a * np.exp(1j * np.deg2rad(b))
+    else:
+        data = 10**(a / 20.) * np.exp(1j * np.deg2rad(b))
+    if matrix == 'full':
+        data = data.reshape(-1, nports, nports)
+        if nports == 2 and order != '12_21':  #2-port data is in column order (11, 21, 12, 22)
+            data = data.transpose(0, 2, 1)
+    else:
+        full = np.empty((len(data), nports, nports), dtype=complex)
+        full[:, rows, cols] = data
+        full[:, cols, rows] = data
+        data = full
+    opts['nports'] = nports
+    if frame:
+        return touchstone_to_frame(freq, data, opts['parameter'])
+    return freq, data, opts
+
+
+def touchstone_to_frame(freq, data, parameter='S'):
+    """Convert network parameters to a DataFrame with real and imaginary part columns
+
+    Parameters
+    ----------
+    freq : array of float
+        Frequencies in Hz
+    data : array of complex
+        Network parameters with shape (nfreq, N, N)
+    parameter : str, optional
+        Parameter letter used in the column titles
+
+    Returns
+    -------
+    pandas.DataFrame
+        See :any:`readtouchstone`
+
+    """
+    nports = data.shape[1]
+    pairs = _pair_order(nports)
+    columns = {'Frequency (Hz)': np.asarray(freq)}
+    for i, j in pairs:
+        name = '{}{}{}'.format(parameter, i + 1, j + 1)
+        columns[name + 're ()'] = data[:, i, j].real
+        columns[name + 'im ()'] = data[:, i, j].imag
+    return pd.DataFrame(columns)
+
+
+def _pair_order(nports):
+    #Order of the parameters in the file.  Column order for 2-ports, row order otherwise
+    if nports == 2:
+        return [(0, 0), (1, 0), (0, 1), (1, 1)]
+    return [(i, j) for i in range(nports) for j in range(nports)]
+
+
+def writetouchstone(filename,
+                    freq,
+                    data,
+                    fmt='RI',
+                    unit='HZ',
+                    parameter='S',
+                    R=50.,
+                    comments=None,
+                    f='%.10e'):
+    """Write network parameters to a Touchstone (version 1) file
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file.  Should have the .s<N>p extension
+    freq : array of float
+        Frequencies in Hz
+    data : array of complex
+        Network parameters with shape (nfreq, N, N)
+    fmt : str, optional
+        Data format: 'RI', 'MA' or 'DB'
+    unit : str, optional
+        Frequency unit used in the file: 'HZ', 'KHZ', 'MHZ' or 'GHZ'
+    parameter : str, optional
+        Parameter type ('S', 'Y', 'Z', ...)
+    R : float, optional
+        Reference impedance
+    comments : list of str or None, optional
+        Comment lines added at the beginning of the file
+    f : str, optional
+        Format specifier for the numbers (old style)
+
+    """
+    freq = np.asarray(freq, dtype=float)
+    data = np.asarray(data)
+    nports = data.shape[1]
+    fmt = fmt.upper()
+    unit = unit.upper()
+    pairs = _pair_order(nports)
+    vals = np.stack([data[:, i, j] for i, j in pairs], axis=1)
+    if fmt == 'RI':
+        a, b = vals.real, vals.imag
+    elif fmt == 'MA':
+        a, b = np.abs(vals), np.rad2deg(np.angle(vals))
+    elif fmt == 'DB':
+        a, b = 20 * np.log10(np.abs(vals)), np.rad2deg(np.angle(vals))
+    else:
+        raise ValueError('Unknown format {}'.format(fmt))
+    table = np.empty((len(freq), 1 + 2 * len(pairs)))
+    table[:, 0] = freq / _funits[unit]
+    table[:, 1::2] = a
+    table[:, 2::2] = b
+    #Format of one frequency point.  For more than 2 ports, each matrix row starts on a new line
+    #and lines hold at most 4 pairs (as required by version 1 of the standard)
+    if nports <= 2:
+        pointfmt = ' '.join([f] * table.shape[1]) + '\n'
+    else:
+        rows = []
+        for i in range(nports):
+            chunks = [
+                ' '.join([f] * 2 * min(4, nports - k))
+                for k in range(0, nports, 4)
+            ]
+            rows.append('\n'.join(chunks))
+        pointfmt = f + ' ' + '\n'.join(rows) + '\n'
+    with open(filename, 'w') as ff:
+        for line in comments or []:
+            ff.write('! ' + line + '\n')
+        ff.write('# {} {} {} R {}\n'.format(unit, parameter, fmt, R))
+        ff.write((pointfmt * len(freq)) % tuple(table.ravel().tolist()))
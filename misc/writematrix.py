@@ -36,14 +36,43 @@ def writematrix(myfile, mat, f='%.10e', delim=', ', blocksep='\n'):
         separate blocks of data.
 
     """
-    for line in mat:
-        line = ['%.10e' % x for x in line]
-        line = delim.join(line)
-        myfile.write(line + '\n')
-    myfile.write(blocksep)
+    myfile.write(format_matrix(mat, f, delim) + blocksep)
 
 
-def writedict(myfile, mydict, f='%.10e', delim=', ', blocksep='\n'):
+def format_matrix(mat, f='%.10e', delim=', '):
+    """Format a matrix as text lines
+
+    Builds the text written by :any:`writematrix` (without the block separator).  The whole
+    matrix is formatted in a single operation by repeating the line format for every row
+    instead of formatting element by element.
+
+    Parameters
+    ----------
+    mat : list or np.array
+        List containing the lines of data to be written as lists (a matrix or list of lists).
+    f : str, optional
+        Format specifier for the data (old style).
+    delim : str, optional
+        Field delimiter (separation character)
+
+    Returns
+    -------
+    str
+        One line per row, each ending in a newline
+
+    """
+    try:
+        arr = np.asarray(mat)
+    except ValueError:  #Recent numpy refuses to convert lines of different lengths
+        arr = None
+    if arr is None or arr.ndim != 2:  #Lines of different lengths.  Format line by line
+        return ''.join(delim.join([f % x for x in line]) + '\n' for line in mat)
+    nrows, ncols = arr.shape
+    linefmt = delim.join([f] * ncols) + '\n'
+    return (linefmt * nrows) % tuple(arr.ravel().tolist())
+
+
+def writedict(myfile, mydict, f='%.10e', delim=', ', blocksep='\n', params=None):
     """Write a data dictionary to a file as a matrix block
 
     Writes a given dictionary where each element is a list of numbers, i.e., each element in
@@ -69,8 +98,14 @@ def writedict(myfile, mydict, f='%.10e', delim=', ', blocksep='\n'):
     blocksep : str, optional
         Characters to write at the end of the matrix.  This is generally a single newline to
         separate blocks of data.
+    params : dict or None, optional
+        Block parameters stored in the binary file if one is attached to myfile (see
+        :any:`newfile` with :code:`binary=True`)
 
     """
+    binfile = getattr(myfile, 'binfile', None)
+    if binfile is not None:
+        binfile.write_block(mydict, params)
     vv = list(mydict.keys())
     writetitle(myfile, vv, delim)
     mat = []
@@ -198,7 +233,7 @@ def writeline(myfile, line, f='.10e', delim=', '):
 #???
 
 
-def writeframe(myfile, myframe, f='%.10e', delim=', ', blocksep='\n'):
+def writeframe(myfile, myframe, f='%.10e', delim=', ', blocksep='\n', params=None):
     """Write a pandas Dataframe to a file as a matrix block
 
     Writes a given pandas.DataFrame to a file.  Is analogous to :any:`writedict`
@@ -222,8 +257,14 @@ def writeframe(myfile, myframe, f='%.10e', delim=', ', blocksep='\n'):
     blocksep : str, optional
         Characters to write at the end of the matrix.  This is generally a single newline to
         separate blocks of data.
+    params : dict or None, optional
+        Block parameters stored in the binary file if one is attached to myfile (see
+        :any:`newfile` with :code:`binary=True`)
 
     """
+    binfile = getattr(myfile, 'binfile', None)
+    if binfile is not None:
+        binfile.write_block(myframe, params)
     vv = list(myframe)
     writetitle(myfile, vv, delim)
     mat = myframe.values
@@ -281,3 +322,33 @@ def writetitle(myfile, vv, delim):
     ) == 0:  #Is the file new?  If so, write title line from provided data
         varline = '#' + delim.join(vv) + '\n'
         myfile.write(varline)
+
+
+if __name__ == "__main__":
+    #Benchmark against the original element by element writer using a block the size of a
+    #4 trace, 20k point GetAllData frame
+    import tempfile
+    import time
+
+    def writematrix_loop(myfile, mat, f='%.10e', delim=', ', blocksep='\n'):
+        for line in mat:
+            line = [f % x for x in line]
+            line = delim.join(line)
+            myfile.write(line + '\n')
+        myfile.write(blocksep)
+
+    mat = np.random.randn(20001, 17)
+    nblocks = 10
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, func in [('loop', writematrix_loop), ('writematrix', writematrix)]:
+            filename = os.path.join(tmp, name + '.dat')
+            t0 = time.time()
+            with open(filename, 'w') as myfile:
+                for i in range(nblocks):
+                    func(myfile, mat)
+            dt = time.time() - t0
+            size = os.path.getsize(filename)
+            print('{:12s}: {:.2f} s, {:.1f} MB/s'.format(name, dt, size / dt / 1e6))
+        with open(os.path.join(tmp, 'loop.dat')) as f1, open(
+                os.path.join(tmp, 'writematrix.dat')) as f2:
+            print('Identical output:', f1.read() == f2.read())
@@ -0,0 +1,39 @@
+"""Makes the repository importable as the stlab package for the tests
+
+The repository directory is the stlab package itself and its __init__ needs stlabutils.  If
+stlab can not be imported (not installed or stlabutils missing), a bare stlab package is set up
+from the repository directory without running __init__ and stlab.utils (and stlabutils if not
+installed) point to the local copy of the utilities in misc/.  Import this module before anything
+from stlab.
+
+"""
+import importlib
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup():
+    try:
+        importlib.import_module('stlab.utils')
+        return
+    except ImportError:
+        pass
+    for name in list(sys.modules):  #Drop anything left by the failed import
+        if name == 'stlab' or name.startswith('stlab.'):
+            del sys.modules[name]
+    pkg = types.ModuleType('stlab')
+    pkg.__path__ = [ROOT]
+    sys.modules['stlab'] = pkg
+    utils = importlib.import_module('stlab.misc')
+    sys.modules['stlab.utils'] = utils
+    pkg.utils = utils
+    try:
+        importlib.import_module('stlabutils')
+    except ImportError:
+        sys.modules['stlabutils'] = utils
+
+
+setup()
@@ -0,0 +1,114 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import repo_stlab  #Makes stlab importable from the repository
+
+import unittest
+import tempfile
+import numpy as np
+import pandas as pd
+
+from stlab.utils import metagen
+from stlab.utils.readdata import readdat_pd
+from stlab.utils.writematrix import writeframe
+from stlab.utils.newfile import newfile
+
+
+def readmeta(filename):
+    with open(filename) as ff:
+        return [x.strip() for x in ff]
+
+
+class MetaWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, 'data')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def sweep(self, ys):
+        xx = np.linspace(1e9, 2e9, 11)
+        meta = metagen.MetaWriter(self.base + '.dat', xtitle='Frequency (Hz)',
+                                  ytitle='Power (dB)')
+        for i, y in enumerate(ys):
+            meta.update(xx, y, colnames=['Frequency (Hz)', 'S21 (dB)'])
+            out = readmeta(self.base + '.meta.txt')
+            metagen.fromarrays(self.base + '_ref.dat', xx, ys[:i + 1], xtitle='Frequency (Hz)',
+                               ytitle='Power (dB)', colnames=['Frequency (Hz)', 'S21 (dB)'])
+            self.assertEqual(out, readmeta(self.base + '_ref.meta.txt'))
+        meta.close()
+
+    def test_inplace(self):
+        self.sweep([-40., -30., -20.5, -10.])
+
+    def test_long_values(self):
+        #Longer than the fixed width.  The file is rewritten
+        self.sweep([1, 10**30, 2, 3])
+
+    def test_auto_colnames_async(self):
+        #Titles read from a file written in the background
+        myfile = newfile('data', '', mypath=self.tmp.name, usefolder=False, git_id=False,
+                         asyncwrite=True)
+        meta = metagen.MetaWriter(myfile, xtitle='Frequency (Hz)', ytitle='Power (dB)',
+                                  colnames='auto')
+        xx = np.linspace(1e9, 2e9, 11)
+        writeframe(myfile, pd.DataFrame({'Frequency (Hz)': xx, 'S21 (dB)': np.zeros(11)}))
+        meta.update(xx, -40.)
+        meta.close()
+        myfile.close()
+        self.assertEqual(meta.colnames, ['Frequency (Hz)', 'S21 (dB)'])
+
+
+class FromDatafileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp.name, 'data.dat')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, powers, mode='w'):
+        ff = np.linspace(1e9, 2e9, 21)
+        with open(self.filename, mode) as f:
+            for pp in powers:
+                writeframe(f, pd.DataFrame({'Frequency (Hz)': ff, 'S21 (dB)': np.cos(ff * pp),
+                                            'Power (dBm)': np.full(len(ff), pp)}))
+
+    def check(self, **kwargs):
+        #Same metafile as generated from the fully parsed data
+        metagen.fromdatafile(self.filename, **kwargs)
+        data = readdat_pd(self.filename)
+        ref = os.path.join(self.tmp.name, 'ref.dat')
+        metagen.fromlimits(ref, len(data[0]), data[0]['Frequency (Hz)'].iloc[0],
+                           data[0]['Frequency (Hz)'].iloc[-1], len(data),
+                           data[-1]['Power (dBm)'].iloc[0], data[0]['Power (dBm)'].iloc[0],
+                           xtitle='Frequency (Hz)', ytitle='Power (dBm)',
+                           colnames=list(data[0]))
+        self.assertEqual(readmeta(os.path.splitext(self.filename)[0] + '.meta.txt'),
+                         readmeta(os.path.join(self.tmp.name, 'ref.meta.txt')))
+
+    def test_fromdatafile(self):
+        self.write([-30., -25., -20.])
+        self.check(xtitle='Frequency (Hz)', ytitle='Power (dBm)')
+        #Growing file (reuses the saved index)
+        self.write([-15., -10.], 'a')
+        self.check(xcol=1, ycol=3)
+        self.check(xcol=1, ytitle='Power (dBm)')
+
+    def test_async(self):
+        #Data queued in an AsyncWriter is written before the file is indexed
+        myfile = newfile('data', '', mypath=self.tmp.name, usefolder=False, git_id=False,
+                         asyncwrite=True)
+        self.filename = myfile.name
+        ff = np.linspace(1e9, 2e9, 21)
+        for pp in [-30., -25., -20.]:
+            writeframe(myfile, pd.DataFrame({'Frequency (Hz)': ff, 'S21 (dB)': np.cos(ff * pp),
+                                             'Power (dBm)': np.full(len(ff), pp)}))
+            metagen.fromdatafile(myfile, xtitle='Frequency (Hz)', ytitle='Power (dBm)')
+        myfile.close()
+        self.check(xtitle='Frequency (Hz)', ytitle='Power (dBm)')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import repo_stlab  #Makes stlab importable from the repository
+
+import unittest
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+
+from stlab.utils.newfile import newfile
+from stlab.utils.writematrix import writeframe
+from stlab.utils.readdata import readdat_pd
+from stlab.utils.binarydata import BinaryWriter, readbin_pd, readbin_params, bin_to_dat
+from stlab.utils import metagen
+
+
+class NewfileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def frames(self):
+        xx = np.linspace(0, 1, 11)
+        return [pd.DataFrame({'x (V)': xx, 'y (A)': xx**2 + i}) for i in range(5)]
+
+    def test_async_binary(self):
+        threads = set()
+        append = BinaryWriter._append
+
+        def recorder(writer, arr, params):
+            threads.add(threading.current_thread())
+            append(writer, arr, params)
+
+        BinaryWriter._append = recorder
+        try:
+            myfile = newfile('test', 'async', mypath=self.tmp.name, usefolder=False,
+                             git_id=False, asyncwrite=True, binary=True)
+            frames = self.frames()
+            for i, frame in enumerate(frames):
+                writeframe(myfile, frame, params={'i': i})
+                frame['y (A)'] = 0.  #Already queued.  Must not change the saved data
+            myfile.close()
+        finally:
+            BinaryWriter._append = append
+        self.assertEqual(threads, {myfile.thread})
+        base = os.path.splitext(myfile.name)[0]
+        for a, b, c in zip(readdat_pd(base + '.dat'), readbin_pd(base + '.npb'),
+                           self.frames()):
+            np.testing.assert_allclose(a.values, c.values, rtol=1e-10)
+            np.testing.assert_array_equal(b.values, c.values)
+        self.assertEqual(list(readbin_params(base + '.npb')['i']), list(range(5)))
+
+    def test_binary_meta(self):
+        myfile = newfile('test', 'meta', mypath=self.tmp.name, usefolder=False, git_id=False,
+                         binary=True)
+        for i, frame in enumerate(self.frames()):
+            writeframe(myfile, frame)
+            metagen.fromarrays(myfile, frame['x (V)'], range(i + 1), colnames=list(frame))
+        myfile.close()
+        base = os.path.splitext(myfile.name)[0]
+        datfile = bin_to_dat(base + '.npb', os.path.join(self.tmp.name, 'converted.dat'))
+        with open(base + '.meta.txt') as ff, \
+                open(os.path.splitext(datfile)[0] + '.meta.txt') as gg:
+            self.assertEqual(ff.read(), gg.read())
+        #Converting next to the original keeps its metafile
+        bin_to_dat(base + '.npb')
+        with open(base + '.meta.txt') as ff, \
+                open(os.path.splitext(datfile)[0] + '.meta.txt') as gg:
+            self.assertEqual(ff.read(), gg.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,209 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import repo_stlab  #Makes stlab importable from the repository
+
+import unittest
+import tempfile
+import threading
+import time
+import io
+import numpy as np
+import pandas as pd
+
+from stlab.utils import readdata
+from stlab.utils.writematrix import writeframe
+from stlab.utils.binarydata import BinaryWriter
+
+
+def make_frames(nblocks=7, npoints=13, seed=0):
+    rng = np.random.RandomState(seed)
+    return [
+        pd.DataFrame({
+            'Frequency (Hz)': np.linspace(1e9, 2e9, npoints),
+            'S21dB (dB)': rng.standard_normal(npoints),
+            'Power (dBm)': np.full(npoints, -10. + i)
+        }) for i in range(nblocks)
+    ]
+
+
+class DataFileTest(unittest.TestCase):
+    #Writes a data file as stlab.saveframe does
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp.name, 'data.dat')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, frames, mode='w'):
+        with open(self.filename, mode) as ff:
+            for frame in frames:
+                writeframe(ff, frame)
+
+    def assertFramesEqual(self, frames, expected):
+        self.assertEqual(len(frames), len(expected))
+        for a, b in zip(frames, expected):
+            self.assertEqual(list(a), list(b))
+            np.testing.assert_allclose(a.values, b.values, rtol=1e-10)
+
+
+class ReaddatTest(DataFileTest):
+    def test_roundtrip(self):
+        frames = make_frames()
+        self.write(frames)
+        self.assertFramesEqual(readdata.readdat_pd(self.filename), frames)
+        #Chunks ending anywhere in the blocks
+        for chunksize in (7, 100, 333):
+            self.assertFramesEqual(
+                readdata.readdat_pd(self.filename, chunksize=chunksize), frames)
+        self.assertFramesEqual(readdata.readdat_pd(self.filename, nlines=3), frames[:3])
+
+    def test_unterminated(self):
+        #Last block without its blank line (measurement still running)
+        frames = make_frames()
+        self.write(frames)
+        with open(self.filename, 'rb+') as ff:
+            ff.truncate(os.path.getsize(self.filename) - 1)
+        self.assertFramesEqual(readdata.readdat_pd(self.filename, chunksize=50), frames)
+
+    def test_comment_line(self):
+        #Lines starting with '#' inside the data are not skipped (the blocks would not match the
+        #row counts) but rejected, like any other line that is not numeric
+        frames = make_frames()
+        self.write(frames[:2])
+        with open(self.filename, 'a') as ff:
+            ff.write('# comment\n')
+        self.write(frames[2:], 'a')
+        for chunksize in (50, 1 << 24):
+            with self.assertRaises(ValueError):
+                readdata.readdat_pd(self.filename, chunksize=chunksize)
+        with self.assertRaises(ValueError):
+            readdata.read_blocks(self.filename, 2)
+
+
+class BlockIndexTest(DataFileTest):
+    def test_random_access(self):
+        frames = make_frames()
+        self.write(frames)
+        index = readdata.build_index(self.filename)
+        self.assertEqual(list(index['nrows']), [13] * 7)
+        self.assertEqual(index['ncomplete'], 7)
+        np.testing.assert_allclose(index['first'][:, 2], np.arange(-10., -3.))
+        np.testing.assert_allclose(index['last'][:, 1],
+                                   [f['S21dB (dB)'].iloc[-1] for f in frames], rtol=1e-10)
+        self.assertFramesEqual([readdata.read_blocks(self.filename, -1)], frames[-1:])
+        self.assertFramesEqual(readdata.read_blocks(self.filename, [4, 0]),
+                               [frames[4], frames[0]])
+        self.assertFramesEqual(readdata.read_blocks(self.filename, slice(1, None, 2)),
+                               frames[1::2])
+        self.assertFramesEqual(list(readdata.iter_blocks(self.filename, 2, 5)), frames[2:5])
+
+    def test_update(self):
+        #The saved index is extended when the file grows
+        frames = make_frames()
+        self.write(frames[:3])
+        with open(self.filename, 'rb+') as ff:  #Third block not terminated yet
+            ff.truncate(os.path.getsize(self.filename) - 1)
+        index = readdata.build_index(self.filename)
+        self.assertEqual(index['ncomplete'], 2)
+        self.assertEqual(len(index['nrows']), 3)
+        self.assertTrue(os.path.exists(self.filename + '.idx.npz'))
+        with open(self.filename, 'a') as ff:
+            ff.write('\n')
+        self.write(frames[3:], 'a')
+        index = readdata.build_index(self.filename)
+        self.assertEqual(index['ncomplete'], 7)
+        self.assertFramesEqual(readdata.read_blocks(self.filename, slice(None)), frames)
+        #A rewritten (shorter) file is indexed again from the start
+        self.write(frames[:2])
+        self.assertFramesEqual(list(readdata.iter_blocks(self.filename)), frames[:2])
+
+
+class ReaddatArrayTest(DataFileTest):
+    def check(self, arr, frames):
+        self.assertEqual(arr.shape, (len(frames), len(frames[0]), frames[0].shape[1]))
+        expected = np.array([f.values for f in frames])
+        np.testing.assert_allclose(np.asarray(arr), expected, rtol=1e-10)
+        np.testing.assert_allclose(arr['Power (dBm)'][:, 0], expected[:, 0, 2])
+        self.assertEqual(list(arr.frame(3)), list(frames[3]))
+
+    def test_text(self):
+        frames = make_frames()
+        self.write(frames)
+        arr = readdata.readdat_array(self.filename)
+        self.check(arr, frames)
+        self.assertIsInstance(arr.data, np.memmap)
+        cachename = self.filename + '.npy'
+        self.assertTrue(os.path.exists(cachename))
+        mtime = os.path.getmtime(cachename)
+        self.check(readdata.readdat_array(self.filename), frames)  #From the cache
+        self.assertEqual(os.path.getmtime(cachename), mtime)
+        self.check(readdata.readdat_array(self.filename, cache=False), frames)
+
+    def test_binary(self):
+        frames = make_frames()
+        writer = BinaryWriter(os.path.join(self.tmp.name, 'data.npb'))
+        for frame in frames:
+            writer.write_block(frame)
+        arr = readdata.readdat_array(self.filename)  #Uses the .npb file next to it
+        self.check(arr, frames)
+        self.assertFalse(os.path.exists(self.filename + '.npy'))
+
+    def test_irregular(self):
+        frames = make_frames()
+        frames[2] = frames[2][:5]
+        self.write(frames)
+        with self.assertRaises(ValueError):
+            readdata.readdat_array(self.filename)
+
+
+class FollowTest(DataFileTest):
+    def test_follow(self):
+        frames = make_frames()
+        self.write(frames[:2])
+        text = io.StringIO()
+        for frame in frames[2:]:
+            writeframe(text, frame)
+        text = text.getvalue()
+        text = text[text.index('\n') + 1:]  #Without the title line
+
+        def writer():
+            #Append the remaining blocks in pieces that end in the middle of lines
+            with open(self.filename, 'a') as ff:
+                for i in range(0, len(text), 150):
+                    time.sleep(0.01)
+                    ff.write(text[i:i + 150])
+                    ff.flush()
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            out = list(readdata.follow(self.filename, interval=0.005, timeout=0.5))
+        finally:
+            thread.join()
+        self.assertFramesEqual(out, frames)
+
+    def test_fromstart(self):
+        frames = make_frames()
+        self.write(frames[:3])
+        with open(self.filename, 'rb+') as ff:  #Third block not terminated yet
+            ff.truncate(os.path.getsize(self.filename) - 1)
+
+        def writer():
+            time.sleep(0.05)
+            with open(self.filename, 'a') as ff:
+                ff.write('\n')
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:  #Only the block completed after the start is returned
+            out = list(readdata.follow(self.filename, fromstart=False, interval=0.005,
+                                       timeout=0.2))
+        finally:
+            thread.join()
+        self.assertFramesEqual(out, frames[2:3])
+
+
+if __name__ == "__main__":
+    unittest.main()
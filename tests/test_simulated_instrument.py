@@ -0,0 +1,294 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import repo_stlab  #Makes stlab importable from the repository
+
+import unittest
+import time
+import threading
+import asyncio
+import tempfile
+import numpy as np
+from collections import OrderedDict
+
+from stlab.devices.instrument import instrument
+from stlab.devices.simulated_instrument import use_simulator, SimulatedResource, SimulatedVNA, \
+    SimulatedSA, SimulatedScope, SimulatedAWG, ReplayResource, ReplayMismatch, record, stop_recording
+from stlab.devices.autodetect_instrument import test_instrument, scan_instruments, save_cache, \
+    autodetect_instrument, DeviceNotFound
+from stlab.devices.async_instrument import AsyncInstrument
+from stlab.devices.PNAN5221A import PNAN5221A
+from stlab.devices.Keysight_N9010B import Keysight_N9010B
+from stlab.devices.Rigol_DS1054 import Rigol_DS1054
+from stlab.devices.Tektronix_AWG520 import Tektronix_AWG520
+from stlab.devices.RS_ZND import RS_ZND
+
+VNA_ADDR = 'TCPIP::192.168.1.216::INSTR'
+SA_ADDR = 'TCPIP::192.168.1.228::INSTR'
+SCOPE_ADDR = 'TCPIP::192.168.1.236::INSTR'
+AWG_ADDR = 'GPIB0::1::INSTR'
+
+
+class SimulatedInstrumentTest(unittest.TestCase):
+    def setUp(self):
+        use_simulator([SimulatedVNA(VNA_ADDR), SimulatedSA(SA_ADDR)])
+
+    def tearDown(self):
+        instrument.global_rs, instrument.rstype = None, None
+
+    def test_vna_ascii_and_binary(self):
+        pna = PNAN5221A(VNA_ADDR, verb=False)
+        pna.SetRange(5e9, 6e9)
+        pna.SetPoints(101)
+        ascii = pna.MeasureScreen()
+        pna.SetBinaryTransfer(True)
+        binary = pna.MeasureScreen()
+        self.assertEqual(list(ascii), list(binary))
+        self.assertEqual(len(binary['Frequency (Hz)']), 101)
+        np.testing.assert_allclose(binary['Frequency (Hz)'],
+                                   np.linspace(5e9, 6e9, 101))
+
+    def test_vna_binary_to_ascii(self):
+        pna = PNAN5221A(VNA_ADDR, verb=False)
+        pna.SetRange(5e9, 6e9)
+        pna.SetPoints(101)
+        pna.SetBinaryTransfer(True)
+        pna.SetBinaryTransfer(False)
+        data = pna.MeasureScreen()
+        np.testing.assert_allclose(data['Frequency (Hz)'],
+                                   np.linspace(5e9, 6e9, 101))
+
+    def test_znd_compound_query(self):
+        #Traces read by name with a single compound query
+        res = SimulatedVNA('TCPIP::192.168.1.149::INSTR', noise=0.)
+        res.traces = OrderedDict([('Trc1', 'S11'), ('Trc2', 'S21')])
+        res.add_command('CALC:PAR:CAT?', lambda args: "'Trc1,S11,Trc2,S21'")
+        res.add_command('CALC:DATA:TRAC?',
+                        lambda args: res.sdata(args.split(',')[0].strip(" '")))
+        use_simulator([res])
+        znd = RS_ZND(res.resource_name, reset=False, verb=False)
+        ref = np.array([res.sdata(x).view(complex) for x in res.traces])
+        for binary, nwrites in ((False, 1), (True, 2)):
+            znd.SetBinaryTransfer(binary)
+            record(znd)
+            yy = znd.GetAllTraceData(['Trc1', 'Trc2'])
+            log = stop_recording(znd)
+            np.testing.assert_allclose(yy, ref, rtol=1e-14)
+            self.assertEqual([x['op'] for x in log].count('write'), nwrites)
+        znd.SetBinaryTransfer(False)
+        data = znd.GetAllData_pd()
+        np.testing.assert_allclose(data['S21re ()'], ref[1].real, rtol=1e-14)
+        np.testing.assert_allclose(data['Frequency (Hz)'], res.frequency())
+
+    def test_vna_cached_screen(self):
+        pna = PNAN5221A(VNA_ADDR, verb=False)
+        pna.setcache(True)
+        pna.MeasureScreen()  #Caches the power and the trace numbers
+        log = pna.dev.log
+        counts = []
+        for _ in range(2):
+            n = len(log)
+            pna.MeasureScreen()
+            self.assertNotIn('SOUR:POW?', log[n:])
+            counts.append(len(log) - n)
+        self.assertEqual(counts[0], counts[1])
+        #Setting the start may move the stop frequency
+        pna.GetEnd()
+        pna.SetStart(5e9)
+        n = len(log)
+        pna.GetEnd()
+        self.assertEqual(log[n:], ['SENS:FREQ:STOP?'])
+
+    def test_async(self):
+        pna = PNAN5221A(VNA_ADDR, verb=False)
+        sa = Keysight_N9010B(SA_ADDR, verb=False)
+        apna, asa = AsyncInstrument(pna), AsyncInstrument(sa)
+
+        threads = set()
+        query = pna.query
+
+        def recorder(mystr):
+            threads.add(threading.current_thread())
+            return query(mystr)
+
+        pna.query = recorder
+
+        async def acquire():
+            async with apna.batch():
+                await apna.SetPoints(51)
+                await apna.SetIFBW(100.)
+                self.assertEqual(len(pna.batch_buffer), 2)
+            #Sent when the block ends, from the instrument thread
+            self.assertEqual(pna.batch_buffer, [])
+            self.assertTrue(threads)
+            self.assertNotIn(threading.current_thread(), threads)
+            #Discarded on errors
+            with self.assertRaises(KeyError):
+                async with apna.batch():
+                    await apna.SetPoints(11)
+                    raise KeyError()
+            self.assertEqual((pna.batch_buffer, pna.batch_depth), ([], 0))
+            return await asyncio.gather(apna.GetAllData(), asa.query('*IDN?'))
+
+        data, idn = asyncio.run(acquire())
+        apna.close()
+        asa.close()
+        self.assertEqual(len(data['Frequency (Hz)']), 51)
+        self.assertIn('N9010B', idn)
+        self.assertEqual(float(pna.dev.settings['BWID']), 100.)
+
+    def test_scan_cache(self):
+        module = sys.modules[scan_instruments.__module__]
+        identify = module.identify
+        queried = []
+
+        def counting_identify(addr, *args, **kwargs):
+            queried.append(addr)
+            return identify(addr, *args, **kwargs)
+
+        module.identify = counting_identify
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                cache = os.path.join(tmp, 'instruments.json')
+                #Valid entries are trusted without an id query
+                found = scan_instruments([VNA_ADDR, SA_ADDR], reset=False, verb=False,
+                                         cache=cache)
+                self.assertEqual(sorted(queried), sorted([VNA_ADDR, SA_ADDR]))
+                del queried[:]
+                found = scan_instruments([VNA_ADDR, SA_ADDR], reset=False, verb=False,
+                                         cache=cache)
+                self.assertEqual(queried, [])
+                found = scan_instruments('all', connect=False, verb=False, cache=cache)
+                self.assertEqual(found[VNA_ADDR], 'PNAN5221A')
+                self.assertEqual(queried, [])
+                #A cached driver that fails and an expired entry of a swapped instrument
+                save_cache({VNA_ADDR: {'idn': 'Keysight Technologies,N9010B,X,Y',
+                                       'driver': 'Keysight_N9010B', 'time': time.time() - 100},
+                            SA_ADDR: {'idn': SimulatedSA.default_idn,
+                                      'driver': 'no_such_driver', 'time': time.time()}},
+                           cache)
+                found = scan_instruments([VNA_ADDR, SA_ADDR], reset=False, verb=False,
+                                         cache=cache, ttl=10)
+                self.assertEqual(sorted(queried), sorted([VNA_ADDR, SA_ADDR]))
+        finally:
+            module.identify = identify
+        self.assertIsInstance(found[VNA_ADDR], PNAN5221A)
+        self.assertIsInstance(found[SA_ADDR], Keysight_N9010B)
+
+    def test_sa_screen(self):
+        sa = Keysight_N9010B(SA_ADDR, verb=False)
+        sa.SetPoints(201)
+        data = sa.MeasureScreen()
+        self.assertEqual(len(data), 201)
+
+    def test_record_replay(self):
+        pna = PNAN5221A(VNA_ADDR, verb=False)
+        pna.GetAllData()  #The driver caches the trace numbers on the first call
+        record(pna)
+        data = pna.GetAllData()
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'session.json')
+            stop_recording(pna, filename)
+            pna.dev = ReplayResource(filename)
+        replayed = pna.GetAllData()
+        for key in data:
+            np.testing.assert_array_equal(data[key], replayed[key])
+        with self.assertRaises(ReplayMismatch):
+            pna.GetAllData()
+
+
+class SimulatedDriverTest(unittest.TestCase):
+    def setUp(self):
+        use_simulator([SimulatedScope(SCOPE_ADDR), SimulatedAWG(AWG_ADDR)])
+
+    def tearDown(self):
+        instrument.global_rs, instrument.rstype = None, None
+
+    def test_autodetect(self):
+        scope = autodetect_instrument(SCOPE_ADDR, reset=False, verb=False)
+        self.assertIsInstance(scope, Rigol_DS1054)
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)  #The driver creates its file directory relative to it
+            try:
+                awg = autodetect_instrument(AWG_ADDR, reset=False, verb=False)
+            finally:
+                os.chdir(cwd)
+        self.assertIsInstance(awg, Tektronix_AWG520)
+        self.assertEqual(awg._address, AWG_ADDR)
+
+    def test_autodetect_unknown(self):
+        res = SimulatedResource('TCPIP::127.0.0.1::INSTR', idn='ACME,NOTHING,0,0')
+        use_simulator([res])
+        with self.assertRaises(DeviceNotFound):
+            autodetect_instrument(res.resource_name, reset=False, verb=False)
+
+    def test_rigol(self):
+        scope = Rigol_DS1054(SCOPE_ADDR, reset=False, verb=False)
+        scope.SetTimeScale(1e-5)
+        self.assertEqual(scope.GetTimeScale(), 1e-5)
+        xs, yy = scope.GetTrace()
+        self.assertEqual(len(xs), 1200)
+        self.assertAlmostEqual(xs[-1], 1.2e-4)
+        #Raw mode is read in chunks of 250000 points
+        scope.SetMemoryDepth(600000)
+        data = scope.ReadWaveData(1)
+        tt = np.arange(600000) / scope.GetSampleRate()
+        np.testing.assert_allclose(data, 4 * np.sin(2 * np.pi * 1e3 * tt), atol=0.05)
+
+    def test_awg(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            awg = Tektronix_AWG520(AWG_ADDR, reset=False, verb=False, name='AWG',
+                                   awg_file_dir=tmp)
+            self.assertTrue(os.path.isdir(awg.dir))
+        awg.set_amplitude(0.5, 1)
+        self.assertEqual(awg.get_amplitude(1), 0.5)
+        awg.set_trigger_mode_on()
+        self.assertEqual(awg.get_trigger_mode(), 'TRIG')
+        awg.set_trigger_level(0.2)
+        self.assertEqual(awg.get_trigger_level(), 0.2)
+
+
+class BinaryBlockTest(unittest.TestCase):
+    def setUp(self):
+        self.res = SimulatedResource('TCPIP::127.0.0.1::INSTR', chunk_size=24)
+        use_simulator([self.res])
+        self.inst = test_instrument(self.res.resource_name, reset=False, verb=False)
+
+    def tearDown(self):
+        instrument.global_rs, instrument.rstype = None, None
+
+    def test_block_without_terminator(self):
+        #Message ended with END (EOI) only
+        self.res.reply_termination = ''
+        self.res.add_command('DATA?', lambda args: np.arange(10.))
+        self.inst.dev.read_termination = None
+        self.inst.write('FORM:DATA REAL,64')
+        #An extra read would raise a timeout since nothing follows the block
+        data = self.inst.query_binary_block('DATA?')
+        np.testing.assert_array_equal(data, np.arange(10.))
+
+    def test_termchar_in_payload(self):
+        #Reads stop at each \n in the data.  If the payload ends with one, the terminator
+        #after it must still be read
+        for payload in [b'\n\n\n\n', b'ab\ncd\n\n', b'abc\nabc\n', b'\nbcdefgh']:
+            self.res.add_command('DATA?', lambda args: self.res.block(payload))
+            data = self.inst.query_binary_block('DATA?', 'u1')
+            self.assertEqual(data.tobytes(), payload)
+            self.assertEqual(self.inst.query('*IDN?'), self.res.idn)
+            self.assertFalse(self.res.outbuf)
+
+    def test_indefinite_block(self):
+        self.res.add_command('DATA?', lambda args: b'#0' + np.arange(4.).astype('>f8').tobytes())
+        data = self.inst.query_binary_block('DATA?')
+        np.testing.assert_array_equal(data, np.arange(4.))
+        #Data containing the termination character is read up to END
+        payload = np.array([10., 0.], '>f8').tobytes() + b'\n' * 8
+        self.res.add_command('DATA?', lambda args: b'#0' + payload)
+        data = self.inst.query_binary_block('DATA?', 'u1')
+        self.assertEqual(data.tobytes(), payload)
+        self.assertEqual(self.inst.query('*IDN?'), self.res.idn)
+
+
+if __name__ == "__main__":
+    unittest.main()
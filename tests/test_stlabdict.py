@@ -0,0 +1,39 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import repo_stlab  #Makes stlab importable from the repository
+
+import unittest
+import numpy as np
+from scipy.interpolate import interp1d
+
+from stlab.utils.stlabdict import interp_columns
+
+
+class InterpColumnsTest(unittest.TestCase):
+    def check(self, x, y, xnew):
+        #Compare to interp1d applied to each column (bit for bit)
+        out = interp_columns(x, y, xnew)
+        for i in range(x.shape[1]):
+            ref = interp1d(x[:, i], y, bounds_error=False, fill_value=np.nan)(xnew)
+            np.testing.assert_array_equal(out[:, i], ref)
+
+    def test_repeated_values(self):
+        np.testing.assert_array_equal(
+            interp_columns([[0], [1], [1], [2]], [0, 5, 7, 10], [1.]), [[7.]])
+        rng = np.random.RandomState(0)
+        xnew = np.sort(np.concatenate([np.arange(-1., 7.), rng.uniform(-1, 7, 20)]))
+        for _ in range(20):
+            #Integer samples so that many of them repeat and fall on xnew
+            x = np.sort(rng.randint(0, 6, size=(10, 4)).astype(float), axis=0)
+            self.check(x, rng.standard_normal(10), xnew)
+
+    def test_unsorted(self):
+        rng = np.random.RandomState(1)
+        x = rng.randint(0, 6, size=(10, 4)).astype(float)
+        x[0], x[-1] = 0., 5.  #So interp1d sees a range for every column
+        self.check(x, rng.standard_normal(10), np.linspace(-1, 6, 50))
+
+
+if __name__ == "__main__":
+    unittest.main()
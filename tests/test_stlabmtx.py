@@ -0,0 +1,311 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import repo_stlab  #Makes stlab importable from the repository
+
+import unittest
+import tempfile
+import numpy as np
+import pandas as pd
+
+from stlab.utils.stlabdict import stlabmtx, stlabmtx_mmap
+
+
+def make_mtx(ny=20, nx=30, seed=0):
+    rng = np.random.RandomState(seed)
+    return pd.DataFrame(rng.standard_normal((ny, nx)) + 2.,
+                        index=np.linspace(-1, 1, ny), columns=np.linspace(1e9, 2e9, nx))
+
+
+class StepCacheTest(unittest.TestCase):
+    processlist = ['abs', 'lowpass 1,1', 'scale 2.0', 'xderiv 1', 'offset 3.0']
+
+    def setUp(self):
+        self.data = make_mtx()
+        self.mtx = stlabmtx(self.data, 'Frequency (Hz)', 'Vgate (V)', 'S21 (dB)')
+        self.calls = []
+        #Record the filters actually computed (not taken from the cache)
+        for name in ('absolute', 'lowpass', 'scale_data', 'xderiv', 'offset', 'neg'):
+            method = getattr(self.mtx, name)
+            setattr(self.mtx, name, self.recorder(name, method))
+
+    def recorder(self, name, method):
+        def wrapped(*args):
+            self.calls.append(name)
+            return method(*args)
+        return wrapped
+
+    def fresh(self, pl):
+        #Same process list on a new object (no cache)
+        mtx = stlabmtx(self.data, 'Frequency (Hz)', 'Vgate (V)', 'S21 (dB)')
+        mtx.applyprocesslist(pl)
+        return mtx
+
+    def assertResult(self, pl):
+        ref = self.fresh(pl)
+        self.assertEqual(self.mtx.processlist, ref.processlist)
+        pd.testing.assert_frame_equal(self.mtx.pmtx, ref.pmtx)
+
+    def test_prefix_reuse(self):
+        self.mtx.applyprocesslist(self.processlist)
+        self.assertEqual(len(self.calls), 5)
+        self.assertResult(self.processlist)
+        #Reapplying after reset takes everything from the cache
+        self.mtx.reset()
+        pd.testing.assert_frame_equal(self.mtx.pmtx, self.data.rename_axis(
+            index='Vgate (V)', columns='Frequency (Hz)'))
+        self.calls = []
+        self.mtx.applyprocesslist(self.processlist)
+        self.assertEqual(self.calls, [])
+        self.assertResult(self.processlist)
+        #Equivalent process strings are the same step
+        self.mtx.reset()
+        self.mtx.applyprocesslist(['abs', 'lowpass 1.0,1.0', 'scale 2'])
+        self.assertEqual(self.calls, [])
+        #Only the steps after a removed or inserted one are computed
+        self.mtx.applyprocesslist(self.processlist[3:])
+        self.mtx.delstep(3)
+        self.assertEqual(self.calls, ['offset'])
+        self.assertResult(['abs', 'lowpass 1,1', 'scale 2.0', 'offset 3.0'])
+        self.calls = []
+        self.mtx.insertstep(2, 'neg')
+        self.assertEqual(self.calls, ['neg', 'scale_data', 'offset'])
+        self.assertResult(['abs', 'lowpass 1,1', 'neg', 'scale 2.0', 'offset 3.0'])
+
+    def test_titles(self):
+        #Titles changed by a filter are restored with the cached result
+        self.mtx.applyprocesslist(['transpose', 'abs'])
+        self.mtx.reset()
+        self.mtx.applyprocesslist(['transpose', 'abs'])
+        self.assertEqual((self.mtx.xtitle, self.mtx.ytitle), ('Vgate (V)', 'Frequency (Hz)'))
+        self.mtx.reset()
+        self.assertEqual((self.mtx.xtitle, self.mtx.ytitle), ('Frequency (Hz)', 'Vgate (V)'))
+
+    def test_eviction(self):
+        size = self.data.memory_usage(index=True).sum()
+        self.mtx.cache_budget = int(2.5 * size)
+        self.mtx.applyprocesslist(self.processlist)
+        self.assertEqual(len(self.mtx.cache), 2)
+        self.assertLessEqual(self.mtx.cachesize, self.mtx.cache_budget)
+        self.assertEqual(self.mtx.cachesize,
+                         sum(v[0].memory_usage(index=True).sum() for v in self.mtx.cache.values()))
+        #Least recently used results are dropped first
+        keys = list(self.mtx.cache)
+        self.assertEqual([len(k) for k in keys], [4, 5])
+        self.mtx.reset()
+        self.calls = []
+        self.mtx.applyprocesslist(self.processlist)
+        self.assertEqual(len(self.calls), 5)
+        self.assertResult(self.processlist)
+        #The last result is kept even if it does not fit
+        self.mtx.cache_budget = 0
+        self.mtx.neg()
+        self.assertEqual(len(self.mtx.cache), 1)
+        self.assertIs(self.mtx.cache[self.mtx._key][0], self.mtx.pmtx)
+        self.mtx.clearcache()
+        self.assertEqual((len(self.mtx.cache), self.mtx.cachesize), (0, 0))
+
+    def test_uncached_step(self):
+        #Parameters that are not numbers can not be part of the cache key
+        self.mtx.applyprocesslist(self.processlist[:2])
+        cols = list(self.mtx.pmtx.index[:2])
+        self.mtx.outlier(cols, 1)
+        self.mtx.neg()
+        self.assertEqual(len(self.mtx.cache), 2)
+        self.assertEqual(self.mtx.processlist[2:], ['outlier {},1'.format(cols), 'neg'])
+        self.assertEqual(self.mtx.pmtx.shape, (18, 30))
+        self.mtx.reset()
+        self.calls = []
+        self.mtx.applyprocesslist(self.processlist[:2] + ['neg'])
+        self.assertEqual(self.calls, ['neg'])
+        self.assertResult(self.processlist[:2] + ['neg'])
+
+    def test_mtx_unmodified(self):
+        original = self.data.copy()
+        mtx = stlabmtx(self.data, 'Frequency (Hz)', 'Vgate (V)', 'S21 (dB)', copy=False)
+        raw = mtx.mtx.copy()
+        for line in ['abs', 'log10', 'neg', 'offset 1', 'scale 2', 'lowpass 1,1', 'pixel_avg 3,3,1',
+                     'sub_lbl 10,10,-1e99,1e99', 'sub_cbc', 'sub_linecut 2,1', 'xderiv 1',
+                     'yderiv -1', 'offset_axes 1,2', 'flip 1,1', 'crop 1,5,2,8', 'rotate_cw',
+                     'transpose']:
+            mtx.applystep(line)
+            pd.testing.assert_frame_equal(mtx.mtx, raw)
+        #Cached results are not modified by later filters either
+        for key, value in list(mtx.cache.items()):
+            saved = value[0].copy()
+            mtx.reset()
+            mtx.applyprocesslist(value[4])
+            mtx.applyprocesslist(['neg', 'offset 1'])
+            pd.testing.assert_frame_equal(mtx.cache[key][0], saved)
+        pd.testing.assert_frame_equal(self.data, original)
+
+
+class MmapTest(unittest.TestCase):
+    processlist = ['abs', 'log10', 'sub_lbl 10,10,-1e99,1e99', 'scale 2', 'xderiv -1', 'neg',
+                   'offset 1', 'xderiv 1']
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data = make_mtx(23, 17)
+        self.npyfile = os.path.join(self.tmp.name, 'data.npy')
+        np.save(self.npyfile, self.data.values)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def reference(self, pl):
+        mtx = stlabmtx(self.data, 'Frequency (Hz)', 'Vgate (V)', 'S21 (dB)')
+        mtx.applyprocesslist(pl)
+        return mtx.pmtx
+
+    def make(self, data=None, tilesize=8 * 17 * 3):
+        #Tiles of 3 lines
+        return stlabmtx_mmap(self.npyfile if data is None else data, self.data.columns,
+                             self.data.index, 'Frequency (Hz)', 'Vgate (V)', 'S21 (dB)',
+                             tilesize=tilesize)
+
+    def test_getmtx(self):
+        mtx = self.make()
+        self.assertIsInstance(mtx.data, np.memmap)
+        mtx.applyprocesslist(self.processlist)
+        ref = self.reference(self.processlist)
+        self.assertEqual(mtx.shape, ref.shape)
+        self.assertEqual(mtx.getextents(), stlabmtx(ref).getextents())
+        pd.testing.assert_frame_equal(mtx.getmtx(), ref)
+        for tilesize in (1, 8 * 17 * 4, 1 << 26):
+            mtx.tilesize = tilesize
+            pd.testing.assert_frame_equal(mtx.getmtx(), ref)
+        #Into a memory mapped file
+        out = os.path.join(self.tmp.name, 'out.npy')
+        pd.testing.assert_frame_equal(mtx.getmtx(out=out), ref)
+        np.testing.assert_array_equal(np.load(out), ref.values)
+        #The original data is not modified
+        np.testing.assert_array_equal(np.load(self.npyfile), self.data.values)
+
+    def test_decimate(self):
+        mtx = self.make()
+        mtx.applyprocesslist(self.processlist[:4])
+        ref = self.reference(self.processlist[:4])
+        pd.testing.assert_frame_equal(mtx.getmtx(rowstep=2, colstep=3), ref.iloc[::2, ::3])
+        pd.testing.assert_frame_equal(mtx.decimate(5, 8), ref.iloc[::5, ::3])
+        self.assertEqual([rows for rows, _ in mtx.tiles(2)],
+                         [slice(0, 3), slice(3, 6), slice(6, 9), slice(9, 12)])
+        small = mtx.tostlabmtx(5, 8)
+        pd.testing.assert_frame_equal(small.mtx, ref.iloc[::5, ::3])
+        #Further (not line) filters on the result
+        full = mtx.tostlabmtx()
+        more = ['yderiv 1', 'lowpass 1,1']
+        full.applyprocesslist(more)
+        pd.testing.assert_frame_equal(full.pmtx, self.reference(self.processlist[:4] + more))
+
+    def test_processlist(self):
+        mtx = self.make(self.data)
+        with self.assertRaises(ValueError):
+            mtx.applystep('lowpass 1,1')
+        mtx.applyprocesslist(self.processlist)
+        mtx.delstep(4)
+        mtx.insertstep(0, 'neg')
+        pl = ['neg'] + self.processlist[:4] + self.processlist[5:]
+        self.assertEqual(mtx.processlist, pl)
+        pd.testing.assert_frame_equal(mtx.getmtx(), self.reference(pl))
+        mtx.reset()
+        pd.testing.assert_frame_equal(mtx.getmtx(), self.reference([]))
+
+    def test_savemtx(self):
+        mtx = self.make()
+        mtx.applyprocesslist(self.processlist)
+        ref = self.reference(self.processlist)
+        base = os.path.join(self.tmp.name, 'out')
+        mtx.savemtx(base)
+        #Same file as saved by stlabmtx
+        refmtx = stlabmtx(ref, 'Frequency (Hz)', 'Vgate (V)', 'S21 (dB)')
+        refmtx.savemtx(base + '_ref')
+        with open(base + '.mtx', 'rb') as a, open(base + '_ref.mtx', 'rb') as b:
+            self.assertEqual(a.read(), b.read())
+        #Opened again (memory mapped) from the file
+        loaded = stlabmtx_mmap(base + '.mtx', tilesize=1)
+        self.assertEqual((loaded.xtitle, loaded.ytitle, loaded.ztitle),
+                         ('Frequency (Hz)', 'Vgate (V)', 'S21 (dB)'))
+        np.testing.assert_array_equal(loaded.getmtx().values, ref.values)
+        np.testing.assert_allclose(loaded.rangex0, ref.columns, rtol=1e-6)
+        mtx.savemtx(base + '32', dtype=np.float32)
+        loaded = stlabmtx_mmap(base + '32.mtx')
+        self.assertEqual(loaded.data.dtype, np.float32)
+        np.testing.assert_allclose(loaded.getmtx().values, ref.values, rtol=1e-6)
+
+
+class SaveMtxTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, 'out')
+        self.data = make_mtx(11, 7)
+        self.mtx = stlabmtx(self.data, 'Frequency (Hz)', 'Vgate (V)', 'S21 (dB)')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def load(self, lazy=False):
+        mtx = stlabmtx(pd.DataFrame([[0.]]))
+        mtx.loadmtx(self.base + '.mtx', lazy=lazy)
+        return mtx
+
+    def headersize(self):
+        with open(self.base + '.mtx', 'rb') as ff:
+            ff.readline()
+            ff.readline()
+            return ff.tell()
+
+    def check(self, mtx, ref, rtol=0):
+        self.assertEqual((mtx.xtitle, mtx.ytitle, mtx.ztitle),
+                         ('Frequency (Hz)', 'Vgate (V)', 'S21 (dB)'))
+        self.assertEqual(mtx.processlist, [])
+        self.assertIs(mtx.pmtx, mtx.mtx)
+        np.testing.assert_allclose(mtx.mtx.values, ref.values, rtol=rtol)
+        #The header keeps 7 significant digits of the axis limits
+        np.testing.assert_allclose(mtx.mtx.columns, ref.columns, rtol=1e-6)
+        np.testing.assert_allclose(mtx.mtx.index, ref.index, rtol=1e-6, atol=1e-6)
+
+    def test_roundtrip(self):
+        self.mtx.savemtx(self.base)
+        self.assertEqual(os.path.getsize(self.base + '.mtx') - self.headersize(),
+                         11 * 7 * 8)
+        for lazy in (False, True):
+            mtx = self.load(lazy)
+            self.check(mtx, self.data)
+            self.assertEqual(mtx.mtx.values.dtype, np.float64)
+
+    def test_float32(self):
+        self.mtx.savemtx(self.base, dtype=np.float32)
+        self.assertEqual(os.path.getsize(self.base + '.mtx') - self.headersize(),
+                         11 * 7 * 4)
+        #Converted to float64 unless memory mapped
+        for lazy, dtype in ((False, np.float64), (True, np.float32)):
+            mtx = self.load(lazy)
+            self.check(mtx, self.data, rtol=1e-7)
+            self.assertEqual(mtx.mtx.values.dtype, dtype)
+
+    def test_processed(self):
+        #The processed matrix is saved (with its titles)
+        self.mtx.applyprocesslist(['neg', 'xderiv 1', 'transpose'])
+        self.mtx.savemtx(self.base)
+        mtx = self.load()
+        self.assertEqual((mtx.xtitle, mtx.ytitle), ('Vgate (V)', 'Frequency (Hz)'))
+        np.testing.assert_array_equal(mtx.mtx.values, self.mtx.pmtx.values)
+
+    def test_lazy(self):
+        self.mtx.savemtx(self.base)
+        mtx = self.load(lazy=True)
+        self.assertFalse(mtx.mtx.values.flags.writeable)
+        with open(self.base + '.mtx', 'rb') as ff:
+            content = ff.read()
+        #Filters work on the memory mapped file without modifying it
+        mtx.applyprocesslist(['abs', 'log10', 'lowpass 1,1', 'sub_lbl', 'xderiv 1'])
+        ref = stlabmtx(mtx.mtx.copy())
+        ref.applyprocesslist(mtx.processlist)
+        np.testing.assert_array_equal(mtx.pmtx.values, ref.pmtx.values)
+        with open(self.base + '.mtx', 'rb') as ff:
+            self.assertEqual(ff.read(), content)
+
+
+if __name__ == "__main__":
+    unittest.main()
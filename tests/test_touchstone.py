@@ -0,0 +1,87 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import repo_stlab  #Makes stlab importable from the repository
+
+import unittest
+import tempfile
+import numpy as np
+
+from stlab.utils.touchstone import readtouchstone, writetouchstone
+from stlab.utils.readdata import reads2p_pd
+
+
+class TouchstoneTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def name(self, filename):
+        return os.path.join(self.tmp.name, filename)
+
+    def test_roundtrip(self):
+        rng = np.random.RandomState(0)
+        freq = np.linspace(1e9, 2e9, 11)
+        for nports in (1, 2, 3, 5):
+            data = rng.standard_normal((11, nports, nports)) + 1j * rng.standard_normal(
+                (11, nports, nports))
+            for fmt, unit in (('RI', 'HZ'), ('MA', 'GHZ'), ('DB', 'MHZ')):
+                filename = self.name('test.s{}p'.format(nports))
+                writetouchstone(filename, freq, data, fmt, unit, comments=['test'])
+                ff, dd, opts = readtouchstone(filename)
+                np.testing.assert_allclose(ff, freq, rtol=1e-10)
+                np.testing.assert_allclose(dd, data, rtol=1e-9, atol=1e-12)
+                self.assertEqual((opts['format'], opts['unit'], opts['nports']),
+                                 (fmt, unit, nports))
+
+    def test_two_port(self):
+        #2-port data is in column order (S11, S21, S12, S22).  Noise data is ignored
+        filename = self.name('amp.s2p')
+        with open(filename, 'w') as ff:
+            ff.write('! Amplifier\n# MHZ S RI R 50\n')
+            ff.write('100 0.1 0 2 0 0.01 0 0.2 0\n')
+            ff.write('200 0.1 0 3 0 0.01 0 0.2 0  ! comment\n')
+            ff.write('! Noise parameters\n')
+            ff.write('50 1.5 0.3 20 0.4\n')
+        freq, data, opts = readtouchstone(filename)
+        np.testing.assert_array_equal(freq, [1e8, 2e8])
+        np.testing.assert_array_equal(data[:, 1, 0], [2, 3])
+        np.testing.assert_array_equal(data[:, 0, 1], [0.01, 0.01])
+        frame = reads2p_pd(filename)
+        self.assertEqual(list(frame)[:5],
+                         ['Frequency (Hz)', 'S11re ()', 'S11im ()', 'S21re ()', 'S21im ()'])
+        np.testing.assert_array_equal(frame['S21re ()'], [2, 3])
+
+    def test_version2(self):
+        filename = self.name('data.ts')
+        with open(filename, 'w') as ff:
+            ff.write('[Version] 2.0\n# HZ S MA R 50\n[Number of Ports] 2\n')
+            ff.write('[Two-Port Data Order] 12_21\n[Number of Frequencies] 1\n')
+            ff.write('[Network Data]\n1e9 1 0 0.5 90 2 0 1 180\n[End]\n')
+        freq, data, opts = readtouchstone(filename)
+        self.assertEqual(opts['nports'], 2)
+        np.testing.assert_allclose(data[0], [[1, 0.5j], [2, -1]], atol=1e-15)
+
+    def test_matrix_format(self):
+        #Only one triangle of the symmetric matrix is stored
+        full = np.array([[1, 2, 3], [2, 4, 5], [3, 5, 6]]) * (1 + 1j)
+        for matrix, values in (('Upper', [1, 2, 3, 4, 5, 6]), ('Lower', [1, 2, 4, 3, 5, 6])):
+            filename = self.name('data.ts')
+            with open(filename, 'w') as ff:
+                ff.write('[Version] 2.0\n# HZ S RI R 50\n[Number of Ports] 3\n')
+                ff.write('[Number of Frequencies] 1\n[Matrix Format] {}\n'.format(matrix))
+                ff.write('[Network Data]\n1e9 ' + ' '.join('{0} {0}'.format(v)
+                                                           for v in values) + '\n[End]\n')
+            freq, data, opts = readtouchstone(filename)
+            np.testing.assert_array_equal(data[0], full)
+        with open(filename, 'w') as ff:
+            ff.write('[Version] 2.0\n# HZ S RI R 50\n[Number of Ports] 1\n')
+            ff.write('[Matrix Format] Diagonal\n[Network Data]\n1e9 1 0\n[End]\n')
+        with self.assertRaises(ValueError):
+            readtouchstone(filename)
+
+
+if __name__ == "__main__":
+    unittest.main()